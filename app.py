@@ -1,12 +1,23 @@
+import time
+PROCESS_STARTED = time.perf_counter()  # Taken before heavy imports, for time-to-first-request
+
 import os
-from flask import Flask, send_from_directory
+from flask import Flask, request, send_from_directory
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 from config import config
 from models import db
+from utils.assets import StaticAssets
+from utils.cache import init_cache
+from utils.label_sheets import init_label_renderer
+from utils.password_hashing import init_password_hasher
+from utils.rate_limit import init_rate_limiter
+from utils.scheduler import init_scheduler
+from utils.sharding import init_sharding
 
 def create_app(config_name='default'):
     """Application factory"""
+    started = time.perf_counter()
     app = Flask(__name__, static_folder='static')
     
     # Load configuration
@@ -14,8 +25,20 @@ def create_app(config_name='default'):
     
     # Initialize extensions
     db.init_app(app)
+    init_sharding(app)
     CORS(app)
     JWTManager(app)
+    init_cache(app)
+    init_password_hasher(app)
+    init_label_renderer(app)
+    init_rate_limiter(app)
+    init_scheduler(app)
+    
+    # Keep the stock cube in sync with SparePart writes (registers ORM listeners)
+    import utils.stock_cube
+    
+    # Append stock quantity changes to the change log (registers a session listener)
+    import utils.change_log
     
     # Register blueprints
     from routes.auth import auth_bp
@@ -24,6 +47,11 @@ def create_app(config_name='default'):
     from routes.alerts import alerts_bp
     from routes.analytics import analytics_bp
     from routes.suppliers import suppliers_bp
+    from routes.inventory import inventory_bp
+    from routes.machines import machines_bp
+    from routes.scan import scan_bp
+    from routes.changes import changes_bp
+    from routes.backups import backups_bp
     
     app.register_blueprint(auth_bp)
     app.register_blueprint(parts_bp)
@@ -31,7 +59,16 @@ def create_app(config_name='default'):
     app.register_blueprint(alerts_bp)
     app.register_blueprint(analytics_bp)
     app.register_blueprint(suppliers_bp)
-    
+    app.register_blueprint(inventory_bp)
+    app.register_blueprint(machines_bp)
+    app.register_blueprint(scan_bp)
+    app.register_blueprint(changes_bp)
+    app.register_blueprint(backups_bp)
+
+    # Register CLI commands (schema creation and seeding live in `flask init-db`)
+    from commands import register_commands
+    register_commands(app)
+
     # Serve static files
     @app.route('/uploads/<path:filename>')
     def serve_upload(filename):
@@ -43,35 +80,43 @@ def create_app(config_name='default'):
         """Serve QR code images"""
         return send_from_directory(app.config['QR_CODE_FOLDER'], filename)
     
+    static_assets = StaticAssets(os.path.join(app.root_path, 'static'), live=app.debug)
+    
     @app.route('/')
     def index():
         """Serve main page"""
-        return send_from_directory('static', 'index.html')
+        return static_assets.send('index.html', request.accept_encodings)
     
     @app.route('/<path:path>')
     def serve_static(path):
-        """Serve other static files"""
-        if os.path.exists(os.path.join('static', path)):
-            return send_from_directory('static', path)
-        # If file doesn't exist, serve index.html (for client-side routing)
-        return send_from_directory('static', 'index.html')
+        """Serve other static files (unknown paths fall back to index.html for client-side routing)"""
+        return static_assets.send(path, request.accept_encodings)
     
-    # Create database tables
-    with app.app_context():
-        db.create_all()
-        
-        # Create default admin user if not exists
-        from models import User
-        admin = User.query.filter_by(username='admin').first()
-        if not admin:
-            admin = User(username='admin', role='admin')
-            admin.set_password('admin123')
-            db.session.add(admin)
-            db.session.commit()
-            print("✓ Default admin user created (username: admin, password: admin123)")
+    # Startup timing: log time-to-first-request once per process
+    startup = {
+        'create_app_ms': round((time.perf_counter() - started) * 1000, 1),
+        'first_request_ms': None
+    }
+    app.extensions['startup_timings'] = startup
+    
+    @app.before_request
+    def record_first_request():
+        """Measure time from process start to the first request"""
+        if startup['first_request_ms'] is None:
+            startup['first_request_ms'] = round((time.perf_counter() - PROCESS_STARTED) * 1000, 1)
+            app.logger.info(
+                f"Startup: create_app took {startup['create_app_ms']} ms, "
+                f"first request after {startup['first_request_ms']} ms"
+            )
     
     return app
 
 if __name__ == '__main__':
     app = create_app(os.getenv('FLASK_ENV', 'development'))
+    
+    # Development server: make sure the schema and admin user exist
+    from commands import init_db
+    with app.app_context():
+        init_db()
+    
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,89 @@
+import os
+from contextlib import asynccontextmanager
+from a2wsgi import WSGIMiddleware
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.routing import Mount
+from app import create_app
+from models import db
+from routes.async_read import routes as read_routes
+from utils.sharding import attach_main_database, configured_sites, site_bind_key
+
+# Async drivers for the sync database URLs Flask-SQLAlchemy uses
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+}
+
+def async_database_url(url):
+    """Swap the driver of a SQLAlchemy URL for its asyncio counterpart"""
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for {backend}")
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+def cors_origins(flask_app):
+    """Allowed origins as Flask-CORS reads them (CORS_ORIGINS, default every origin)"""
+    origins = flask_app.config.get('CORS_ORIGINS', '*')
+    return [origins] if isinstance(origins, str) else list(origins)
+
+def create_asgi_app(config_name=None):
+    """
+    ASGI entry point: async read endpoints in front of the Flask app
+    
+    The read-only endpoints in routes.async_read run on an event loop with
+    AsyncSession, so many idle polling clients cost coroutines instead of
+    threads. Every other route (and other methods on the same paths) falls
+    through to the regular Flask app, run in a thread pool.
+    
+    Run with: uvicorn --factory asgi:create_asgi_app
+    """
+    flask_app = create_app(config_name or os.getenv('FLASK_ENV', 'development'))
+    
+    # Same databases as the Flask app (relative SQLite paths resolve to the instance folder)
+    with flask_app.app_context():
+        urls = {None: db.engine.url}
+        for site in configured_sites(flask_app):
+            urls[site] = db.engines[site_bind_key(site)].url
+    
+    engines = {
+        site: create_async_engine(
+            async_database_url(url),
+            pool_size=flask_app.config.get('ASYNC_DB_POOL_SIZE', 20)
+        )
+        for site, url in urls.items()
+    }
+    for site, engine in engines.items():
+        if site and engine.dialect.name == 'sqlite' and urls[None].get_backend_name() == 'sqlite':
+            attach_main_database(engine.sync_engine, urls[None].database)
+    
+    @asynccontextmanager
+    async def lifespan(app):
+        yield
+        for engine in engines.values():
+            await engine.dispose()
+    
+    app = Starlette(
+        routes=[
+            *read_routes,
+            Mount('', app=WSGIMiddleware(flask_app, workers=flask_app.config.get('ASGI_WSGI_THREADS', 10)))
+        ],
+        # The async routes never reach Flask-CORS, so answer CORS like CORS(app) does
+        middleware=[
+            Middleware(
+                CORSMiddleware,
+                allow_origins=cors_origins(flask_app),
+                allow_methods=['*'],
+                allow_headers=['*']
+            )
+        ],
+        lifespan=lifespan
+    )
+    app.state.flask_app = flask_app
+    app.state.sessionmakers = {
+        site: async_sessionmaker(engine, expire_on_commit=False)
+        for site, engine in engines.items()
+    }
+    return app
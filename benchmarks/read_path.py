@@ -0,0 +1,163 @@
+"""
+Connection-scaling benchmark: async read path (asgi.py) vs the sync Flask app
+
+Both apps run under uvicorn on the same database. The sync app is the Flask
+WSGI app on a fixed thread pool (like gunicorn gthread workers); the async
+app serves the same endpoint from routes.async_read. Each connection is a
+keep-alive client issuing requests back to back.
+
+Usage:
+    python -m benchmarks.read_path [--endpoint /api/parts?fields=id,name] \\
+        [--connections 10,50,200,500] [--duration 5] [--threads 10]
+
+Rate limiting is disabled for the servers started here.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import statistics
+import subprocess
+
+HOST = '127.0.0.1'
+
+def sync_app():
+    """uvicorn factory: Flask app behind a fixed-size thread pool"""
+    from a2wsgi import WSGIMiddleware
+    from app import create_app
+    
+    flask_app = create_app(os.getenv('FLASK_ENV', 'development'))
+    return WSGIMiddleware(flask_app, workers=flask_app.config['ASGI_WSGI_THREADS'])
+
+async def _request(reader, writer, method, path, token=None, body=None):
+    headers = [f'{method} {path} HTTP/1.1', f'Host: {HOST}']
+    if token:
+        headers.append(f'Authorization: Bearer {token}')
+    payload = b''
+    if body is not None:
+        payload = json.dumps(body).encode()
+        headers += ['Content-Type: application/json', f'Content-Length: {len(payload)}']
+    writer.write(('\r\n'.join(headers) + '\r\n\r\n').encode() + payload)
+    await writer.drain()
+    
+    status = int((await reader.readline()).split()[1])
+    length, chunked = 0, False
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode().partition(':')
+        if name.lower() == 'content-length':
+            length = int(value)
+        elif name.lower() == 'transfer-encoding' and 'chunked' in value:
+            chunked = True
+    
+    if not chunked:
+        return status, await reader.readexactly(length)
+    data = b''
+    while True:
+        size = int((await reader.readline()).strip(), 16)
+        data += await reader.readexactly(size + 2)
+        if size == 0:
+            return status, data
+
+async def _login(port, username, password):
+    reader, writer = await asyncio.open_connection(HOST, port)
+    status, body = await _request(reader, writer, 'POST', '/api/auth/login',
+                                  body={'username': username, 'password': password})
+    writer.close()
+    if status != 200:
+        raise SystemExit(f'Login failed ({status}): {body[:200]!r}')
+    return json.loads(body)['access_token']
+
+async def _client(port, path, token, deadline, latencies, errors):
+    reader, writer = await asyncio.open_connection(HOST, port)
+    try:
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            status, _ = await _request(reader, writer, 'GET', path, token)
+            latencies.append(time.perf_counter() - started)
+            if status != 200:
+                errors.append(status)
+    except (ConnectionError, asyncio.IncompleteReadError):
+        errors.append('disconnect')
+    finally:
+        writer.close()
+
+async def _run_level(port, path, token, connections, duration):
+    latencies, errors = [], []
+    deadline = time.perf_counter() + duration
+    await asyncio.gather(*(
+        _client(port, path, token, deadline, latencies, errors)
+        for _ in range(connections)
+    ))
+    latencies.sort()
+    
+    def percentile(p):
+        return latencies[min(int(len(latencies) * p), len(latencies) - 1)] * 1000 if latencies else 0
+    
+    return {
+        'connections': connections,
+        'requests_per_second': round(len(latencies) / duration, 1),
+        'p50_ms': round(percentile(0.50), 1),
+        'p99_ms': round(percentile(0.99), 1),
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 1) if latencies else 0,
+        'errors': len(errors)
+    }
+
+def _start_server(target, port, env):
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', '--factory', target,
+         '--host', HOST, '--port', str(port), '--log-level', 'warning',
+         '--backlog', '4096'],
+        env=env
+    )
+    # Wait until the port accepts connections
+    for _ in range(100):
+        try:
+            asyncio.run(asyncio.wait_for(asyncio.open_connection(HOST, port), 0.2))
+            return process
+        except (OSError, asyncio.TimeoutError):
+            time.sleep(0.1)
+    process.terminate()
+    raise SystemExit(f'{target} did not start on port {port}')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--endpoint', default='/api/parts?fields=id,name,quantity')
+    parser.add_argument('--connections', default='10,50,200,500')
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--threads', type=int, default=10, help='Thread pool size of the sync app')
+    parser.add_argument('--username', default='admin')
+    parser.add_argument('--password', default='admin123')
+    args = parser.parse_args()
+    
+    env = dict(os.environ, RATE_LIMIT_ENABLED='false', ASGI_WSGI_THREADS=str(args.threads))
+    levels = [int(c) for c in args.connections.split(',')]
+    targets = [('sync', 'benchmarks.read_path:sync_app', 8101), ('async', 'asgi:create_asgi_app', 8102)]
+    
+    results = {}
+    for name, target, port in targets:
+        process = _start_server(target, port, env)
+        try:
+            token = asyncio.run(_login(port, args.username, args.password))
+            results[name] = [
+                asyncio.run(_run_level(port, args.endpoint, token, level, args.duration))
+                for level in levels
+            ]
+        finally:
+            process.terminate()
+            process.wait()
+    
+    print(f"GET {args.endpoint} ({args.duration:.0f}s per level, sync app on {args.threads} threads)")
+    print(f"{'conns':>6} | {'sync req/s':>10} {'p50':>7} {'p99':>8} {'err':>4} | {'async req/s':>11} {'p50':>7} {'p99':>8} {'err':>4}")
+    for sync, async_ in zip(results['sync'], results['async']):
+        print(
+            f"{sync['connections']:>6} | {sync['requests_per_second']:>10} {sync['p50_ms']:>7} {sync['p99_ms']:>8} {sync['errors']:>4} | "
+            f"{async_['requests_per_second']:>11} {async_['p50_ms']:>7} {async_['p99_ms']:>8} {async_['errors']:>4}"
+        )
+
+if __name__ == '__main__':
+    main()
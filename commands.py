@@ -0,0 +1,278 @@
+import os
+import time
+import click
+from models import db, User
+
+def init_db():
+    """Create or migrate database tables and the default admin user (requires app context)"""
+    from utils.migrations import migrate_all
+    from utils.sharding import configured_sites, create_site_schemas, fan_out
+
+    db.create_all()
+    if configured_sites():
+        create_site_schemas()
+
+    # Add columns and indexes that existing tables are missing
+    for change in migrate_all():
+        print(f"✓ Migrated: {change}")
+
+    # Create default admin user if not exists
+    admin = User.query.filter_by(username='admin').first()
+    if not admin:
+        admin = User(username='admin', role='admin')
+        admin.set_password('admin123')
+        db.session.add(admin)
+        db.session.commit()
+        print("✓ Default admin user created (username: admin, password: admin123)")
+
+    # Bring the stock cube in line with spare_parts (e.g. databases created before it existed)
+    from utils.stock_cube import rebuild_stock_cube
+    rebuild_stock_cube()
+
+    # Per-site databases get their own cube
+    if configured_sites():
+        fan_out(rebuild_stock_cube, configured_sites())
+        print(f"✓ Site databases ready: {', '.join(configured_sites())}")
+
+def register_commands(app):
+    """Register maintenance CLI commands on the app"""
+
+    @app.cli.command('init-db')
+    def init_db_command():
+        """Create database tables and seed the default admin user"""
+        init_db()
+        click.echo("✓ Database initialized")
+
+    @app.cli.command('recompute-reorder-points')
+    @click.option('--apply', is_flag=True, help='Also overwrite min_quantity with the suggestion')
+    @click.option('--lookback-days', type=int, default=None, help='Demand history window in days')
+    @click.option('--lead-time-days', type=float, default=None, help='Replenishment lead time in days')
+    def recompute_reorder_points_command(apply, lookback_days, lead_time_days):
+        """Recompute suggested reorder points from OUT history"""
+        from utils.reorder_engine import recompute_reorder_points
+
+        count = recompute_reorder_points(
+            apply=apply,
+            lookback_days=lookback_days,
+            lead_time_days=lead_time_days
+        )
+        click.echo(f"✓ Reorder points recomputed for {count} parts")
+
+    @app.cli.command('snapshot-stock')
+    @click.option('--prune/--no-prune', default=True, help='Thin out snapshots past the daily retention window')
+    def snapshot_stock_command(prune):
+        """Snapshot current stock levels (run daily from cron)"""
+        from utils.snapshots import take_stock_snapshot, prune_stock_snapshots
+
+        taken_at, count = take_stock_snapshot()
+        click.echo(f"✓ Snapshot of {count} parts taken at {taken_at.isoformat()}")
+
+        if prune:
+            removed = prune_stock_snapshots()
+            click.echo(f"✓ Pruned {removed} old snapshot rows")
+
+    @app.cli.command('build-assets')
+    def build_assets_command():
+        """Content-hash and precompress static assets into static/dist"""
+        from utils.assets import build_assets
+
+        built = build_assets(os.path.join(app.root_path, 'static'))
+        click.echo(f"✓ Built {len(built)} static assets into static/dist")
+
+    @app.cli.command('purge-idempotency-keys')
+    def purge_idempotency_keys_command():
+        """Delete idempotency keys past their TTL"""
+        from utils.idempotency import purge_expired_keys
+
+        count = purge_expired_keys()
+        click.echo(f"✓ Purged {count} expired idempotency keys")
+
+    @app.cli.command('sweep-low-stock')
+    def sweep_low_stock_command():
+        """Open alerts for low stock parts not alerted since they went low and email a digest"""
+        from utils.alert_service import sweep_low_stock, notify_low_stock_digest
+
+        start = time.perf_counter()
+        parts = sweep_low_stock()
+        elapsed = time.perf_counter() - start
+        click.echo(f"✓ Opened {len(parts)} low stock alerts in {elapsed:.3f}s")
+
+        notify_low_stock_digest(parts)
+
+    @app.cli.command('backfill-machines')
+    def backfill_machines_command():
+        """Create machines from free-text transaction machine names and link them by ID"""
+        from sqlalchemy import func, select, update
+        from models import Machine, Transaction, TransactionArchive
+
+        tiers = (Transaction, TransactionArchive)
+        existing = set(db.session.execute(select(Machine.name)).scalars())
+        names = set()
+        for model in tiers:
+            names.update(db.session.execute(
+                select(model.machine)
+                .where(model.machine.isnot(None), model.machine != '')
+                .distinct()
+            ).scalars())
+        new_names = sorted({name.strip() for name in names if name.strip()} - existing)
+        if new_names:
+            db.session.execute(Machine.__table__.insert(), [{'name': name} for name in new_names])
+
+        # Machines are named after the stripped text, so match on the trimmed name
+        linked = 0
+        for model in tiers:
+            machine_id = select(Machine.id).where(Machine.name == func.trim(model.machine)).scalar_subquery()
+            linked += db.session.execute(
+                update(model)
+                .where(model.machine_id.is_(None), machine_id.isnot(None))
+                .values(machine_id=machine_id)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+        db.session.commit()
+        click.echo(f"✓ Created {len(new_names)} machines, linked {linked} transactions")
+
+    @app.cli.command('rebuild-stock-cube')
+    def rebuild_stock_cube_command():
+        """Recompute the category/location/supplier stock cube from spare_parts"""
+        from utils.stock_cube import rebuild_stock_cube
+
+        count = rebuild_stock_cube()
+        click.echo(f"✓ Stock cube rebuilt ({count} cells)")
+
+    @app.cli.command('print-labels')
+    @click.argument('output', type=click.Path(dir_okay=False))
+    @click.option('--format', 'fmt', type=click.Choice(['pdf', 'png']), default='pdf', help='Sheet format')
+    @click.option('--category', default=None, help='Only parts in this category')
+    @click.option('--location', default=None, help='Only parts at this location')
+    @click.option('--columns', type=int, default=3, help='Labels per row')
+    @click.option('--rows', type=int, default=8, help='Label rows per page')
+    def print_labels_command(output, fmt, category, location, columns, rows):
+        """Render QR label sheets for parts into OUTPUT"""
+        from models import SparePart
+        from routes.parts import part_filter_conditions
+        from utils.label_sheets import render_label_sheets
+
+        start = time.perf_counter()
+        labels = db.session.query(SparePart.id, SparePart.name)\
+            .filter(*part_filter_conditions({'category': category, 'location': location}))\
+            .order_by(SparePart.location, SparePart.name)\
+            .all()
+        if not labels:
+            raise click.ClickException('No parts match the filter')
+
+        chunks, _, extension = render_label_sheets(labels, fmt, columns, rows)
+        with open(output, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+
+        elapsed = time.perf_counter() - start
+        click.echo(f"✓ Wrote {len(labels)} labels to {output} ({extension}) in {elapsed:.2f}s")
+
+    @app.cli.command('export-changes')
+    @click.option('--follow', is_flag=True, help='Keep running and append new changes as they commit')
+    @click.option('--interval', type=float, default=1.0, help='Polling interval in seconds with --follow')
+    def export_changes_command(follow, interval):
+        """Append new stock changes to the NDJSON feed file (CHANGE_FEED_PATH)"""
+        from utils.change_log import export_changes
+
+        path = app.config['CHANGE_FEED_PATH']
+        while True:
+            count = export_changes(path)
+            if count or not follow:
+                click.echo(f"✓ Appended {count} changes to {path}")
+            if not follow:
+                break
+            time.sleep(interval)
+
+    @app.cli.command('list-jobs')
+    def list_jobs_command():
+        """Show registered background jobs and their last run"""
+        from models import JobRun
+        from utils.scheduler import JOBS
+
+        for name, job in JOBS.items():
+            last = JobRun.query.filter_by(job_name=name).order_by(JobRun.started_at.desc()).first()
+            status = f"{last.status} at {last.started_at.isoformat()}" if last else 'never run'
+            click.echo(f"{name:28} {str(job.schedule):24} {status}")
+
+    @app.cli.command('run-job')
+    @click.argument('name')
+    def run_job_command(name):
+        """Run a background job now and record it in the run history"""
+        from utils.scheduler import JOBS, run_job
+
+        job = JOBS.get(name)
+        if job is None:
+            raise click.ClickException(f"Unknown job: {name}. Available: {', '.join(JOBS)}")
+
+        run = run_job(job)
+        if run.status != 'success':
+            raise click.ClickException(f"{name} failed:\n{run.error}")
+        click.echo(f"✓ {name} finished: {run.result or 'done'}")
+
+    @app.cli.command('archive-transactions')
+    @click.option('--older-than-days', type=int, default=None, help='Hot window in days (default: TRANSACTION_HOT_DAYS)')
+    def archive_transactions_command(older_than_days):
+        """Move old transactions into the archive tier in batches"""
+        from datetime import datetime, timedelta
+        from utils.transaction_archive import archive_transactions
+
+        before = None
+        if older_than_days is not None:
+            before = datetime.utcnow() - timedelta(days=older_than_days)
+
+        start = time.perf_counter()
+        count = archive_transactions(before)
+        elapsed = time.perf_counter() - start
+        click.echo(f"✓ Archived {count} transactions in {elapsed:.2f}s")
+
+    @app.cli.command('backup')
+    @click.option('--output-dir', default=None, help='Destination folder (default: BACKUP_DIR)')
+    @click.option('--keep', type=int, default=None, help='Also delete all but the newest N backups')
+    def backup_command(output_dir, keep):
+        """Take an online backup of the databases, uploads and QR codes"""
+        from utils.backup import create_backup, prune_backups
+
+        manifest = create_backup(output_dir)
+        for key, info in manifest['databases'].items():
+            fallback = ', single step' if info['single_step'] else ''
+            click.echo(
+                f"  {key}: {info['pages']} pages in {info['steps']} steps, "
+                f"{info['restarts']} restarts{fallback}, {info['seconds']}s"
+            )
+        click.echo(f"✓ Backup written to {manifest['path']} ({len(manifest['files'])} files)")
+
+        if keep is not None:
+            removed = prune_backups(keep, output_dir)
+            click.echo(f"✓ Removed {removed} old backups")
+
+    @app.cli.command('verify-backup')
+    @click.argument('archive', type=click.Path(exists=True, dir_okay=False))
+    def verify_backup_command(archive):
+        """Check a backup's checksums and database integrity"""
+        from utils.backup import BackupError, verify_backup
+
+        try:
+            manifest = verify_backup(archive)
+        except BackupError as e:
+            raise click.ClickException(str(e))
+        click.echo(
+            f"✓ {archive} is valid: databases {', '.join(manifest['databases'])}, "
+            f"{len(manifest['files'])} files, taken {manifest['created_at']}"
+        )
+
+    @app.cli.command('restore-backup')
+    @click.argument('archive', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--no-files', is_flag=True, help='Restore only the databases')
+    @click.confirmation_option(prompt='This overwrites the current databases. Stop the app first. Continue?')
+    def restore_backup_command(archive, no_files):
+        """Verify a backup and restore it over the current databases and files"""
+        from utils.backup import BackupError, restore_backup
+
+        try:
+            result = restore_backup(archive, files=not no_files)
+        except BackupError as e:
+            raise click.ClickException(str(e))
+        if result['skipped']:
+            click.echo(f"  Skipped sites not configured here: {', '.join(result['skipped'])}")
+        click.echo(f"✓ Restored databases {', '.join(result['databases'])} and {result['files']} files")
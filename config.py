@@ -9,12 +9,31 @@ class Config:
     """Base configuration"""
     SECRET_KEY = os.getenv('SECRET_KEY', 'dev-secret-key-change-in-production')
     JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'dev-jwt-secret-key-change-in-production')
-    JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=24)
+    # Short-lived access tokens, renewed through POST /api/auth/refresh
+    JWT_ACCESS_TOKEN_EXPIRES = timedelta(minutes=int(os.getenv('JWT_ACCESS_TOKEN_EXPIRES_MINUTES', 60)))
+    JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=int(os.getenv('JWT_REFRESH_TOKEN_EXPIRES_DAYS', 30)))
+    
+    # Password hashing cap (0 = one concurrent hash per CPU / four admitted requests per hash;
+    # keep MAX_PENDING below the WSGI thread count, requests beyond it get a 503)
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 0)) or None
+    PASSWORD_HASH_MAX_PENDING = int(os.getenv('PASSWORD_HASH_MAX_PENDING', 0)) or None
     
     # Database
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URI', 'sqlite:///stock_management.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Per-site (warehouse) databases: code=uri,... Each site's parts, transactions
+    # and alerts live in its own database; users and suppliers stay in the main one
+    SITE_DATABASES = dict(
+        entry.strip().split('=', 1) for entry in os.getenv('SITE_DATABASES', '').split(',') if entry.strip()
+    )
+    SQLALCHEMY_BINDS = {f'site:{code}': uri for code, uri in SITE_DATABASES.items()}
+    MAIN_SITE_NAME = os.getenv('MAIN_SITE_NAME', 'main')
+    
+    # ASGI entry point (asgi.py): async connection pool and threads for the Flask fallback
+    ASYNC_DB_POOL_SIZE = int(os.getenv('ASYNC_DB_POOL_SIZE', 20))
+    ASGI_WSGI_THREADS = int(os.getenv('ASGI_WSGI_THREADS', 10))
+    
     # Email Configuration (Gmail)
     SMTP_SERVER = os.getenv('SMTP_SERVER', 'smtp.gmail.com')
     SMTP_PORT = int(os.getenv('SMTP_PORT', 587))
@@ -26,9 +45,56 @@ class Config:
     LOW_STOCK_ALERT_ENABLED = os.getenv('LOW_STOCK_ALERT_ENABLED', 'true').lower() == 'true'
     ALERT_EMAIL_RECIPIENTS = os.getenv('ALERT_EMAIL_RECIPIENTS', '').split(',')
     
+    # Reorder-point engine
+    REORDER_LOOKBACK_DAYS = int(os.getenv('REORDER_LOOKBACK_DAYS', 90))
+    REORDER_LEAD_TIME_DAYS = float(os.getenv('REORDER_LEAD_TIME_DAYS', 7))
+    REORDER_SERVICE_Z = float(os.getenv('REORDER_SERVICE_Z', 1.65))  # ~95% service level
+    REORDER_CHUNK_SIZE = int(os.getenv('REORDER_CHUNK_SIZE', 50000))
+    
+    # Transactions older than the hot window move to transactions_archive (nightly job);
+    # analytics read the archive only for ranges that reach past it
+    TRANSACTION_HOT_DAYS = int(os.getenv('TRANSACTION_HOT_DAYS', 365))
+    TRANSACTION_ARCHIVE_BATCH_SIZE = int(os.getenv('TRANSACTION_ARCHIVE_BATCH_SIZE', 5000))
+    
+    # Stock snapshots (daily snapshots are thinned to weekly after the retention window)
+    SNAPSHOT_DAILY_RETENTION_DAYS = int(os.getenv('SNAPSHOT_DAILY_RETENTION_DAYS', 90))
+    
+    # Background job scheduler (one leader per deployment, elected through a lease row)
+    SCHEDULER_ENABLED = os.getenv('SCHEDULER_ENABLED', 'true').lower() == 'true'
+    SCHEDULER_WORKERS = int(os.getenv('SCHEDULER_WORKERS', 2))
+    SCHEDULER_LEASE_SECONDS = int(os.getenv('SCHEDULER_LEASE_SECONDS', 30))
+    SCHEDULER_TICK_SECONDS = int(os.getenv('SCHEDULER_TICK_SECONDS', 5))
+    JOB_HISTORY_DAYS = int(os.getenv('JOB_HISTORY_DAYS', 30))
+    ALERT_RETENTION_DAYS = int(os.getenv('ALERT_RETENTION_DAYS', 180))  # Seen, resolved alerts only
+    
+    # Idempotency keys for stock movements
+    IDEMPOTENCY_KEY_TTL = timedelta(hours=int(os.getenv('IDEMPOTENCY_KEY_TTL_HOURS', 24)))
+    
+    # Response cache (memory is per-process; use filesystem or redis with multiple workers)
+    CACHE_TYPE = os.getenv('CACHE_TYPE', 'memory')  # memory, filesystem, redis or null
+    CACHE_DEFAULT_TIMEOUT = int(os.getenv('CACHE_DEFAULT_TIMEOUT', 300))
+    CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', 1024))  # memory and filesystem
+    CACHE_DIR = os.getenv('CACHE_DIR', 'instance/cache')
+    CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+    
+    # Token bucket rate limits per user (or IP) and blueprint: group=rate_per_second:burst
+    RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+    RATE_LIMITS = os.getenv('RATE_LIMITS', 'analytics=2:30,default=20:200')
+    RATE_LIMIT_STORAGE = os.getenv('RATE_LIMIT_STORAGE', 'memory')  # memory or redis
+    RATE_LIMIT_REDIS_URL = os.getenv('RATE_LIMIT_REDIS_URL', CACHE_REDIS_URL)
+    RATE_LIMIT_MAX_KEYS = int(os.getenv('RATE_LIMIT_MAX_KEYS', 10000))
+    
     # File Upload
     UPLOAD_FOLDER = 'static/uploads'
     QR_CODE_FOLDER = 'static/qrcodes'
+    CHANGE_FEED_PATH = os.getenv('CHANGE_FEED_PATH', 'instance/changes.ndjson')
+    LABEL_SHEET_WORKERS = int(os.getenv('LABEL_SHEET_WORKERS', 0)) or None  # Default: CPU count
+    LABEL_SHEET_MAX_PENDING = int(os.getenv('LABEL_SHEET_MAX_PENDING', 0)) or None  # Default: 2
+    # Online backups (databases + uploads + QR codes) taken in paced SQLite backup steps
+    BACKUP_DIR = os.getenv('BACKUP_DIR', 'instance/backups')
+    BACKUP_KEEP = int(os.getenv('BACKUP_KEEP', 7))
+    BACKUP_PAGES_PER_STEP = int(os.getenv('BACKUP_PAGES_PER_STEP', 512))
+    BACKUP_STEP_PAUSE_MS = float(os.getenv('BACKUP_STEP_PAUSE_MS', 5))
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 
@@ -22,11 +22,10 @@ class PartsProvider with ChangeNotifier {
     notifyListeners();
 
     try {
-      final headers = await _apiService.getHeaders();
-      final response = await http.get(
-        Uri.parse('${ApiService.baseUrl}/parts'),
-        headers: headers,
-      );
+      final response = await _apiService.authorized((headers) => http.get(
+            Uri.parse('${ApiService.baseUrl}/parts'),
+            headers: headers,
+          ));
 
       if (response.statusCode == 200) {
         final Map<String, dynamic> responseData = jsonDecode(response.body);
@@ -45,11 +44,10 @@ class PartsProvider with ChangeNotifier {
 
   Future<Part?> fetchPartById(int id) async {
     try {
-      final headers = await _apiService.getHeaders();
-      final response = await http.get(
-        Uri.parse('${ApiService.baseUrl}/parts/$id'),
-        headers: headers,
-      );
+      final response = await _apiService.authorized((headers) => http.get(
+            Uri.parse('${ApiService.baseUrl}/parts/$id'),
+            headers: headers,
+          ));
 
       if (response.statusCode == 200) {
         final Map<String, dynamic> responseData = jsonDecode(response.body);
@@ -64,19 +62,18 @@ class PartsProvider with ChangeNotifier {
   Future<bool> updateStock(int partId, int quantity, String type, String notes, String machine) async {
     // type should be 'IN' or 'OUT'
     try {
-      final headers = await _apiService.getHeaders();
       final endpoint = type == 'IN' ? '/transactions/in' : '/transactions/out';
       
-      final response = await http.post(
-        Uri.parse('${ApiService.baseUrl}$endpoint'),
-        headers: headers,
-        body: jsonEncode({
-          'part_id': partId,
-          'quantity': quantity,
-          'notes': notes,
-          'machine': machine,
-        }),
-      );
+      final response = await _apiService.authorized((headers) => http.post(
+            Uri.parse('${ApiService.baseUrl}$endpoint'),
+            headers: headers,
+            body: jsonEncode({
+              'part_id': partId,
+              'quantity': quantity,
+              'notes': notes,
+              'machine': machine,
+            }),
+          ));
 
       if (response.statusCode == 201) {
         // Refresh parts to show new stock level
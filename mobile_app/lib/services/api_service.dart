@@ -21,6 +21,34 @@ class ApiService {
     };
   }
 
+  // Exchange the stored refresh token for a new access token
+  Future<bool> refreshAccessToken() async {
+    final refreshToken = await storage.read(key: 'refresh_token');
+    if (refreshToken == null) return false;
+
+    final response = await http.post(
+      Uri.parse('$baseUrl/auth/refresh'),
+      headers: {'Authorization': 'Bearer $refreshToken'},
+    );
+
+    if (response.statusCode == 200) {
+      final data = jsonDecode(response.body);
+      await storage.write(key: 'jwt_token', value: data['access_token']);
+      return true;
+    }
+    return false;
+  }
+
+  // Send an authenticated request, renewing an expired access token once
+  Future<http.Response> authorized(
+      Future<http.Response> Function(Map<String, String> headers) send) async {
+    var response = await send(await getHeaders());
+    if (response.statusCode == 401 && await refreshAccessToken()) {
+      response = await send(await getHeaders());
+    }
+    return response;
+  }
+
   Future<dynamic> login(String username, String password) async {
     final response = await http.post(
       Uri.parse('$baseUrl/auth/login'),
@@ -31,6 +59,7 @@ class ApiService {
     if (response.statusCode == 200) {
       final data = jsonDecode(response.body);
       await storage.write(key: 'jwt_token', value: data['access_token']);
+      await storage.write(key: 'refresh_token', value: data['refresh_token']);
       await storage.write(key: 'username', value: username);
       await storage.write(key: 'role', value: data['role'] ?? 'technician');
       return data['user'];
@@ -49,6 +78,7 @@ class ApiService {
     if (response.statusCode == 201) {
       final data = jsonDecode(response.body);
       await storage.write(key: 'jwt_token', value: data['access_token']);
+      await storage.write(key: 'refresh_token', value: data['refresh_token']);
       await storage.write(key: 'username', value: username);
       await storage.write(key: 'role', value: 'technician');
       return data['user'];
@@ -1,8 +1,26 @@
 from datetime import datetime
+from flask import g, has_app_context
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
 from werkzeug.security import generate_password_hash, check_password_hash
 
-db = SQLAlchemy()
+# Tables stored per site when SITE_DATABASES is configured; users and
+# suppliers stay in the main database, which also serves the main site
+SITE_TABLES = (
+    'spare_parts', 'transactions', 'transactions_archive', 'alerts', 'machines',
+    'stock_snapshots', 'stock_aggregates', 'stock_changes', 'idempotency_keys'
+)
+
+class SiteRoutingSession(Session):
+    """Session that sends every statement to the current site's database (g.site)"""
+    
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        site = g.get('site') if bind is None and has_app_context() else None
+        if site:
+            return self._db.engines[f'site:{site}']
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+db = SQLAlchemy(session_options={'class_': SiteRoutingSession})
 
 class User(db.Model):
     """User model for authentication and authorization"""
@@ -12,6 +30,7 @@ class User(db.Model):
     username = db.Column(db.String(80), unique=True, nullable=False, index=True)
     password_hash = db.Column(db.String(255), nullable=False)
     role = db.Column(db.String(20), nullable=False, default='technician')  # admin or technician
+    sites = db.Column(db.String(500))  # Comma-separated site codes besides the main site
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationships
@@ -25,18 +44,36 @@ class User(db.Model):
         """Verify password"""
         return check_password_hash(self.password_hash, password)
     
+    @property
+    def site_list(self):
+        """Site codes the user may sign in to besides the main site"""
+        return [code for code in (self.sites or '').split(',') if code]
+    
+    def can_use_site(self, site):
+        """Whether the user may get tokens for a site (None is the main site; admins may use any)"""
+        return site is None or self.role == 'admin' or site in self.site_list
+    
     def to_dict(self):
         """Convert to dictionary"""
         return {
             'id': self.id,
             'username': self.username,
             'role': self.role,
+            'sites': self.site_list,
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
 class SparePart(db.Model):
     """Spare part model"""
     __tablename__ = 'spare_parts'
+    __table_args__ = (
+        # Partial index over low stock parts, used by sweeps and low stock filters
+        db.Index(
+            'ix_spare_parts_low_stock', 'id',
+            sqlite_where=db.text('quantity <= min_quantity'),
+            postgresql_where=db.text('quantity <= min_quantity')
+        ),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), nullable=False, index=True)
@@ -47,6 +84,13 @@ class SparePart(db.Model):
     category = db.Column(db.String(100), index=True)
     image_url = db.Column(db.String(500))
     qr_code_url = db.Column(db.String(500))
+    
+    # Reorder-point suggestions (written by utils.reorder_engine)
+    avg_daily_demand = db.Column(db.Float)
+    demand_std = db.Column(db.Float)
+    safety_stock = db.Column(db.Integer)
+    suggested_min_quantity = db.Column(db.Integer)
+    
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -56,6 +100,7 @@ class SparePart(db.Model):
     # Relationships
     transactions = db.relationship('Transaction', backref='spare_part', lazy=True, cascade='all, delete-orphan')
     alerts = db.relationship('Alert', backref='spare_part', lazy=True, cascade='all, delete-orphan')
+    snapshots = db.relationship('StockSnapshot', backref='spare_part', lazy=True, cascade='all, delete-orphan')
     
     @property
     def is_low_stock(self):
@@ -75,6 +120,10 @@ class SparePart(db.Model):
             'image_url': self.image_url,
             'qr_code_url': self.qr_code_url,
             'is_low_stock': self.is_low_stock,
+            'avg_daily_demand': self.avg_daily_demand,
+            'demand_std': self.demand_std,
+            'safety_stock': self.safety_stock,
+            'suggested_min_quantity': self.suggested_min_quantity,
             'supplier_id': self.supplier_id,
             'supplier_name': self.supplier.name if self.supplier else None,
             'created_at': self.created_at.isoformat() if self.created_at else None,
@@ -108,16 +157,40 @@ class Supplier(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
+class Machine(db.Model):
+    """Machine that consumes spare parts"""
+    __tablename__ = 'machines'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), unique=True, nullable=False, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Relationships
+    transactions = db.relationship('Transaction', backref='machine_ref', lazy=True)
+    
+    def to_dict(self):
+        """Convert to dictionary"""
+        return {
+            'id': self.id,
+            'name': self.name,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
 class Transaction(db.Model):
     """Transaction model for stock IN/OUT operations"""
     __tablename__ = 'transactions'
+    __table_args__ = (
+        db.Index('ix_transactions_machine_timestamp', 'machine_id', 'timestamp'),
+        db.Index('ix_transactions_part_timestamp', 'part_id', 'timestamp'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     part_id = db.Column(db.Integer, db.ForeignKey('spare_parts.id'), nullable=False, index=True)
     type = db.Column(db.String(10), nullable=False)  # IN or OUT
     quantity = db.Column(db.Integer, nullable=False)
-    machine = db.Column(db.String(100))  # Machine name/ID
+    machine_id = db.Column(db.Integer, db.ForeignKey('machines.id'), nullable=True)
+    machine = db.Column(db.String(100))  # Machine name as entered (kept for display/exports)
     notes = db.Column(db.Text)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     
@@ -131,20 +204,58 @@ class Transaction(db.Model):
             'part_name': self.spare_part.name if self.spare_part else None,
             'type': self.type,
             'quantity': self.quantity,
+            'machine_id': self.machine_id,
             'machine': self.machine,
             'notes': self.notes,
             'timestamp': self.timestamp.isoformat() if self.timestamp else None
         }
 
+class TransactionArchive(db.Model):
+    """Cold tier of transactions older than the hot window, moved by utils.transaction_archive"""
+    __tablename__ = 'transactions_archive'
+    __table_args__ = (
+        db.Index('ix_transactions_archive_part_timestamp', 'part_id', 'timestamp'),
+    )
+    
+    # Same columns and IDs as in transactions; no foreign keys (rows of a
+    # deleted part or user are removed by utils.transaction_archive)
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    user_id = db.Column(db.Integer, nullable=False, index=True)
+    part_id = db.Column(db.Integer, nullable=False)
+    type = db.Column(db.String(10), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    machine_id = db.Column(db.Integer)
+    machine = db.Column(db.String(100))
+    notes = db.Column(db.Text)
+    timestamp = db.Column(db.DateTime, nullable=False, index=True)
+    
+    user = db.relationship('User', primaryjoin='foreign(TransactionArchive.user_id) == User.id', viewonly=True)
+    spare_part = db.relationship(
+        'SparePart', primaryjoin='foreign(TransactionArchive.part_id) == SparePart.id', viewonly=True
+    )
+    
+    # Serialized exactly like a hot transaction
+    to_dict = Transaction.to_dict
+
 class Alert(db.Model):
     """Alert model for low stock notifications"""
     __tablename__ = 'alerts'
+    __table_args__ = (
+        # At most one open (unseen) alert per part
+        db.Index(
+            'uq_alerts_open_part', 'part_id',
+            unique=True,
+            sqlite_where=db.text('seen = 0'),
+            postgresql_where=db.text('NOT seen')
+        ),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     part_id = db.Column(db.Integer, db.ForeignKey('spare_parts.id'), nullable=False, index=True)
     message = db.Column(db.String(500), nullable=False)
     seen = db.Column(db.Boolean, default=False, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    resolved_at = db.Column(db.DateTime)  # Set once the part is back above its minimum
     
     def to_dict(self):
         """Convert to dictionary"""
@@ -154,5 +265,128 @@ class Alert(db.Model):
             'part_name': self.spare_part.name if self.spare_part else None,
             'message': self.message,
             'seen': self.seen,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'resolved_at': self.resolved_at.isoformat() if self.resolved_at else None
+        }
+
+class StockSnapshot(db.Model):
+    """Periodic snapshot of a part's stock level, used for point-in-time queries"""
+    __tablename__ = 'stock_snapshots'
+    __table_args__ = (
+        db.UniqueConstraint('taken_at', 'part_id', name='uq_stock_snapshots_taken_at_part'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    part_id = db.Column(db.Integer, db.ForeignKey('spare_parts.id'), nullable=False, index=True)
+    quantity = db.Column(db.Integer, nullable=False)
+    taken_at = db.Column(db.DateTime, nullable=False, index=True)
+    
+    def to_dict(self):
+        """Convert to dictionary"""
+        return {
+            'id': self.id,
+            'part_id': self.part_id,
+            'quantity': self.quantity,
+            'taken_at': self.taken_at.isoformat() if self.taken_at else None
+        }
+
+class IdempotencyKey(db.Model):
+    """Stored response for a client-supplied Idempotency-Key header"""
+    __tablename__ = 'idempotency_keys'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'key', name='uq_idempotency_keys_user_key'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    key = db.Column(db.String(255), nullable=False)
+    endpoint = db.Column(db.String(100), nullable=False)
+    request_hash = db.Column(db.String(64), nullable=False)
+    status_code = db.Column(db.Integer)  # NULL while the request is in progress
+    response_body = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    
+    @property
+    def is_expired(self):
+        """Check if the key is past its TTL"""
+        return self.expires_at <= datetime.utcnow()
+
+class StockAggregate(db.Model):
+    """Precomputed stock totals per (category, location, supplier), maintained by utils.stock_cube"""
+    __tablename__ = 'stock_aggregates'
+    
+    # Dimensions are stored non-null ('' / 0 for none) so they can form the key
+    category = db.Column(db.String(100), primary_key=True, default='')
+    location = db.Column(db.String(100), primary_key=True, default='')
+    supplier_id = db.Column(db.Integer, primary_key=True, default=0)
+    
+    part_count = db.Column(db.Integer, nullable=False, default=0)
+    total_quantity = db.Column(db.Integer, nullable=False, default=0)
+    low_stock_count = db.Column(db.Integer, nullable=False, default=0)
+    out_of_stock_count = db.Column(db.Integer, nullable=False, default=0)
+
+class StockChange(db.Model):
+    """Append-only log of stock quantity changes; the id is the consumer offset"""
+    __tablename__ = 'stock_changes'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    # No foreign keys: entries outlive deleted parts and transactions
+    part_id = db.Column(db.Integer, nullable=False)
+    change_type = db.Column(db.String(10), nullable=False)  # CREATE, IN, OUT, ADJUST or DELETE
+    quantity_before = db.Column(db.Integer, nullable=False)
+    quantity_after = db.Column(db.Integer, nullable=False)
+    transaction_id = db.Column(db.Integer)
+    user_id = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    
+    def to_dict(self):
+        """Convert to dictionary"""
+        return {
+            'offset': self.id,
+            'part_id': self.part_id,
+            'change_type': self.change_type,
+            'quantity_before': self.quantity_before,
+            'quantity_after': self.quantity_after,
+            'delta': self.quantity_after - self.quantity_before,
+            'transaction_id': self.transaction_id,
+            'user_id': self.user_id,
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
+
+class JobLease(db.Model):
+    """Leadership lease of the background job scheduler (one row per lease name)"""
+    __tablename__ = 'job_leases'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    holder = db.Column(db.String(100), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+class JobRun(db.Model):
+    """History of background job runs"""
+    __tablename__ = 'job_runs'
+    __table_args__ = (
+        db.Index('ix_job_runs_job_started', 'job_name', 'started_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    job_name = db.Column(db.String(100), nullable=False)
+    status = db.Column(db.String(20), nullable=False)  # running, success, failed
+    holder = db.Column(db.String(100))
+    result = db.Column(db.String(500))
+    error = db.Column(db.Text)
+    started_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    finished_at = db.Column(db.DateTime)
+    
+    def to_dict(self):
+        """Convert to dictionary"""
+        return {
+            'id': self.id,
+            'job_name': self.job_name,
+            'status': self.status,
+            'holder': self.holder,
+            'result': self.result,
+            'error': self.error,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
@@ -1,6 +1,9 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required
 from models import db, Alert
+from utils.alert_service import sweep_low_stock, notify_low_stock_digest, purge_seen_alerts
+from utils.fieldsets import parse_fields, apply_fieldset, serialize
+from utils.scheduler import scheduled_job
 
 alerts_bp = Blueprint('alerts', __name__, url_prefix='/api/alerts')
 
@@ -13,6 +16,7 @@ def get_alerts():
     Query parameters:
         - seen: Filter by seen status (true/false)
         - limit: Limit results (default: 50)
+        - fields: Comma-separated fields to return (e.g. id,part_id,seen)
     
     Returns:
         {
@@ -21,7 +25,12 @@ def get_alerts():
             "unread_count": 5
         }
     """
-    query = Alert.query
+    try:
+        fields = parse_fields(Alert, request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    query = apply_fieldset(Alert.query, Alert, fields)
     
     # Seen filter
     seen = request.args.get('seen', '').lower()
@@ -40,7 +49,7 @@ def get_alerts():
     unread_count = Alert.query.filter_by(seen=False).count()
     
     return jsonify({
-        'alerts': [alert.to_dict() for alert in alerts],
+        'alerts': [serialize(alert, fields) for alert in alerts],
         'total': len(alerts),
         'unread_count': unread_count
     }), 200
@@ -109,3 +118,15 @@ def mark_all_read():
         'message': 'All alerts marked as read',
         'count': count
     }), 200
+
+@scheduled_job('sweep-low-stock', every=900)
+def sweep_low_stock_job():
+    """Open alerts for low stock parts not alerted since they went low and email a digest"""
+    parts = sweep_low_stock()
+    notify_low_stock_digest(parts)
+    return len(parts)
+
+@scheduled_job('purge-seen-alerts', cron='0 2 * * *')
+def purge_seen_alerts_job():
+    """Delete seen alerts past ALERT_RETENTION_DAYS"""
+    return purge_seen_alerts(current_app.config['ALERT_RETENTION_DAYS'])
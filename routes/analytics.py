@@ -1,97 +1,111 @@
-from flask import Blueprint, jsonify
+from datetime import datetime, timedelta
+from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import db, SparePart, Alert, Transaction
-from sqlalchemy import func
+from models import db, SparePart, Alert, Supplier
+from sqlalchemy import func, case
+from utils.cache import cached
+from utils.sharding import fan_out, wants_all_sites
+from utils.stock_cube import DIMENSIONS, merge_cube_rows, query_stock_cube
+from utils.time_buckets import BUCKETS, bucket_expression, format_bucket
+from utils.transaction_archive import transaction_movements
 
 analytics_bp = Blueprint('analytics', __name__)
 
+def site_stock_cube(group_by=(), **slices):
+    """
+    Query the stock cube of the routed site, or of every site for ?site=all
+    
+    Cube measures are additive, so a cross-site answer is the per-site
+    results merged; each site database is queried in parallel.
+    """
+    if not wants_all_sites():
+        return query_stock_cube(group_by=group_by, **slices)
+    return merge_cube_rows(fan_out(lambda: query_stock_cube(group_by=group_by, **slices)), group_by)
+
+def site_alert_counts():
+    """Total and unread alert counts of the routed site, or summed over every site for ?site=all"""
+    def counts():
+        return Alert.query.count(), Alert.query.filter_by(seen=False).count()
+    
+    if not wants_all_sites():
+        return counts()
+    results = fan_out(counts)
+    return sum(total for total, _ in results), sum(unread for _, unread in results)
+
+def overview_payload(totals, categories, total_alerts, unread_alerts):
+    """Build the overview response from cube rows and alert counts (shared with the async read path)"""
+    return {
+        'total_parts': totals['part_count'],
+        'low_stock_count': totals['low_stock_count'],
+        'out_of_stock_count': totals['out_of_stock_count'],
+        'total_quantity': totals['total_quantity'],
+        'categories': [
+            {'category': row['category'] or 'Uncategorized', 'count': row['part_count']}
+            for row in categories
+        ],
+        'total_alerts': total_alerts,
+        'unread_alerts': unread_alerts
+    }
+
+def distribution_payload(by_category, by_location):
+    """Build the stock distribution response from cube rows (shared with the async read path)"""
+    return {
+        'by_category': [
+            {
+                'category': row['category'] or 'Uncategorized',
+                'total_quantity': row['total_quantity'],
+                'part_count': row['part_count']
+            }
+            for row in by_category
+        ],
+        'by_location': [
+            {
+                'location': row['location'] or 'Unknown',
+                'total_quantity': row['total_quantity'],
+                'part_count': row['part_count']
+            }
+            for row in by_location
+        ]
+    }
+
 @analytics_bp.route('/api/analytics/overview', methods=['GET'])
 @jwt_required()
+@cached(tags=('spare_parts', 'stock_aggregates', 'alerts'))
 def get_overview():
-    """Get overall inventory statistics"""
+    """
+    Get overall inventory statistics
+    
+    Query parameters:
+        - site: all to combine every site database
+    """
     try:
-        # Total parts count
-        total_parts = SparePart.query.count()
-        
-        # Low stock items count
-        low_stock_count = SparePart.query.filter(SparePart.quantity <= SparePart.min_quantity).count()
-        
-        # Out of stock items count
-        out_of_stock_count = SparePart.query.filter(SparePart.quantity == 0).count()
-        
-        # Total quantity across all parts
-        total_quantity = db.session.query(func.sum(SparePart.quantity)).scalar() or 0
-        
-        # Categories breakdown
-        categories = db.session.query(
-            SparePart.category,
-            func.count(SparePart.id).label('count')
-        ).group_by(SparePart.category).all()
-        
-        categories_data = [
-            {'category': cat or 'Uncategorized', 'count': count}
-            for cat, count in categories
-        ]
+        # Totals and categories from the stock cube (no scan of spare_parts)
+        totals = site_stock_cube()[0]
+        categories = site_stock_cube(group_by=('category',))
         
         # Total alerts
-        total_alerts = Alert.query.count()
-        unread_alerts = Alert.query.filter_by(seen=False).count()
+        total_alerts, unread_alerts = site_alert_counts()
         
-        return jsonify({
-            'total_parts': total_parts,
-            'low_stock_count': low_stock_count,
-            'out_of_stock_count': out_of_stock_count,
-            'total_quantity': total_quantity,
-            'categories': categories_data,
-            'total_alerts': total_alerts,
-            'unread_alerts': unread_alerts
-        }), 200
+        return jsonify(overview_payload(totals, categories, total_alerts, unread_alerts)), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-
 @analytics_bp.route('/api/analytics/stock-distribution', methods=['GET'])
 @jwt_required()
+@cached(tags=('spare_parts', 'stock_aggregates'))
 def get_stock_distribution():
-    """Get stock distribution by category and location"""
+    """
+    Get stock distribution by category and location
+    
+    Query parameters:
+        - site: all to combine every site database
+    """
     try:
-        # Stock by category
-        category_distribution = db.session.query(
-            SparePart.category,
-            func.sum(SparePart.quantity).label('total_quantity'),
-            func.count(SparePart.id).label('part_count')
-        ).group_by(SparePart.category).all()
-        
-        category_data = [
-            {
-                'category': cat or 'Uncategorized',
-                'total_quantity': int(qty or 0),
-                'part_count': count
-            }
-            for cat, qty, count in category_distribution
-        ]
-        
-        # Stock by location
-        location_distribution = db.session.query(
-            SparePart.location,
-            func.sum(SparePart.quantity).label('total_quantity'),
-            func.count(SparePart.id).label('part_count')
-        ).group_by(SparePart.location).all()
-        
-        location_data = [
-            {
-                'location': loc or 'Unknown',
-                'total_quantity': int(qty or 0),
-                'part_count': count
-            }
-            for loc, qty, count in location_distribution
-        ]
-        
-        return jsonify({
-            'by_category': category_data,
-            'by_location': location_data
-        }), 200
+        return jsonify(distribution_payload(
+            site_stock_cube(group_by=('category',)),
+            site_stock_cube(group_by=('location',))
+        )), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -99,6 +113,7 @@ def get_stock_distribution():
 
 @analytics_bp.route('/api/analytics/low-stock', methods=['GET'])
 @jwt_required()
+@cached(tags=('spare_parts',))
 def get_low_stock_analysis():
     """Get detailed low stock analysis"""
     try:
@@ -142,6 +157,7 @@ def get_low_stock_analysis():
 
 @analytics_bp.route('/api/analytics/top-parts', methods=['GET'])
 @jwt_required()
+@cached(tags=('spare_parts',))
 def get_top_parts():
     """Get top parts by various metrics"""
     try:
@@ -188,6 +204,7 @@ def get_top_parts():
 
 @analytics_bp.route('/api/analytics/alerts-summary', methods=['GET'])
 @jwt_required()
+@cached(tags=('spare_parts', 'alerts'))
 def get_alerts_summary():
     """Get alerts analytics"""
     try:
@@ -229,3 +246,145 @@ def get_alerts_summary():
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+
+@analytics_bp.route('/api/analytics/trends', methods=['GET'])
+@jwt_required()
+@cached(tags=('transactions', 'spare_parts'))
+def get_trends():
+    """
+    Get IN/OUT volume and net stock change bucketed over time
+    
+    Query parameters:
+        - bucket: hour, day, week or month (default: day)
+        - start_date: From date (ISO format, default: 30 days ago)
+        - end_date: To date (ISO format, default: now)
+        - category: Filter by part category
+        - location: Filter by part location
+        - part_id: Filter by part
+    
+    Returns:
+        {
+            "bucket": "day",
+            "series": [
+                {"period": "2024-03-01", "in_quantity": 40, "out_quantity": 12,
+                 "net_change": 28, "transaction_count": 9}
+            ]
+        }
+    """
+    bucket = request.args.get('bucket', 'day').lower()
+    if bucket not in BUCKETS:
+        return jsonify({'error': f"Invalid bucket. Must be one of: {', '.join(BUCKETS)}"}), 400
+    
+    try:
+        end_date = request.args.get('end_date')
+        end = datetime.fromisoformat(end_date.replace('Z', '+00:00')) if end_date else datetime.utcnow()
+        start_date = request.args.get('start_date')
+        start = datetime.fromisoformat(start_date.replace('Z', '+00:00')) if start_date else end - timedelta(days=30)
+    except ValueError:
+        return jsonify({'error': 'Invalid date. Use ISO format'}), 400
+    
+    # Ranges past the hot window continue into the archive
+    tx = transaction_movements(start)
+    period = bucket_expression(tx.c.timestamp, bucket).label('period')
+    in_quantity = func.sum(case((tx.c.type == 'IN', tx.c.quantity), else_=0))
+    out_quantity = func.sum(case((tx.c.type == 'OUT', tx.c.quantity), else_=0))
+    
+    query = db.session.query(
+        period,
+        in_quantity.label('in_quantity'),
+        out_quantity.label('out_quantity'),
+        func.count().label('transaction_count')
+    ).filter(tx.c.timestamp >= start, tx.c.timestamp <= end)
+    
+    part_id = request.args.get('part_id')
+    if part_id:
+        query = query.filter(tx.c.part_id == int(part_id))
+    
+    # Only join parts when filtering on part attributes
+    category = request.args.get('category', '').strip()
+    location = request.args.get('location', '').strip()
+    if category or location:
+        query = query.join(SparePart, SparePart.id == tx.c.part_id)
+        if category:
+            query = query.filter(SparePart.category == category)
+        if location:
+            query = query.filter(SparePart.location == location)
+    
+    rows = query.group_by(period).order_by(period).all()
+    
+    series = [
+        {
+            'period': format_bucket(p),
+            'in_quantity': int(qty_in or 0),
+            'out_quantity': int(qty_out or 0),
+            'net_change': int((qty_in or 0) - (qty_out or 0)),
+            'transaction_count': count
+        }
+        for p, qty_in, qty_out, count in rows
+    ]
+    
+    return jsonify({
+        'bucket': bucket,
+        'start_date': start.isoformat(),
+        'end_date': end.isoformat(),
+        'series': series
+    }), 200
+
+
+@analytics_bp.route('/api/analytics/drilldown', methods=['GET'])
+@jwt_required()
+@cached(tags=('spare_parts', 'stock_aggregates', 'suppliers'))
+def get_drilldown():
+    """
+    Roll up or slice stock totals by category, location and supplier
+    
+    Answered from the precomputed stock cube without touching spare_parts.
+    
+    Query parameters:
+        - group_by: Comma-separated dimensions (category, location, supplier_id);
+          empty for a grand total
+        - category, location, supplier_id: Slice filters (empty value or
+          supplier_id=0 select parts without one)
+        - site: all to combine every site database
+    
+    Returns:
+        {
+            "group_by": ["category"],
+            "rows": [
+                {"category": "Bearings", "part_count": 12, "total_quantity": 340,
+                 "low_stock_count": 3, "out_of_stock_count": 1}
+            ]
+        }
+    """
+    group_by = [d.strip() for d in request.args.get('group_by', '').split(',') if d.strip()]
+    invalid = [d for d in group_by if d not in DIMENSIONS]
+    if invalid:
+        return jsonify({'error': f"Invalid dimension(s): {', '.join(invalid)}. Must be among: {', '.join(DIMENSIONS)}"}), 400
+    
+    supplier_id = request.args.get('supplier_id')
+    rows = site_stock_cube(
+        group_by=group_by,
+        category=request.args.get('category'),
+        location=request.args.get('location'),
+        supplier_id=int(supplier_id) if supplier_id not in (None, '') else None
+    )
+    
+    # Resolve supplier names for the suppliers present in the result
+    if 'supplier_id' in group_by:
+        ids = {row['supplier_id'] for row in rows if row['supplier_id']}
+        names = dict(db.session.query(Supplier.id, Supplier.name).filter(Supplier.id.in_(ids)).all()) if ids else {}
+        for row in rows:
+            row['supplier_name'] = names.get(row['supplier_id'])
+            row['supplier_id'] = row['supplier_id'] or None
+    
+    for row in rows:
+        if 'category' in row:
+            row['category'] = row['category'] or None
+        if 'location' in row:
+            row['location'] = row['location'] or None
+    
+    return jsonify({
+        'group_by': group_by,
+        'rows': rows
+    }), 200
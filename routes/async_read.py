@@ -0,0 +1,254 @@
+import time
+import asyncio
+from datetime import datetime, timedelta
+from functools import wraps
+import jwt
+from sqlalchemy import false, func, select
+from sqlalchemy.orm import joinedload
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from models import SparePart, Alert, Supplier, User
+from routes.parts import part_filter_conditions
+from routes.suppliers import (
+    join_supplier_stats, joined_supplier_with_stats, merge_supplier_stats,
+    supplier_stats_selects, supplier_with_stats
+)
+from routes.analytics import overview_payload, distribution_payload
+from utils.fieldsets import parse_fields, apply_fieldset, serialize
+from utils.sharding import ALL_SITES, configured_sites, overrides_token_site, resolve_site
+from utils.stock_cube import merge_cube_rows, stock_cube_select
+
+# Async versions of the read-only endpoints, served by asgi.py. Query
+# building and serialization are shared with the Flask blueprints so both
+# paths return the same payloads; only execution differs (AsyncSession).
+
+def _error(message, status_code):
+    return JSONResponse({'error': message}, status_code=status_code)
+
+def _claims(request):
+    """Verify the access token like flask-jwt-extended; returns (claims, error response)"""
+    config = request.app.state.flask_app.config
+    auth = request.headers.get('authorization', '')
+    if not auth.startswith('Bearer '):
+        return None, JSONResponse({'msg': 'Missing Authorization Header'}, status_code=401)
+    
+    try:
+        claims = jwt.decode(
+            auth[7:],
+            config['JWT_SECRET_KEY'],
+            algorithms=[config.get('JWT_ALGORITHM', 'HS256')]
+        )
+    except jwt.ExpiredSignatureError:
+        return None, JSONResponse({'msg': 'Token has expired'}, status_code=401)
+    except jwt.InvalidTokenError as e:
+        return None, JSONResponse({'msg': str(e)}, status_code=422)
+    
+    if claims.get('type') != 'access':
+        return None, JSONResponse({'msg': 'Only non-refresh tokens are allowed'}, status_code=422)
+    return claims, None
+
+def _site(request, claims):
+    """
+    Pick the site database like the Flask router: the token's site claim,
+    unless X-Site or ?site= overrides it
+    
+    Returns:
+        tuple: (site, whether the claim was overridden, which needs an admin)
+    """
+    flask_app = request.app.state.flask_app
+    token_site = claims.get('site')
+    requested = request.headers.get('x-site') or request.query_params.get('site')
+    site = resolve_site(requested or token_site, configured_sites(flask_app), flask_app.config['MAIN_SITE_NAME'])
+    return site, overrides_token_site(requested, site, token_site)
+
+async def _is_admin(request, identity):
+    async with request.app.state.sessionmakers[None]() as session:
+        user = await session.get(User, int(identity))
+    return user is not None and user.role == 'admin'
+
+def read_endpoint(group):
+    """
+    Wrap an async read handler with JWT auth, rate limiting and a session
+    on the routed site's database
+    
+    Uses the Flask app's rate limiter buckets (same keys as the sync path),
+    so a client is limited the same way whichever path serves it.
+    """
+    def decorator(handler):
+        @wraps(handler)
+        async def wrapper(request):
+            claims, error = _claims(request)
+            if error is not None:
+                return error
+            identity = claims.get('sub')
+            
+            try:
+                site, overridden = _site(request, claims)
+            except ValueError as e:
+                return _error(str(e), 400)
+            if overridden and not await _is_admin(request, identity):
+                return _error('Admin access required to select another site', 403)
+            
+            limiter = request.app.state.flask_app.extensions.get('rate_limiter')
+            limit = limiter.limit_for(group) if limiter else None
+            if limit:
+                wait = limiter.store.take(f'{group}:user:{identity}', limit[0], limit[1], time.time())
+                if wait:
+                    response = _error('Rate limit exceeded, please slow down', 429)
+                    response.headers['Retry-After'] = str(max(1, int(wait + 0.999)))
+                    return response
+            
+            async with request.app.state.sessionmakers[site]() as session:
+                try:
+                    return await handler(request, session)
+                except ValueError as e:
+                    return _error(str(e), 400)
+        return wrapper
+    return decorator
+
+@read_endpoint('parts')
+async def get_parts(request, session):
+    """Async GET /api/parts (same filters and fields= as the Flask endpoint)"""
+    fields = parse_fields(SparePart, request.query_params.get('fields'))
+    stmt = select(SparePart).where(*part_filter_conditions(request.query_params))
+    if fields is None:
+        stmt = stmt.options(joinedload(SparePart.supplier))
+    stmt = apply_fieldset(stmt, SparePart, fields).order_by(SparePart.name)
+    
+    parts = (await session.scalars(stmt)).unique().all()
+    return JSONResponse({
+        'parts': [serialize(part, fields) for part in parts],
+        'total': len(parts)
+    })
+
+@read_endpoint('parts')
+async def get_part(request, session):
+    """Async GET /api/parts/<id>"""
+    part = await session.get(
+        SparePart, request.path_params['part_id'],
+        options=[joinedload(SparePart.supplier)]
+    )
+    if not part:
+        return _error('Part not found', 404)
+    return JSONResponse({'part': part.to_dict()})
+
+@read_endpoint('alerts')
+async def get_alerts(request, session):
+    """Async GET /api/alerts"""
+    fields = parse_fields(Alert, request.query_params.get('fields'))
+    stmt = select(Alert)
+    
+    seen = request.query_params.get('seen', '').lower()
+    if seen == 'true':
+        stmt = stmt.where(Alert.seen == True)
+    elif seen == 'false':
+        stmt = stmt.where(Alert.seen == False)
+    
+    if fields is None:
+        stmt = stmt.options(joinedload(Alert.spare_part).load_only(SparePart.name))
+    limit = int(request.query_params.get('limit', 50))
+    stmt = apply_fieldset(stmt, Alert, fields)\
+        .order_by(Alert.seen.asc(), Alert.created_at.desc())\
+        .limit(limit)
+    
+    alerts = (await session.scalars(stmt)).unique().all()
+    unread_count = await session.scalar(select(func.count(Alert.id)).where(Alert.seen == false()))
+    return JSONResponse({
+        'alerts': [serialize(alert, fields) for alert in alerts],
+        'total': len(alerts),
+        'unread_count': unread_count
+    })
+
+@read_endpoint('alerts')
+async def get_unread_count(request, session):
+    """Async GET /api/alerts/unread-count"""
+    count = await session.scalar(select(func.count(Alert.id)).where(Alert.seen == false()))
+    return JSONResponse({'unread_count': count})
+
+async def _supplier_stats(session, selects):
+    return [(await session.execute(stmt)).all() for stmt in selects]
+
+@read_endpoint('suppliers')
+async def get_suppliers(request, session):
+    """Async GET /api/suppliers (including include_stats and fields=)"""
+    fields = parse_fields(Supplier, request.query_params.get('fields'))
+    
+    if request.query_params.get('include_stats', '').lower() != 'true':
+        stmt = apply_fieldset(select(Supplier), Supplier, fields).order_by(Supplier.name)
+        suppliers = (await session.scalars(stmt)).all()
+        return JSONResponse({
+            'suppliers': [serialize(s, fields) for s in suppliers],
+            'total': len(suppliers)
+        })
+    
+    days = int(request.query_params.get('days', 30))
+    since = datetime.utcnow() - timedelta(days=days)
+    selects = supplier_stats_selects(since)
+    stmt = apply_fieldset(select(Supplier), Supplier, fields).order_by(Supplier.name)
+    if configured_sites(request.app.state.flask_app):
+        stats = merge_supplier_stats(await _fan_out(request, lambda s: _supplier_stats(s, selects)))
+        suppliers = [
+            supplier_with_stats(supplier, stats.get(supplier.id), fields)
+            for supplier in (await session.scalars(stmt)).all()
+        ]
+    else:
+        rows = (await session.execute(join_supplier_stats(stmt, selects))).all()
+        suppliers = [joined_supplier_with_stats(row, fields) for row in rows]
+    return JSONResponse({
+        'suppliers': suppliers,
+        'total': len(suppliers),
+        'days': days
+    })
+
+async def _cube(session, group_by=()):
+    return [row._asdict() for row in await session.execute(stock_cube_select(group_by))]
+
+async def _alert_counts(session):
+    total = await session.scalar(select(func.count(Alert.id)))
+    unread = await session.scalar(select(func.count(Alert.id)).where(Alert.seen == false()))
+    return total, unread
+
+async def _fan_out(request, query):
+    """Run query(session) against every site database concurrently"""
+    async def run(sessionmaker):
+        async with sessionmaker() as session:
+            return await query(session)
+    return await asyncio.gather(*(run(s) for s in request.app.state.sessionmakers.values()))
+
+async def _site_cube(request, session, group_by=()):
+    """Cube rows of the routed site, or merged over every site for ?site=all"""
+    if request.query_params.get('site') != ALL_SITES:
+        return await _cube(session, group_by)
+    return merge_cube_rows(await _fan_out(request, lambda s: _cube(s, group_by)), group_by)
+
+async def _site_alert_counts(request, session):
+    if request.query_params.get('site') != ALL_SITES:
+        return await _alert_counts(session)
+    results = await _fan_out(request, _alert_counts)
+    return sum(total for total, _ in results), sum(unread for _, unread in results)
+
+@read_endpoint('analytics')
+async def get_overview(request, session):
+    """Async GET /api/analytics/overview"""
+    totals = (await _site_cube(request, session))[0]
+    categories = await _site_cube(request, session, ('category',))
+    total_alerts, unread_alerts = await _site_alert_counts(request, session)
+    return JSONResponse(overview_payload(totals, categories, total_alerts, unread_alerts))
+
+@read_endpoint('analytics')
+async def get_stock_distribution(request, session):
+    """Async GET /api/analytics/stock-distribution"""
+    return JSONResponse(distribution_payload(
+        await _site_cube(request, session, ('category',)),
+        await _site_cube(request, session, ('location',))
+    ))
+
+routes = [
+    Route('/api/parts', get_parts, methods=['GET']),
+    Route('/api/parts/{part_id:int}', get_part, methods=['GET']),
+    Route('/api/alerts', get_alerts, methods=['GET']),
+    Route('/api/alerts/unread-count', get_unread_count, methods=['GET']),
+    Route('/api/suppliers', get_suppliers, methods=['GET']),
+    Route('/api/analytics/overview', get_overview, methods=['GET']),
+    Route('/api/analytics/stock-distribution', get_stock_distribution, methods=['GET']),
+]
@@ -1,28 +1,50 @@
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
+from flask import Blueprint, current_app, request, jsonify
+from flask_jwt_extended import create_access_token, create_refresh_token, jwt_required, get_jwt, get_jwt_identity
 from models import db, User
+from utils.password_hashing import HashingBusy, hash_password, verify_password
+from utils.sharding import configured_sites, resolve_site
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/api/auth')
 
+@auth_bp.errorhandler(HashingBusy)
+def hashing_busy(error):
+    """Shed login/signup load when too many requests are waiting to hash passwords"""
+    response = jsonify({'error': 'Too many sign-ins in progress, please retry shortly'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+def issue_tokens(user, site=None):
+    """Create an access and refresh token pair for a user (optionally bound to a site)"""
+    identity = str(user.id)
+    claims = {'site': site} if site else None
+    return {
+        'access_token': create_access_token(identity=identity, additional_claims=claims),
+        'refresh_token': create_refresh_token(identity=identity, additional_claims=claims)
+    }
+
 @auth_bp.route('/login', methods=['POST'])
 def login():
     """
-    Authenticate user and return JWT token
+    Authenticate user and return JWT tokens
     
     Request body:
         {
             "username": "admin",
-            "password": "password123"
+            "password": "password123",
+            "site": "north"  (optional, routes later requests to that site's database;
+                              must be one of the user's sites unless admin)
         }
     
     Returns:
         {
             "access_token": "jwt_token_here",
+            "refresh_token": "jwt_refresh_token_here",
             "user": {
                 "id": 1,
                 "username": "admin",
                 "role": "admin"
-            }
+            },
+            "site": "north"
         }
     """
     data = request.get_json()
@@ -33,20 +55,54 @@ def login():
     username = data.get('username')
     password = data.get('password')
     
+    try:
+        site = resolve_site(data.get('site'), configured_sites(), current_app.config['MAIN_SITE_NAME'])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
     # Find user
     user = User.query.filter_by(username=username).first()
     
-    if not user or not user.check_password(password):
+    if not user or not verify_password(user.password_hash, password):
         return jsonify({'error': 'Invalid username or password'}), 401
     
-    # Create access token with string identity
-    access_token = create_access_token(identity=str(user.id))
+    if not user.can_use_site(site):
+        return jsonify({'error': f"Access to site {site} is not allowed for this user"}), 403
     
     return jsonify({
-        'access_token': access_token,
-        'user': user.to_dict()
+        **issue_tokens(user, site),
+        'user': user.to_dict(),
+        'site': site
     }), 200
 
+@auth_bp.route('/refresh', methods=['POST'])
+@jwt_required(refresh=True)
+def refresh():
+    """
+    Exchange a refresh token for a new access token (no password check)
+    
+    Headers:
+        Authorization: Bearer <refresh_token>
+    
+    Returns:
+        {
+            "access_token": "jwt_token_here"
+        }
+    """
+    user_id = int(get_jwt_identity())
+    
+    # Primary key lookup so deleted users cannot keep renewing
+    user = db.session.get(User, user_id)
+    if not user:
+        return jsonify({'error': 'User not found'}), 401
+    
+    # Keep the site the tokens were issued for, while the user still has it
+    site = get_jwt().get('site')
+    if not user.can_use_site(site):
+        return jsonify({'error': f"Access to site {site} is not allowed for this user"}), 403
+    claims = {'site': site} if site else None
+    return jsonify({'access_token': create_access_token(identity=str(user_id), additional_claims=claims)}), 200
+
 @auth_bp.route('/register', methods=['POST'])
 @jwt_required()
 def register():
@@ -57,7 +113,8 @@ def register():
         {
             "username": "newuser",
             "password": "password123",
-            "role": "technician"
+            "role": "technician",
+            "sites": ["north"]  (optional, sites the user may sign in to besides the main site)
         }
     
     Returns:
@@ -86,13 +143,26 @@ def register():
     if role not in ['admin', 'technician']:
         return jsonify({'error': 'Invalid role. Must be admin or technician'}), 400
     
+    # Validate sites
+    sites = data.get('sites') or []
+    if not isinstance(sites, list):
+        return jsonify({'error': 'sites must be a list of site codes'}), 400
+    try:
+        sites = [resolve_site(code, configured_sites(), current_app.config['MAIN_SITE_NAME']) for code in sites]
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
     # Check if user already exists
     if User.query.filter_by(username=username).first():
         return jsonify({'error': 'Username already exists'}), 409
     
     # Create new user
-    new_user = User(username=username, role=role)
-    new_user.set_password(password)
+    new_user = User(
+        username=username,
+        role=role,
+        sites=','.join(code for code in sites if code) or None,
+        password_hash=hash_password(password)
+    )
     
     db.session.add(new_user)
     db.session.commit()
@@ -126,18 +196,15 @@ def signup():
         return jsonify({'error': 'Username already exists'}), 409
     
     # Create new user with default role 'technician'
-    new_user = User(username=username, role='technician')
-    new_user.set_password(password)
+    new_user = User(username=username, role='technician', password_hash=hash_password(password))
     
     db.session.add(new_user)
     db.session.commit()
     
-    # Auto-login: Create access token
-    access_token = create_access_token(identity=str(new_user.id))
-    
+    # Auto-login: Create tokens
     return jsonify({
         'message': 'User registered successfully',
-        'access_token': access_token,
+        **issue_tokens(new_user),
         'user': new_user.to_dict()
     }), 201
 
@@ -0,0 +1,89 @@
+import os
+from datetime import datetime
+from flask import Blueprint, jsonify, current_app, send_from_directory
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from models import User
+from utils.backup import NAME_FORMAT, BackupError, create_backup, list_backups, prune_backups
+from utils.scheduler import background, has_background_pool, scheduled_job
+
+backups_bp = Blueprint('backups', __name__, url_prefix='/api/backups')
+
+def _require_admin():
+    """Return an error response unless the current user is an admin"""
+    current_user = User.query.get(int(get_jwt_identity()))
+    if not current_user or current_user.role != 'admin':
+        return jsonify({'error': 'Admin access required'}), 403
+    return None
+
+@backups_bp.route('', methods=['GET'])
+@jwt_required()
+def get_backups():
+    """
+    List finished backups, newest first (admin only)
+    
+    Returns:
+        {
+            "backups": [{"name": "backup-20240301T033000Z.tar.gz", "size": 1048576, "created_at": "..."}],
+            "total": 1
+        }
+    """
+    error = _require_admin()
+    if error:
+        return error
+    
+    backups = list_backups()
+    return jsonify({'backups': backups, 'total': len(backups)}), 200
+
+@backups_bp.route('', methods=['POST'])
+@jwt_required()
+def start_backup():
+    """
+    Start an online backup of the databases, uploads and QR codes (admin only)
+    
+    With the scheduler running, the backup runs on its pool and the response
+    is 202; the backup shows up in GET /api/backups under the returned name
+    once complete. Without a scheduler it is taken during the request and
+    the response is 201 with its manifest.
+    
+    Returns:
+        {
+            "message": "Backup started",
+            "name": "backup-20240301T033000Z.tar.gz",
+            "manifest": {...}  (201 only)
+        }
+    """
+    error = _require_admin()
+    if error:
+        return error
+    
+    name = datetime.utcnow().strftime(NAME_FORMAT)
+    if has_background_pool():
+        background(create_backup, name=name)
+        return jsonify({'message': 'Backup started', 'name': name}), 202
+    
+    try:
+        manifest = create_backup(name=name)
+    except BackupError as e:
+        current_app.logger.error(f"Backup failed: {str(e)}")
+        return jsonify({'error': f'Backup failed: {str(e)}'}), 500
+    manifest.pop('path')
+    return jsonify({'message': 'Backup created', 'name': name, 'manifest': manifest}), 201
+
+@backups_bp.route('/<name>', methods=['GET'])
+@jwt_required()
+def download_backup(name):
+    """Download a backup archive (admin only)"""
+    error = _require_admin()
+    if error:
+        return error
+    
+    if name not in {b['name'] for b in list_backups()}:
+        return jsonify({'error': 'Backup not found'}), 404
+    return send_from_directory(os.path.abspath(current_app.config['BACKUP_DIR']), name, as_attachment=True)
+
+@scheduled_job('backup', cron='30 3 * * *', per_site=False)
+def backup_job():
+    """Nightly online backup, keeping the newest BACKUP_KEEP archives"""
+    manifest = create_backup()
+    removed = prune_backups(current_app.config['BACKUP_KEEP'])
+    return f"{os.path.basename(manifest['path'])}, pruned {removed}"
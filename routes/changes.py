@@ -0,0 +1,52 @@
+import json
+from flask import Blueprint, Response, request, jsonify
+from flask_jwt_extended import jwt_required
+from utils.change_log import read_changes, wait_for_changes
+
+changes_bp = Blueprint('changes', __name__, url_prefix='/api/changes')
+
+MAX_LIMIT = 10000
+MAX_WAIT = 30
+
+@changes_bp.route('', methods=['GET'])
+@jwt_required()
+def get_changes():
+    """
+    Stream stock changes after an offset as NDJSON
+    
+    Consumers keep the offset of the last line they processed and pass it
+    back as since= to resume. X-Next-Offset holds the offset to use next.
+    
+    Query parameters:
+        - since: Last processed offset (default: 0)
+        - limit: Maximum changes (default: 1000, max: 10000)
+        - wait: Seconds to wait for new changes when there are none (default: 0, max: 30)
+    
+    Returns:
+        application/x-ndjson, one change per line:
+        {"offset": 42, "part_id": 1, "change_type": "OUT", "quantity_before": 10,
+         "quantity_after": 7, "delta": -3, "transaction_id": 17, "user_id": 2,
+         "created_at": "..."}
+    """
+    try:
+        since = max(int(request.args.get('since', 0)), 0)
+        limit = min(max(int(request.args.get('limit', 1000)), 1), MAX_LIMIT)
+        wait = min(max(float(request.args.get('wait', 0)), 0), MAX_WAIT)
+    except ValueError:
+        return jsonify({'error': 'since, limit and wait must be numbers'}), 400
+    
+    if wait:
+        wait_for_changes(since, wait)
+    
+    changes = read_changes(since, limit)
+    next_offset = changes[-1]['offset'] if changes else since
+    
+    def generate():
+        for change in changes:
+            yield json.dumps(change, separators=(',', ':')) + '\n'
+    
+    return Response(
+        generate(),
+        mimetype='application/x-ndjson',
+        headers={'X-Next-Offset': str(next_offset)}
+    )
@@ -0,0 +1,60 @@
+from datetime import datetime, time, timezone
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required
+from utils.scheduler import scheduled_job
+from utils.snapshots import inventory_as_of, take_stock_snapshot, prune_stock_snapshots
+
+inventory_bp = Blueprint('inventory', __name__, url_prefix='/api/inventory')
+
+def parse_as_of(value):
+    """Parse an ISO date/datetime into a naive UTC datetime (date-only means end of day)"""
+    value = value.strip()
+    if len(value) == 10:
+        return datetime.combine(datetime.fromisoformat(value).date(), time.max)
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+@inventory_bp.route('/as-of', methods=['GET'])
+@jwt_required()
+def get_inventory_as_of():
+    """
+    Get stock levels as they were at a point in time
+
+    Query parameters:
+        - date: ISO date or datetime (required, UTC)
+        - part_id: Restrict to a single part
+
+    Returns:
+        {
+            "as_of": "2024-03-01T23:59:59.999999",
+            "base": {"type": "snapshot", "taken_at": "..."},
+            "parts": [...],
+            "total": 100
+        }
+    """
+    date = request.args.get('date', '')
+    if not date:
+        return jsonify({'error': 'date is required'}), 400
+
+    try:
+        as_of = parse_as_of(date)
+    except ValueError:
+        return jsonify({'error': 'Invalid date. Use ISO format (YYYY-MM-DD)'}), 400
+
+    part_id = request.args.get('part_id')
+    base, parts = inventory_as_of(as_of, int(part_id) if part_id else None)
+
+    return jsonify({
+        'as_of': as_of.isoformat(),
+        'base': base,
+        'parts': parts,
+        'total': len(parts)
+    }), 200
+
+@scheduled_job('snapshot-stock', cron='5 0 * * *')
+def snapshot_stock_job():
+    """Daily stock snapshot, thinning out snapshots past the retention window"""
+    _, count = take_stock_snapshot()
+    return f'{count} parts, pruned {prune_stock_snapshots()}'
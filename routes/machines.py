@@ -0,0 +1,195 @@
+from datetime import datetime
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required
+from sqlalchemy import func, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from models import db, Machine, SparePart
+from utils.cache import cached
+from utils.time_buckets import BUCKETS, bucket_expression, format_bucket
+from utils.transaction_archive import transaction_movements
+
+machines_bp = Blueprint('machines', __name__, url_prefix='/api/machines')
+
+def insert_ignoring_existing_machines():
+    """
+    Build an INSERT into machines that skips names which already exist
+    
+    Relies on the unique index on machines.name, so concurrent stock
+    movements naming the same new machine cannot both insert it.
+    """
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        return sqlite.insert(Machine).on_conflict_do_nothing()
+    if dialect == 'postgresql':
+        return postgresql.insert(Machine).on_conflict_do_nothing()
+    return insert(Machine)
+
+def resolve_machine_id(name):
+    """
+    Get the ID of the machine with the given name, creating it if needed
+
+    Returns:
+        int: Machine ID, or None for an empty name
+    """
+    name = (name or '').strip()
+    if not name:
+        return None
+
+    lookup = select(Machine.id).where(Machine.name == name)
+    machine_id = db.session.execute(lookup).scalar()
+    if machine_id is None:
+        db.session.execute(insert_ignoring_existing_machines().values(name=name))
+        machine_id = db.session.execute(lookup).scalar()
+    return machine_id
+
+def date_range_args():
+    """Parse the start_date/end_date query parameters (invalid dates are ignored)"""
+    bounds = []
+    for name in ('start_date', 'end_date'):
+        value = request.args.get(name)
+        bound = None
+        if value:
+            try:
+                bound = datetime.fromisoformat(value.replace('Z', '+00:00'))
+            except ValueError:
+                pass
+        bounds.append(bound)
+    return tuple(bounds)
+
+def apply_date_range(query, timestamp, start, end):
+    """Filter a transactions query on a timestamp column by a parsed date range"""
+    if start:
+        query = query.filter(timestamp >= start)
+    if end:
+        query = query.filter(timestamp <= end)
+    return query
+
+@machines_bp.route('', methods=['GET'])
+@jwt_required()
+def get_machines():
+    """Get all machines"""
+    machines = Machine.query.order_by(Machine.name).all()
+    return jsonify({
+        'machines': [m.to_dict() for m in machines],
+        'total': len(machines)
+    }), 200
+
+@machines_bp.route('/usage', methods=['GET'])
+@jwt_required()
+@cached(tags=('transactions', 'machines'))
+def get_machine_usage():
+    """
+    Get machines ranked by parts consumed (OUT transactions)
+
+    Query parameters:
+        - start_date: From date (ISO format)
+        - end_date: To date (ISO format)
+        - limit: Number of machines (default: 10)
+
+    Returns:
+        {
+            "machines": [
+                {"machine_id": 1, "machine": "Press 3", "total_quantity": 120,
+                 "transaction_count": 14, "distinct_parts": 5}
+            ]
+        }
+    """
+    limit = int(request.args.get('limit', 10))
+    start, end = date_range_args()
+
+    # Ranges past the hot window continue into the archive
+    tx = transaction_movements(start)
+    total_quantity = func.sum(tx.c.quantity)
+    query = db.session.query(
+        Machine.id,
+        Machine.name,
+        total_quantity.label('total_quantity'),
+        func.count().label('transaction_count'),
+        func.count(func.distinct(tx.c.part_id)).label('distinct_parts')
+    ).join(tx, tx.c.machine_id == Machine.id)\
+     .filter(tx.c.type == 'OUT')
+
+    query = apply_date_range(query, tx.c.timestamp, start, end)
+    rows = query.group_by(Machine.id, Machine.name)\
+        .order_by(total_quantity.desc())\
+        .limit(limit).all()
+
+    return jsonify({
+        'machines': [
+            {
+                'machine_id': machine_id,
+                'machine': name,
+                'total_quantity': int(qty or 0),
+                'transaction_count': count,
+                'distinct_parts': parts
+            }
+            for machine_id, name, qty, count, parts in rows
+        ]
+    }), 200
+
+@machines_bp.route('/<int:machine_id>/usage', methods=['GET'])
+@jwt_required()
+@cached(tags=('transactions', 'machines', 'spare_parts'))
+def get_machine_part_usage(machine_id):
+    """
+    Get parts consumed by one machine, in total and over time
+
+    Query parameters:
+        - bucket: hour, day, week or month (default: day)
+        - start_date: From date (ISO format)
+        - end_date: To date (ISO format)
+        - limit: Number of top parts (default: 10)
+
+    Returns:
+        {
+            "machine": {...},
+            "top_parts": [{"part_id": 1, "part_name": "...", "total_quantity": 30}],
+            "series": [{"period": "2024-03-01", "total_quantity": 8, "distinct_parts": 2}]
+        }
+    """
+    machine = Machine.query.get(machine_id)
+    if not machine:
+        return jsonify({'error': 'Machine not found'}), 404
+
+    bucket = request.args.get('bucket', 'day').lower()
+    if bucket not in BUCKETS:
+        return jsonify({'error': f"Invalid bucket. Must be one of: {', '.join(BUCKETS)}"}), 400
+
+    limit = int(request.args.get('limit', 10))
+    start, end = date_range_args()
+    tx = transaction_movements(start)
+
+    # Top parts for this machine
+    total_quantity = func.sum(tx.c.quantity)
+    top_query = db.session.query(
+        SparePart.id,
+        SparePart.name,
+        total_quantity.label('total_quantity')
+    ).join(tx, tx.c.part_id == SparePart.id)\
+     .filter(tx.c.machine_id == machine_id, tx.c.type == 'OUT')
+    top_parts = apply_date_range(top_query, tx.c.timestamp, start, end)\
+        .group_by(SparePart.id, SparePart.name)\
+        .order_by(total_quantity.desc())\
+        .limit(limit).all()
+
+    # Consumption over time
+    period = bucket_expression(tx.c.timestamp, bucket).label('period')
+    series_query = db.session.query(
+        period,
+        func.sum(tx.c.quantity).label('total_quantity'),
+        func.count(func.distinct(tx.c.part_id)).label('distinct_parts')
+    ).filter(tx.c.machine_id == machine_id, tx.c.type == 'OUT')
+    series = apply_date_range(series_query, tx.c.timestamp, start, end).group_by(period).order_by(period).all()
+
+    return jsonify({
+        'machine': machine.to_dict(),
+        'bucket': bucket,
+        'top_parts': [
+            {'part_id': part_id, 'part_name': name, 'total_quantity': int(qty or 0)}
+            for part_id, name, qty in top_parts
+        ],
+        'series': [
+            {'period': format_bucket(p), 'total_quantity': int(qty or 0), 'distinct_parts': parts}
+            for p, qty, parts in series
+        ]
+    }), 200
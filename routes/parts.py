@@ -1,42 +1,74 @@
 import os
-from flask import Blueprint, request, jsonify, current_app, send_file
+from datetime import datetime
+from flask import Blueprint, Response, request, jsonify, current_app, send_file
+from sqlalchemy import update
+from sqlalchemy.orm import load_only
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from werkzeug.utils import secure_filename
-from models import db, SparePart, User, Alert
+from models import db, SparePart, User
 from utils.qr_generator import generate_qr_code, generate_qr_code_base64
-from utils.email_service import send_low_stock_alert
+from utils.label_sheets import LabelsBusy, render_label_sheets
+from utils.scheduler import scheduled_job
+from utils.alert_service import (
+    evaluate_low_stock, evaluate_low_stock_bulk, alerted_parts,
+    notify_low_stock, notify_low_stock_digest
+)
+from utils.stock_cube import adjust_stock_cube
+from utils.storage import store_stream
+from utils.fieldsets import parse_fields, apply_fieldset, serialize
 
 parts_bp = Blueprint('parts', __name__, url_prefix='/api/parts')
 
+def _optional_int(value):
+    return int(value) if value not in (None, '') else None
+
+def _stripped(value):
+    return str(value or '').strip()
+
+# Fields accepted by the bulk update endpoint and their converters
+BULK_UPDATE_FIELDS = {
+    'min_quantity': int,
+    'location': _stripped,
+    'category': _stripped,
+    'supplier_id': _optional_int
+}
+
 def allowed_file(filename):
     """Check if file extension is allowed"""
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in current_app.config['ALLOWED_EXTENSIONS']
 
-@parts_bp.route('', methods=['GET'])
-@jwt_required()
-def get_parts():
+def save_image(file):
     """
-    Get all spare parts with optional filters
+    Store an uploaded image in content-addressed storage
     
-    Query parameters:
-        - search: Search by name or description
-        - category: Filter by category
-        - location: Filter by location
-        - low_stock: Filter low stock items (true/false)
+    Returns:
+        str: Public URL of the stored image, or None if the file is not allowed
+    """
+    if not file or not file.filename or not allowed_file(file.filename):
+        return None
+    
+    # allowed_file already checked the extension against ALLOWED_EXTENSIONS
+    extension = file.filename.rsplit('.', 1)[1].lower()
+    rel_path = store_stream(file.stream, current_app.config['UPLOAD_FOLDER'], extension)
+    return f"/uploads/{rel_path}"
+
+def part_filter_conditions(params):
+    """
+    Build SQL conditions for the part list filters
+    
+    Args:
+        params: Mapping with optional search, category, location, supplier_id
+                and low_stock keys (query args or a JSON filter object)
     
     Returns:
-        {
-            "parts": [...],
-            "total": 100
-        }
+        list: SQLAlchemy conditions to AND together
     """
-    query = SparePart.query
+    conditions = []
     
     # Search filter
-    search = request.args.get('search', '').strip()
+    search = str(params.get('search') or '').strip()
     if search:
-        query = query.filter(
+        conditions.append(
             db.or_(
                 SparePart.name.ilike(f'%{search}%'),
                 SparePart.description.ilike(f'%{search}%')
@@ -44,25 +76,60 @@ def get_parts():
         )
     
     # Category filter
-    category = request.args.get('category', '').strip()
+    category = str(params.get('category') or '').strip()
     if category:
-        query = query.filter(SparePart.category == category)
+        conditions.append(SparePart.category == category)
     
     # Location filter
-    location = request.args.get('location', '').strip()
+    location = str(params.get('location') or '').strip()
     if location:
-        query = query.filter(SparePart.location == location)
+        conditions.append(SparePart.location == location)
+    
+    # Supplier filter
+    supplier_id = params.get('supplier_id')
+    if supplier_id not in (None, ''):
+        conditions.append(SparePart.supplier_id == int(supplier_id))
     
     # Low stock filter
-    low_stock = request.args.get('low_stock', '').lower()
+    low_stock = str(params.get('low_stock') or '').lower()
     if low_stock == 'true':
-        query = query.filter(SparePart.quantity <= SparePart.min_quantity)
+        conditions.append(SparePart.quantity <= SparePart.min_quantity)
+    
+    return conditions
+
+@parts_bp.route('', methods=['GET'])
+@jwt_required()
+def get_parts():
+    """
+    Get all spare parts with optional filters
+    
+    Query parameters:
+        - search: Search by name or description
+        - category: Filter by category
+        - location: Filter by location
+        - supplier_id: Filter by supplier
+        - low_stock: Filter low stock items (true/false)
+        - fields: Comma-separated fields to return (e.g. id,name,quantity)
+    
+    Returns:
+        {
+            "parts": [...],
+            "total": 100
+        }
+    """
+    try:
+        fields = parse_fields(SparePart, request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    query = SparePart.query.filter(*part_filter_conditions(request.args))
+    query = apply_fieldset(query, SparePart, fields)
     
     # Get all parts
     parts = query.order_by(SparePart.name).all()
     
     return jsonify({
-        'parts': [part.to_dict() for part in parts],
+        'parts': [serialize(part, fields) for part in parts],
         'total': len(parts)
     }), 200
 
@@ -122,19 +189,7 @@ def create_part():
     # Handle image upload
     image_url = None
     if 'image' in request.files:
-        file = request.files['image']
-        if file and file.filename and allowed_file(file.filename):
-            filename = secure_filename(file.filename)
-            # Add timestamp to avoid conflicts
-            import time
-            filename = f"{int(time.time())}_{filename}"
-            
-            upload_folder = current_app.config['UPLOAD_FOLDER']
-            os.makedirs(upload_folder, exist_ok=True)
-            
-            filepath = os.path.join(upload_folder, filename)
-            file.save(filepath)
-            image_url = f"/uploads/{filename}"
+        image_url = save_image(request.files['image'])
     
     # Create new part
     new_part = SparePart(
@@ -152,14 +207,16 @@ def create_part():
     db.session.flush()  # Get the ID before commit
     
     # Generate QR code
-    qr_code_url = generate_qr_code(str(new_part.id), new_part.id)
+    qr_code_url = generate_qr_code(str(new_part.id), current_app.config['QR_CODE_FOLDER'])
     new_part.qr_code_url = qr_code_url
     
+    # Open low stock alert in the same transaction
+    alert_opened = evaluate_low_stock(new_part)
+    
     db.session.commit()
     
-    # Check if low stock alert needed
-    if new_part.is_low_stock:
-        create_low_stock_alert(new_part)
+    if alert_opened:
+        notify_low_stock(new_part)
     
     return jsonify({
         'message': 'Part created successfully',
@@ -186,6 +243,9 @@ def update_part(part_id):
     if not part:
         return jsonify({'error': 'Part not found'}), 404
     
+    previous_quantity = part.quantity
+    previous_min_quantity = part.min_quantity
+    
     # Update fields
     if 'name' in request.form:
         part.name = request.form.get('name', '').strip()
@@ -205,30 +265,108 @@ def update_part(part_id):
     
     # Handle image upload
     if 'image' in request.files:
-        file = request.files['image']
-        if file and file.filename and allowed_file(file.filename):
-            filename = secure_filename(file.filename)
-            import time
-            filename = f"{int(time.time())}_{filename}"
-            
-            upload_folder = current_app.config['UPLOAD_FOLDER']
-            os.makedirs(upload_folder, exist_ok=True)
-            
-            filepath = os.path.join(upload_folder, filename)
-            file.save(filepath)
-            part.image_url = f"/uploads/{filename}"
+        image_url = save_image(request.files['image'])
+        if image_url:
+            part.image_url = image_url
+    
+    # Open low stock alert in the same transaction if the part crossed its threshold
+    alert_opened = evaluate_low_stock(part, previous_quantity, previous_min_quantity)
     
     db.session.commit()
     
-    # Check if low stock alert needed
-    if part.is_low_stock:
-        create_low_stock_alert(part)
+    if alert_opened:
+        notify_low_stock(part)
     
     return jsonify({
         'message': 'Part updated successfully',
         'part': part.to_dict()
     }), 200
 
+@parts_bp.route('', methods=['PATCH'])
+@jwt_required()
+def bulk_update_parts():
+    """
+    Apply the same field changes to many parts with one UPDATE
+    
+    Request body:
+        {
+            "ids": [1, 2, 3],                              # or
+            "filter": {"location": "Shelf A", "category": "Bearings"},
+            "changes": {"min_quantity": 5, "location": "Shelf B"}
+        }
+    
+    Filter keys are the same as the list endpoint (search, category,
+    location, supplier_id, low_stock). Changeable fields: min_quantity,
+    location, category, supplier_id. Parts that become low stock because
+    of a new min_quantity get alerts in the same transaction.
+    
+    Returns:
+        {
+            "message": "Parts updated successfully",
+            "updated": 42,
+            "alerts_opened": 3
+        }
+    """
+    data = request.get_json()
+    if not data or not isinstance(data.get('changes'), dict) or not data['changes']:
+        return jsonify({'error': 'changes is required'}), 400
+    
+    changes = data['changes']
+    unknown = sorted(set(changes) - set(BULK_UPDATE_FIELDS))
+    if unknown:
+        return jsonify({
+            'error': f"Unsupported field(s): {', '.join(unknown)}. Allowed: {', '.join(BULK_UPDATE_FIELDS)}"
+        }), 400
+    
+    try:
+        values = {field: BULK_UPDATE_FIELDS[field](value) for field, value in changes.items()}
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid value in changes'}), 400
+    
+    # Target set: explicit ids or a filter expression
+    if data.get('ids'):
+        try:
+            where = SparePart.id.in_([int(i) for i in data['ids']])
+        except (TypeError, ValueError):
+            return jsonify({'error': 'ids must be a list of integers'}), 400
+    elif isinstance(data.get('filter'), dict) and data['filter']:
+        conditions = part_filter_conditions(data['filter'])
+        if not conditions:
+            return jsonify({'error': 'filter matched no supported keys'}), 400
+        where = db.and_(*conditions)
+    else:
+        return jsonify({'error': 'ids or filter is required'}), 400
+    
+    now = datetime.utcnow()
+    
+    # Alerts for parts crossing the new threshold (evaluated against the old one)
+    alerts_opened = 0
+    if 'min_quantity' in values:
+        alerts_opened = evaluate_low_stock_bulk(where, values['min_quantity'], now)
+    
+    # Keep the stock cube in step: remove the old contribution, update, add back.
+    # Updated rows are found again by their updated_at, since the changes may
+    # move them out of the filter.
+    adjust_stock_cube(where, -1)
+    result = db.session.execute(
+        update(SparePart)
+        .where(where)
+        .values(**values, updated_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    adjust_stock_cube(SparePart.updated_at == now, 1)
+    
+    db.session.commit()
+    
+    if alerts_opened:
+        notify_low_stock_digest(alerted_parts(now))
+    
+    return jsonify({
+        'message': 'Parts updated successfully',
+        'updated': result.rowcount,
+        'alerts_opened': alerts_opened
+    }), 200
+
 @parts_bp.route('/<int:part_id>', methods=['DELETE'])
 @jwt_required()
 def delete_part(part_id):
@@ -271,34 +409,64 @@ def get_qr_code(part_id):
         'qr_code': qr_base64
     }), 200
 
-def create_low_stock_alert(part):
-    """Create alert for low stock part"""
-    # Check if alert already exists for this part (unseen)
-    existing_alert = Alert.query.filter_by(
-        part_id=part.id,
-        seen=False
-    ).first()
-    
-    if existing_alert:
-        return  # Alert already exists
-    
-    # Create new alert
-    message = f"Low stock alert: {part.name} has {part.quantity} units (minimum: {part.min_quantity})"
-    alert = Alert(
-        part_id=part.id,
-        message=message
-    )
+@parts_bp.route('/labels', methods=['GET'])
+@jwt_required()
+def get_label_sheets():
+    """
+    Print QR code labels for many parts at once
     
-    db.session.add(alert)
-    db.session.commit()
+    Query parameters:
+        - format: pdf or png (default: pdf)
+        - columns: Labels per row (default: 3)
+        - rows: Label rows per page (default: 8)
+        - search, category, location, supplier_id, low_stock: Same filters as the list endpoint
     
-    # Send email notification
+    Returns:
+        A4 label sheets streamed as a PDF, a PNG (one page) or a zip of PNG pages
+    """
+    fmt = request.args.get('format', 'pdf').lower()
     try:
-        send_low_stock_alert(
-            part.name,
-            part.quantity,
-            part.min_quantity,
-            part.id
-        )
-    except Exception as e:
-        current_app.logger.error(f"Failed to send email alert: {str(e)}")
+        columns = int(request.args.get('columns', 3))
+        rows = int(request.args.get('rows', 8))
+    except ValueError:
+        return jsonify({'error': 'columns and rows must be integers'}), 400
+    
+    labels = db.session.query(SparePart.id, SparePart.name)\
+        .filter(*part_filter_conditions(request.args))\
+        .order_by(SparePart.location, SparePart.name)\
+        .all()
+    
+    try:
+        chunks, mimetype, extension = render_label_sheets(labels, fmt, columns, rows)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except LabelsBusy:
+        response = jsonify({'error': 'Too many label sheets rendering, please retry shortly'})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+    
+    return Response(
+        chunks,
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=labels.{extension}'}
+    )
+
+@scheduled_job('regenerate-qr-codes', cron='0 3 * * *')
+def regenerate_qr_codes_job():
+    """Regenerate QR images missing from QR_CODE_FOLDER (e.g. after restoring only the database)"""
+    folder = current_app.config['QR_CODE_FOLDER']
+    count = 0
+    for part in SparePart.query.options(load_only(SparePart.id, SparePart.qr_code_url)).all():
+        if part.qr_code_url and os.path.exists(os.path.join(folder, part.qr_code_url.removeprefix('/qrcodes/'))):
+            continue
+        part.qr_code_url = generate_qr_code(str(part.id), folder)
+        count += 1
+    db.session.commit()
+    return count
+
+@scheduled_job('recompute-reorder-points', cron='30 1 * * *')
+def recompute_reorder_points_job():
+    """Refresh suggested reorder points from OUT history (min_quantity is left alone)"""
+    from utils.reorder_engine import recompute_reorder_points
+    
+    return recompute_reorder_points()
@@ -0,0 +1,79 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required
+from sqlalchemy import and_, false
+from sqlalchemy.orm import contains_eager, joinedload
+from models import db, SparePart, Transaction, Alert
+
+scan_bp = Blueprint('scan', __name__, url_prefix='/api/scan')
+
+def parse_scan_code(code):
+    """
+    Get the part ID from a scanned QR code
+    
+    Accepts the bare ID encoded in part QR codes, plus '#123' as printed
+    on label sheets.
+    
+    Returns:
+        int: Part ID, or None if the code is not a part code
+    """
+    code = code.strip().lstrip('#')
+    return int(code) if code.isdigit() else None
+
+@scan_bp.route('/<path:code>', methods=['GET'])
+@jwt_required()
+def scan(code):
+    """
+    Resolve a scanned QR code in one round trip
+    
+    Two indexed queries: the part with its supplier and open alert (at most
+    one, by the partial unique index), then its latest transactions.
+    
+    Query parameters:
+        - transactions: Number of recent transactions (default: 5, max: 50)
+    
+    Returns:
+        {
+            "part": {...},
+            "supplier": {...} or null,
+            "open_alert": {...} or null,
+            "transactions": [...]
+        }
+    """
+    part_id = parse_scan_code(code)
+    if part_id is None:
+        return jsonify({'error': 'Not a part code'}), 400
+    
+    try:
+        limit = min(max(int(request.args.get('transactions', 5)), 0), 50)
+    except ValueError:
+        return jsonify({'error': 'transactions must be an integer'}), 400
+    
+    row = db.session.query(SparePart, Alert)\
+        .outerjoin(SparePart.supplier)\
+        .outerjoin(Alert, and_(Alert.part_id == SparePart.id, Alert.seen == false()))\
+        .options(contains_eager(SparePart.supplier))\
+        .filter(SparePart.id == part_id)\
+        .first()
+    
+    if not row:
+        return jsonify({'error': 'Part not found'}), 404
+    
+    part, alert = row
+    
+    transactions = []
+    if limit:
+        # Served by the (part_id, timestamp) index; the part is already in
+        # the session, so only users need joining for to_dict
+        transactions = Transaction.query\
+            .options(joinedload(Transaction.user))\
+            .filter(Transaction.part_id == part_id)\
+            .order_by(Transaction.timestamp.desc())\
+            .limit(limit)\
+            .all()
+    
+    return jsonify({
+        'part': part.to_dict(),
+        'supplier': part.supplier.to_dict() if part.supplier else None,
+        'open_alert': alert.to_dict() if alert else None,
+        'transactions': [t.to_dict() for t in transactions]
+    }), 200
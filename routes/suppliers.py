@@ -1,17 +1,138 @@
+from datetime import datetime, timedelta
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required
-from models import db, Supplier
+from sqlalchemy import exists, func, select
+from models import db, Supplier, SparePart, Transaction, StockAggregate
+from utils.fieldsets import parse_fields, apply_fieldset, serialize
+from utils.sharding import configured_sites, fan_out
 
 suppliers_bp = Blueprint('suppliers', __name__, url_prefix='/api/suppliers')
 
+STAT_KEYS = ('part_count', 'low_stock_count', 'inbound_quantity', 'inbound_transactions')
+
+def supplier_stats_selects(since):
+    """
+    Grouped SELECTs of one site database's supplier scorecard stats
+    
+    Part counts come from the stock cube, inbound volume from IN transactions
+    since the given time. Rows are (supplier_id, part_count, low_stock_count)
+    and (supplier_id, inbound_quantity, inbound_transactions).
+    """
+    part_stats = select(
+        StockAggregate.supplier_id.label('supplier_id'),
+        func.sum(StockAggregate.part_count).label('part_count'),
+        func.sum(StockAggregate.low_stock_count).label('low_stock_count')
+    ).group_by(StockAggregate.supplier_id)
+    
+    inbound = select(
+        SparePart.supplier_id.label('supplier_id'),
+        func.sum(Transaction.quantity).label('inbound_quantity'),
+        func.count(Transaction.id).label('inbound_transactions')
+    ).join(Transaction, Transaction.part_id == SparePart.id)\
+     .where(Transaction.type == 'IN', Transaction.timestamp >= since)\
+     .group_by(SparePart.supplier_id)
+    
+    return part_stats, inbound
+
+def merge_supplier_stats(site_results):
+    """
+    Sum per-site results of supplier_stats_selects
+    
+    Suppliers are shared by every site while their parts live in the site
+    databases, so a scorecard covers all sites.
+    
+    Args:
+        site_results: (part stat rows, inbound rows) per site database
+    
+    Returns:
+        dict: {supplier_id: {part_count, low_stock_count, inbound_quantity, inbound_transactions}}
+    """
+    stats = {}
+    for part_rows, inbound_rows in site_results:
+        for supplier_id, part_count, low_stock_count in part_rows:
+            entry = stats.setdefault(supplier_id, dict.fromkeys(STAT_KEYS, 0))
+            entry['part_count'] += int(part_count or 0)
+            entry['low_stock_count'] += int(low_stock_count or 0)
+        for supplier_id, inbound_quantity, inbound_transactions in inbound_rows:
+            entry = stats.setdefault(supplier_id, dict.fromkeys(STAT_KEYS, 0))
+            entry['inbound_quantity'] += int(inbound_quantity or 0)
+            entry['inbound_transactions'] += int(inbound_transactions or 0)
+    return stats
+
+def join_supplier_stats(stmt, selects):
+    """
+    Outer-join supplier_stats_selects onto a select(Supplier) as one statement
+    
+    For a single database (no site sharding). Rows are (supplier,
+    part_count, low_stock_count, inbound_quantity, inbound_transactions).
+    """
+    part_stats, inbound = (s.subquery() for s in selects)
+    return stmt.add_columns(
+        func.coalesce(part_stats.c.part_count, 0),
+        func.coalesce(part_stats.c.low_stock_count, 0),
+        func.coalesce(inbound.c.inbound_quantity, 0),
+        func.coalesce(inbound.c.inbound_transactions, 0)
+    ).outerjoin(part_stats, part_stats.c.supplier_id == Supplier.id)\
+     .outerjoin(inbound, inbound.c.supplier_id == Supplier.id)
+
+def supplier_with_stats(supplier, entry, fields=None):
+    """Serialize a supplier with its stats (a merge_supplier_stats entry or None)"""
+    data = serialize(supplier, fields)
+    data.update(entry or dict.fromkeys(STAT_KEYS, 0))
+    return data
+
+def joined_supplier_with_stats(row, fields=None):
+    """Serialize a join_supplier_stats row"""
+    supplier, *values = row
+    return supplier_with_stats(supplier, dict(zip(STAT_KEYS, map(int, values))), fields)
+
 @suppliers_bp.route('', methods=['GET'])
 @jwt_required()
 def get_suppliers():
-    """Get all suppliers"""
-    suppliers = Supplier.query.order_by(Supplier.name).all()
+    """
+    Get all suppliers
+    
+    Query parameters:
+        - include_stats: Add part counts, low stock counts and recent inbound
+          volume per supplier (true/false)
+        - days: Inbound volume window in days (default: 30)
+        - fields: Comma-separated supplier fields to return (e.g. id,name)
+    """
+    try:
+        fields = parse_fields(Supplier, request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    include_stats = request.args.get('include_stats', '').lower() == 'true'
+    if not include_stats:
+        suppliers = apply_fieldset(Supplier.query, Supplier, fields).order_by(Supplier.name).all()
+        return jsonify({
+            'suppliers': [serialize(s, fields) for s in suppliers],
+            'total': len(suppliers)
+        }), 200
+    
+    days = int(request.args.get('days', 30))
+    since = datetime.utcnow() - timedelta(days=days)
+    
+    selects = supplier_stats_selects(since)
+    stmt = apply_fieldset(select(Supplier), Supplier, fields).order_by(Supplier.name)
+    if configured_sites():
+        # Parts live in every site database: aggregate each, then merge
+        stats = merge_supplier_stats(fan_out(lambda: [db.session.execute(s).all() for s in selects]))
+        suppliers = [
+            supplier_with_stats(supplier, stats.get(supplier.id), fields)
+            for supplier in db.session.scalars(stmt)
+        ]
+    else:
+        suppliers = [
+            joined_supplier_with_stats(row, fields)
+            for row in db.session.execute(join_supplier_stats(stmt, selects))
+        ]
+    
     return jsonify({
-        'suppliers': [s.to_dict() for s in suppliers],
-        'total': len(suppliers)
+        'suppliers': suppliers,
+        'total': len(suppliers),
+        'days': days
     }), 200
 
 @suppliers_bp.route('', methods=['POST'])
@@ -87,8 +208,11 @@ def delete_supplier(supplier_id):
     if not supplier:
         return jsonify({'error': 'Supplier not found'}), 404
     
-    # Check if supplier has associated parts
-    if supplier.spare_parts:
+    # Check if supplier has associated parts on any site (EXISTS, without loading them)
+    has_parts = any(fan_out(
+        lambda: db.session.query(exists().where(SparePart.supplier_id == supplier_id)).scalar()
+    ))
+    if has_parts:
         return jsonify({'error': 'Cannot delete supplier with associated spare parts'}), 400
     
     db.session.delete(supplier)
@@ -1,17 +1,30 @@
-from flask import Blueprint, request, jsonify
+import io
+import csv
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from sqlalchemy import select
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import db, Transaction, SparePart, User, Alert
-from utils.email_service import send_low_stock_alert
+from models import db, Transaction, SparePart, User, Machine
+from utils.alert_service import evaluate_low_stock, notify_low_stock
+from utils.idempotency import after_movement, commit_movement, idempotent, purge_expired_keys
+from utils.fieldsets import parse_fields, apply_fieldset, serialize
+from utils.scheduler import scheduled_job
+from utils.transaction_archive import archive_transactions, transaction_tiers
+from routes.machines import resolve_machine_id
 from datetime import datetime
 
 transactions_bp = Blueprint('transactions', __name__, url_prefix='/api/transactions')
 
 @transactions_bp.route('/in', methods=['POST'])
 @jwt_required()
+@idempotent
 def stock_in():
     """
     Add stock (IN transaction)
     
+    Headers:
+        - Idempotency-Key: Optional client-generated key; retries with the
+          same key return the original response without changing stock
+    
     Request body:
         {
             "part_id": 1,
@@ -51,6 +64,7 @@ def stock_in():
         part_id=part_id,
         type='IN',
         quantity=quantity,
+        machine_id=resolve_machine_id(machine),
         machine=machine,
         notes=notes
     )
@@ -59,7 +73,7 @@ def stock_in():
     part.quantity += quantity
     
     db.session.add(transaction)
-    db.session.commit()
+    commit_movement()
     
     return jsonify({
         'message': 'Stock added successfully',
@@ -69,10 +83,14 @@ def stock_in():
 
 @transactions_bp.route('/out', methods=['POST'])
 @jwt_required()
+@idempotent
 def stock_out():
     """
     Remove stock (OUT transaction)
     
+    Headers:
+        - Idempotency-Key: Optional, see stock_in
+    
     Request body:
         {
             "part_id": 1,
@@ -118,19 +136,24 @@ def stock_out():
         part_id=part_id,
         type='OUT',
         quantity=quantity,
+        machine_id=resolve_machine_id(machine),
         machine=machine,
         notes=notes
     )
     
     # Update part quantity
+    previous_quantity = part.quantity
     part.quantity -= quantity
     
     db.session.add(transaction)
-    db.session.commit()
     
-    # Check if low stock alert needed
-    if part.is_low_stock:
-        create_low_stock_alert(part)
+    # Open low stock alert in the same transaction if the part crossed its threshold
+    alert_opened = evaluate_low_stock(part, previous_quantity)
+    
+    commit_movement()
+    
+    if alert_opened:
+        after_movement(notify_low_stock, part)
     
     return jsonify({
         'message': 'Stock removed successfully',
@@ -138,19 +161,80 @@ def stock_out():
         'part': part.to_dict()
     }), 201
 
+def _parse_date(value):
+    """Parse an ISO date parameter (None when missing or invalid, which disables the filter)"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+
+def transaction_filter_conditions(model, params):
+    """
+    SQL conditions for the transaction list/export filters
+    
+    Built against a tier model (Transaction or TransactionArchive), so the
+    same filters apply to hot and archived transactions.
+    """
+    conditions = []
+    
+    # Part filter
+    part_id = params.get('part_id')
+    if part_id:
+        conditions.append(model.part_id == int(part_id))
+    
+    # User filter
+    user_id = params.get('user_id')
+    if user_id:
+        conditions.append(model.user_id == int(user_id))
+    
+    # Type filter
+    trans_type = (params.get('type') or '').upper()
+    if trans_type in ['IN', 'OUT']:
+        conditions.append(model.type == trans_type)
+
+    # Machine filter (name search runs on the small machines table, then
+    # transactions are filtered through the (machine_id, timestamp) index)
+    machine_id = params.get('machine_id')
+    if machine_id:
+        conditions.append(model.machine_id == int(machine_id))
+    
+    machine = params.get('machine')
+    if machine:
+        machine_ids = db.session.query(Machine.id).filter(Machine.name.ilike(f'%{machine}%'))
+        conditions.append(model.machine_id.in_(machine_ids))
+    
+    # Date range filter
+    start = _parse_date(params.get('start_date'))
+    if start:
+        conditions.append(model.timestamp >= start)
+    
+    end = _parse_date(params.get('end_date'))
+    if end:
+        conditions.append(model.timestamp <= end)
+    
+    return conditions
+
 @transactions_bp.route('', methods=['GET'])
 @jwt_required()
 def get_transactions():
     """
     Get all transactions with optional filters
     
+    Reads recent transactions from the hot table and continues into the
+    archive only when the date range reaches archived history.
+    
     Query parameters:
         - part_id: Filter by part
         - user_id: Filter by user
         - type: Filter by type (IN/OUT)
+        - machine_id: Filter by machine
+        - machine: Filter by machine name (partial match)
         - start_date: Filter from date (ISO format)
         - end_date: Filter to date (ISO format)
         - limit: Limit results (default: 100)
+        - fields: Comma-separated fields to return (e.g. id,type,quantity,timestamp)
     
     Returns:
         {
@@ -158,84 +242,90 @@ def get_transactions():
             "total": 50
         }
     """
-    query = Transaction.query
-    
-    # Part filter
-    part_id = request.args.get('part_id')
-    if part_id:
-        query = query.filter(Transaction.part_id == int(part_id))
-    
-    # User filter
-    user_id = request.args.get('user_id')
-    if user_id:
-        query = query.filter(Transaction.user_id == int(user_id))
-    
-    # Type filter
-    trans_type = request.args.get('type', '').upper()
-    if trans_type in ['IN', 'OUT']:
-        query = query.filter(Transaction.type == trans_type)
-
-    # Machine filter
-    machine = request.args.get('machine')
-    if machine:
-        query = query.filter(Transaction.machine.ilike(f'%{machine}%'))
-    
-    # Date range filter
-    start_date = request.args.get('start_date')
-    if start_date:
-        try:
-            start = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
-            query = query.filter(Transaction.timestamp >= start)
-        except ValueError:
-            pass
-    
-    end_date = request.args.get('end_date')
-    if end_date:
-        try:
-            end = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
-            query = query.filter(Transaction.timestamp <= end)
-        except ValueError:
-            pass
+    try:
+        fields = parse_fields(Transaction, request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
     # Limit
     limit = int(request.args.get('limit', 100))
     
-    # Get transactions
-    transactions = query.order_by(Transaction.timestamp.desc()).limit(limit).all()
+    # Newest first: the hot tier, then the archive (every archived row is older)
+    transactions = []
+    for model in transaction_tiers(_parse_date(request.args.get('start_date'))):
+        if len(transactions) >= limit:
+            break
+        query = apply_fieldset(model.query, model, fields)\
+            .filter(*transaction_filter_conditions(model, request.args))
+        transactions += query.order_by(model.timestamp.desc()).limit(limit - len(transactions)).all()
     
     return jsonify({
-        'transactions': [t.to_dict() for t in transactions],
+        'transactions': [serialize(t, fields) for t in transactions],
         'total': len(transactions)
     }), 200
 
-def create_low_stock_alert(part):
-    """Create alert for low stock part"""
-    # Check if alert already exists for this part (unseen)
-    existing_alert = Alert.query.filter_by(
-        part_id=part.id,
-        seen=False
-    ).first()
-    
-    if existing_alert:
-        return  # Alert already exists
-    
-    # Create new alert
-    message = f"Low stock alert: {part.name} has {part.quantity} units (minimum: {part.min_quantity})"
-    alert = Alert(
-        part_id=part.id,
-        message=message
-    )
+EXPORT_COLUMNS = ('id', 'timestamp', 'type', 'part_id', 'part_name', 'quantity', 'user_name', 'machine', 'notes')
+
+@transactions_bp.route('/export', methods=['GET'])
+@jwt_required()
+def export_transactions():
+    """
+    Stream transactions as CSV, oldest first, across the archive and hot tiers
     
-    db.session.add(alert)
-    db.session.commit()
+    Query parameters:
+        Same filters as the transaction list (no limit)
     
-    # Send email notification
+    Returns:
+        text/csv attachment
+    """
+    params = request.args.to_dict()
+    tiers = transaction_tiers(_parse_date(params.get('start_date')))
+    
+    # Build the filters before streaming, so bad parameters get a 400 rather
+    # than an error after the 200 headers are sent
     try:
-        send_low_stock_alert(
-            part.name,
-            part.quantity,
-            part.min_quantity,
-            part.id
-        )
-    except Exception as e:
-        print(f"Failed to send email alert: {str(e)}")
+        conditions = {model: transaction_filter_conditions(model, params) for model in tiers}
+    except ValueError:
+        return jsonify({'error': 'part_id, user_id and machine_id must be integers'}), 400
+    
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_COLUMNS)
+        
+        for model in reversed(tiers):
+            rows = db.session.execute(
+                select(
+                    model.id, model.timestamp, model.type, model.part_id, SparePart.name,
+                    model.quantity, User.username, model.machine, model.notes
+                ).outerjoin(SparePart, SparePart.id == model.part_id)
+                 .outerjoin(User, User.id == model.user_id)
+                 .where(*conditions[model])
+                 .order_by(model.timestamp, model.id)
+                 .execution_options(yield_per=2000)
+            )
+            for batch in rows.partitions():
+                writer.writerows(
+                    (row[0], row[1].isoformat() if row[1] else '', *row[2:]) for row in batch
+                )
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        
+        yield buffer.getvalue()
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/csv',
+        headers={'Content-Disposition': 'attachment; filename=transactions.csv'}
+    )
+
+@scheduled_job('archive-transactions', cron='45 2 * * *')
+def archive_transactions_job():
+    """Move transactions older than TRANSACTION_HOT_DAYS into the archive tier"""
+    return archive_transactions()
+
+@scheduled_job('purge-idempotency-keys', every=3600)
+def purge_idempotency_keys_job():
+    """Delete idempotency keys past their TTL"""
+    return purge_expired_keys()
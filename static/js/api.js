@@ -1,10 +1,45 @@
 // API Configuration
 const API_BASE_URL = window.location.origin;
 
+/**
+ * Get a new access token with the stored refresh token
+ *
+ * Concurrent requests that hit an expired token share one refresh call.
+ */
+let refreshInFlight = null;
+
+function refreshAccessToken() {
+    const refreshToken = localStorage.getItem('refresh_token');
+    if (!refreshToken) {
+        return Promise.resolve(false);
+    }
+
+    if (!refreshInFlight) {
+        refreshInFlight = fetch(`${API_BASE_URL}/api/auth/refresh`, {
+            method: 'POST',
+            headers: { 'Authorization': `Bearer ${refreshToken}` }
+        })
+            .then(async (response) => {
+                if (!response.ok) {
+                    return false;
+                }
+                const data = await response.json();
+                localStorage.setItem('access_token', data.access_token);
+                return true;
+            })
+            .catch(() => false)
+            .finally(() => {
+                refreshInFlight = null;
+            });
+    }
+
+    return refreshInFlight;
+}
+
 /**
  * Make API request with JWT token
  */
-async function apiRequest(endpoint, options = {}) {
+async function apiRequest(endpoint, options = {}, retried = false) {
     const token = localStorage.getItem('access_token');
 
     const headers = {
@@ -29,9 +64,13 @@ async function apiRequest(endpoint, options = {}) {
     try {
         const response = await fetch(`${API_BASE_URL}${endpoint}`, config);
 
-        // Handle unauthorized (token expired)
+        // Handle unauthorized (token expired): renew once, then log out
         if (response.status === 401) {
+            if (!retried && await refreshAccessToken()) {
+                return apiRequest(endpoint, options, true);
+            }
             localStorage.removeItem('access_token');
+            localStorage.removeItem('refresh_token');
             localStorage.removeItem('user');
             window.location.href = '/';
             return null;
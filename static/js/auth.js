@@ -17,6 +17,7 @@ async function login(username, password) {
             // Store token and user info
             console.log('Auth.js: Success, saving user to storage:', data.user);
             localStorage.setItem('access_token', data.access_token);
+            localStorage.setItem('refresh_token', data.refresh_token);
             localStorage.setItem('user', JSON.stringify(data.user));
 
             return { success: true, user: data.user };
@@ -48,6 +49,7 @@ async function signup(username, password) {
             // Store token and user info
             console.log('Auth.js: Success, saving user to storage:', data.user);
             localStorage.setItem('access_token', data.access_token);
+            localStorage.setItem('refresh_token', data.refresh_token);
             localStorage.setItem('user', JSON.stringify(data.user));
 
             return { success: true, user: data.user };
@@ -66,6 +68,7 @@ async function signup(username, password) {
 function logout() {
     console.log('Logging out...');
     localStorage.removeItem('access_token');
+    localStorage.removeItem('refresh_token');
     localStorage.removeItem('user');
     window.location.replace('/');
 }
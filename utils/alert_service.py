@@ -0,0 +1,207 @@
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import String, cast, delete, exists, false, insert, literal, select, true, update
+from sqlalchemy.dialects import postgresql, sqlite
+from models import db, Alert, SparePart
+from utils.email_service import send_low_stock_alert, send_low_stock_digest
+from utils.scheduler import background
+
+def low_stock_message(name, quantity, min_quantity):
+    """Build the alert message for a low stock part"""
+    return f"Low stock alert: {name} has {quantity} units (minimum: {min_quantity})"
+
+def insert_ignoring_open_duplicates():
+    """
+    Build an INSERT into alerts that skips parts which already have an open alert
+
+    Relies on the unique partial index on alerts(part_id) WHERE NOT seen,
+    so no lookup query is needed.
+    """
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        return sqlite.insert(Alert).on_conflict_do_nothing()
+    if dialect == 'postgresql':
+        return postgresql.insert(Alert).on_conflict_do_nothing()
+    return insert(Alert)
+
+def evaluate_low_stock(part, previous_quantity=None, previous_min_quantity=None):
+    """
+    Open a low stock alert when a part crosses its threshold
+
+    Edge-triggered: an alert is only written when the part goes from not low
+    to low, using the quantities before and after the change. The alert is
+    added to the current session without committing, so it lands in the
+    same transaction as the stock change.
+
+    Args:
+        part: SparePart with its new quantity/min_quantity applied
+        previous_quantity: Quantity before the change (None for a new part)
+        previous_min_quantity: Threshold before the change (default: unchanged)
+
+    Returns:
+        bool: True if an alert was opened (call notify_low_stock after commit)
+    """
+    if not part.is_low_stock:
+        return False
+
+    if previous_quantity is not None:
+        if previous_min_quantity is None:
+            previous_min_quantity = part.min_quantity
+        if previous_quantity <= previous_min_quantity:
+            return False  # Already low before this change
+
+    db.session.flush()  # Make sure the part has an ID
+    stmt = insert_ignoring_open_duplicates().values(
+        part_id=part.id,
+        message=low_stock_message(part.name, part.quantity, part.min_quantity),
+        seen=False
+    )
+    result = db.session.execute(stmt)
+    return result.rowcount == 1
+
+def evaluate_low_stock_bulk(where, new_min_quantity, opened_at):
+    """
+    Open alerts for parts that a bulk min_quantity change will make low
+
+    Must run before the UPDATE is executed: parts matching `where` that are
+    not low under their current threshold but will be under the new one get
+    an alert in one INSERT ... SELECT, in the caller's transaction.
+
+    Args:
+        where: SQL condition selecting the parts being updated
+        new_min_quantity: Threshold the parts are about to get
+        opened_at: Timestamp used for the new alerts
+
+    Returns:
+        int: Number of alerts opened
+    """
+    message = (
+        literal('Low stock alert: ') + SparePart.name +
+        ' has ' + cast(SparePart.quantity, String) +
+        f' units (minimum: {int(new_min_quantity)})'
+    )
+    crossing = select(
+        SparePart.id,
+        message,
+        false(),
+        literal(opened_at, db.DateTime)
+    ).where(
+        where,
+        SparePart.quantity > SparePart.min_quantity,
+        SparePart.quantity <= new_min_quantity
+    )
+    stmt = insert_ignoring_open_duplicates().from_select(
+        ['part_id', 'message', 'seen', 'created_at'], crossing
+    )
+    return db.session.execute(stmt).rowcount
+
+def alerted_parts(opened_at):
+    """List parts whose alerts were opened at the given timestamp (for digests)"""
+    rows = db.session.execute(
+        select(SparePart.id, SparePart.name, SparePart.quantity, SparePart.min_quantity)
+        .join(Alert, Alert.part_id == SparePart.id)
+        .where(Alert.created_at == opened_at, Alert.seen == false())
+        .order_by(SparePart.quantity)
+    ).all()
+    return [
+        {'id': pid, 'name': name, 'quantity': quantity, 'min_quantity': min_quantity}
+        for pid, name, quantity, min_quantity in rows
+    ]
+
+def _send_alert(name, quantity, min_quantity, part_id):
+    try:
+        send_low_stock_alert(name, quantity, min_quantity, part_id)
+    except Exception as e:
+        current_app.logger.error(f"Failed to send email alert: {str(e)}")
+
+def notify_low_stock(part):
+    """
+    Send the low stock email for a part (call after the alert is committed)
+    
+    Sent from the background job pool when the scheduler is running, so
+    the request does not wait on SMTP.
+    """
+    background(_send_alert, part.name, part.quantity, part.min_quantity, part.id)
+
+def sweep_low_stock():
+    """
+    Open alerts for low stock parts that have not been alerted since they went low
+
+    Catches parts made low by bulk edits, imports or direct database fixes.
+    Alerts of parts that are back above their minimum are resolved first;
+    a part with an unresolved alert, even one already marked seen, is not
+    alerted again until it recovers. Finding and inserting the missing
+    alerts is a single INSERT ... SELECT served by the partial low stock index.
+
+    Returns:
+        list: Dicts (id, name, quantity, min_quantity) of parts that got a new alert
+    """
+    swept_at = datetime.utcnow()
+    message = (
+        literal('Low stock alert: ') + SparePart.name +
+        ' has ' + cast(SparePart.quantity, String) +
+        ' units (minimum: ' + cast(SparePart.min_quantity, String) + ')'
+    )
+    recovered = select(SparePart.id).where(SparePart.quantity > SparePart.min_quantity)
+    db.session.execute(
+        update(Alert)
+        .where(Alert.resolved_at.is_(None), Alert.part_id.in_(recovered))
+        .values(resolved_at=swept_at)
+    )
+
+    unresolved_alert = exists().where(
+        Alert.part_id == SparePart.id,
+        Alert.resolved_at.is_(None)
+    )
+    missing = select(
+        SparePart.id,
+        message,
+        false(),
+        literal(swept_at, db.DateTime)
+    ).where(
+        SparePart.quantity <= SparePart.min_quantity,
+        ~unresolved_alert
+    )
+
+    stmt = insert_ignoring_open_duplicates().from_select(
+        ['part_id', 'message', 'seen', 'created_at'], missing
+    )
+    inserted = db.session.execute(stmt).rowcount
+    db.session.commit()
+
+    if not inserted:
+        return []
+
+    # Alerts opened by this sweep share its timestamp
+    return alerted_parts(swept_at)
+
+def _send_digest(parts):
+    try:
+        send_low_stock_digest(parts)
+    except Exception as e:
+        current_app.logger.error(f"Failed to send email alert: {str(e)}")
+
+def notify_low_stock_digest(parts):
+    """Send one digest email for parts opened by a sweep or bulk update (in the background when possible)"""
+    background(_send_digest, parts)
+
+def purge_seen_alerts(retention_days):
+    """
+    Delete seen, resolved alerts created more than retention_days ago
+    
+    Open alerts, and alerts of parts that are still low, are never deleted
+    whatever their age (the low stock sweep relies on them).
+    
+    Returns:
+        int: Number of alerts deleted
+    """
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    count = db.session.execute(
+        delete(Alert).where(
+            Alert.seen == true(),
+            Alert.resolved_at.is_not(None),
+            Alert.created_at < cutoff
+        )
+    ).rowcount
+    db.session.commit()
+    return count
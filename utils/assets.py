@@ -0,0 +1,180 @@
+import os
+import re
+import gzip
+import json
+import shutil
+import hashlib
+import mimetypes
+from flask import send_from_directory
+
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+HASHED_EXTENSIONS = {'.css', '.js'}
+PAGE_EXTENSIONS = {'.html'}
+SKIP_DIRS = {DIST_DIR, 'uploads', 'qrcodes'}
+
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE = 'no-cache'
+
+# Encodings in server preference order: (token, file suffix)
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+def _walk_files(root, skip_dirs=()):
+    """Yield file paths under root relative to it, using '/' separators"""
+    for dirpath, dirnames, filenames in os.walk(root):
+        if dirpath == root:
+            dirnames[:] = [d for d in dirnames if d not in skip_dirs]
+        for filename in filenames:
+            full_path = os.path.join(dirpath, filename)
+            yield os.path.relpath(full_path, root).replace(os.sep, '/')
+
+def _write_compressed(path, data):
+    """Write .gz (and .br when available) siblings of a built file"""
+    try:
+        import brotli
+    except ImportError:  # Brotli is optional, gzip variants are always built
+        brotli = None
+    
+    with open(path + '.gz', 'wb') as f:
+        f.write(gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        with open(path + '.br', 'wb') as f:
+            f.write(brotli.compress(data, quality=11))
+
+def build_assets(static_folder='static'):
+    """
+    Content-hash and precompress static assets into static/dist
+
+    CSS/JS files are copied under hashed names (e.g. js/api.1a2b3c4d5e6f.js),
+    HTML pages are rewritten to reference the hashed names, and every
+    compressible file gets gzip/brotli siblings. A manifest mapping logical
+    paths to built paths is written to static/dist/manifest.json.
+
+    Args:
+        static_folder: Path of the static folder
+
+    Returns:
+        dict: The manifest that was written
+    """
+    dist_folder = os.path.join(static_folder, DIST_DIR)
+    shutil.rmtree(dist_folder, ignore_errors=True)
+    os.makedirs(dist_folder)
+
+    sources = sorted(_walk_files(static_folder, SKIP_DIRS))
+    manifest = {}
+
+    # Hashed assets first so pages can be rewritten against the manifest
+    for rel_path in sources:
+        base, ext = os.path.splitext(rel_path)
+        if ext not in HASHED_EXTENSIONS:
+            continue
+        with open(os.path.join(static_folder, rel_path), 'rb') as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()[:12]
+        built_path = f"{base}.{digest}{ext}"
+        target = os.path.join(dist_folder, built_path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, 'wb') as f:
+            f.write(data)
+        _write_compressed(target, data)
+        manifest[rel_path] = f"{DIST_DIR}/{built_path}"
+
+    reference = re.compile(r'''(src|href)=(["'])/([^"']+)\2''')
+
+    def rewrite(match):
+        attr, quote, path = match.groups()
+        return f"{attr}={quote}/{manifest.get(path, path)}{quote}"
+
+    for rel_path in sources:
+        if os.path.splitext(rel_path)[1] not in PAGE_EXTENSIONS:
+            continue
+        with open(os.path.join(static_folder, rel_path), 'r', encoding='utf-8') as f:
+            html = reference.sub(rewrite, f.read())
+        data = html.encode('utf-8')
+        target = os.path.join(dist_folder, rel_path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, 'wb') as f:
+            f.write(data)
+        _write_compressed(target, data)
+        manifest[rel_path] = f"{DIST_DIR}/{rel_path}"
+
+    with open(os.path.join(dist_folder, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+    return manifest
+
+class StaticAssets:
+    """
+    Serves the SPA static folder from an in-memory file index
+
+    The index is built once at startup, so requests never touch the
+    filesystem to check for existence. Built pages are served instead of
+    their sources when static/dist exists, hashed assets get immutable
+    cache headers and precompressed variants are picked from
+    Accept-Encoding. In live mode (debug) the build output is ignored and
+    files are looked up on disk so edits show up without a rebuild.
+    """
+
+    def __init__(self, static_folder, live=False):
+        self.static_folder = static_folder
+        self.live = live
+        self.files = set()
+        self.manifest = {}
+        self.hashed = set()
+        if live:
+            return
+
+        self.files = set(_walk_files(static_folder, {'uploads', 'qrcodes'}))
+        manifest_path = os.path.join(static_folder, DIST_DIR, MANIFEST_NAME)
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                self.manifest = json.load(f)
+        self.hashed = {
+            built for logical, built in self.manifest.items()
+            if os.path.splitext(logical)[1] in HASHED_EXTENSIONS
+        }
+
+    def _exists(self, path):
+        if self.live:
+            return os.path.isfile(os.path.join(self.static_folder, path))
+        return path in self.files
+
+    def resolve(self, path):
+        """Map a request path to a file in the index (None if missing)"""
+        path = self.manifest.get(path, path)
+        return path if self._exists(path) else None
+
+    def send(self, path, accept_encodings=None):
+        """
+        Send a static file, falling back to index.html for client-side routing
+
+        Args:
+            path: Requested path relative to the static folder
+            accept_encodings: The request's parsed Accept-Encoding header
+        """
+        resolved = self.resolve(path) or self.resolve('index.html')
+        mimetype = mimetypes.guess_type(resolved)[0] or 'application/octet-stream'
+
+        filename, encoding, has_variants = resolved, None, False
+        for token, suffix in ENCODINGS:
+            if not self._exists(resolved + suffix):
+                continue
+            has_variants = True
+            if encoding is None and accept_encodings and accept_encodings[token] > 0:
+                filename, encoding = resolved + suffix, token
+
+        response = send_from_directory(self.static_folder, filename, mimetype=mimetype)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        if has_variants:
+            response.vary.add('Accept-Encoding')
+        # Only content-hashed URLs are safe to cache forever
+        if path in self.hashed:
+            response.headers['Cache-Control'] = IMMUTABLE_CACHE
+        else:
+            response.headers['Cache-Control'] = REVALIDATE_CACHE
+        return response
+
+if __name__ == '__main__':
+    built = build_assets()
+    print(f"✓ Built {len(built)} static assets into static/{DIST_DIR}")
@@ -0,0 +1,284 @@
+import os
+import json
+import shutil
+import time
+import sqlite3
+import hashlib
+import tarfile
+import tempfile
+from datetime import datetime
+from flask import current_app
+from models import db
+from utils.sharding import configured_sites, site_bind_key
+
+# A backup is one tar.gz holding a consistent copy of every SQLite database
+# (main and sites), the uploads and QR code folders, and a manifest with
+# SHA-256 checksums. Databases are copied with SQLite's online backup API
+# in small page steps with a pause in between, so writers only wait for
+# one step at a time. Uploads and QR codes are content-addressed and never
+# rewritten, so copying them after the databases captures every file the
+# copied rows can reference.
+
+MANIFEST = 'manifest.json'
+NAME_FORMAT = 'backup-%Y%m%dT%H%M%SZ.tar.gz'
+
+class BackupError(Exception):
+    """Raised when a backup cannot be taken, verified or restored"""
+
+class _Restarted(Exception):
+    pass
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _sqlite_path(engine):
+    if engine.dialect.name != 'sqlite' or not engine.url.database or engine.url.database == ':memory:':
+        raise BackupError('Online backups need file-based SQLite databases (use pg_dump for PostgreSQL)')
+    return engine.url.database
+
+def database_paths():
+    """Database files to back up: {'main': path, '<site>': path} (requires app context)"""
+    paths = {'main': _sqlite_path(db.engines[None])}
+    for site in configured_sites():
+        paths[site] = _sqlite_path(db.engines[site_bind_key(site)])
+    return paths
+
+def copy_database(source_path, target_path, pages=512, pause=0.005, max_restarts=3):
+    """
+    Copy a live SQLite database with the online backup API
+
+    Copies `pages` pages per step and sleeps `pause` seconds between
+    steps. SQLite restarts a backup when another connection writes to the
+    source; after `max_restarts` restarts the copy is finished in a single
+    step instead, which holds a read lock for the whole copy but always
+    completes.
+
+    Returns:
+        dict: pages copied, steps taken, restarts seen and whether the
+              single-step fallback was used
+    """
+    stats = {'pages': 0, 'steps': 0, 'restarts': 0, 'single_step': False}
+    last_remaining = None
+
+    def progress(status, remaining, total):
+        nonlocal last_remaining
+        stats['pages'] = total
+        stats['steps'] += 1
+        if last_remaining is not None and remaining > last_remaining:
+            stats['restarts'] += 1
+            if stats['restarts'] > max_restarts:
+                raise _Restarted()
+        last_remaining = remaining
+        if remaining and pause:
+            time.sleep(pause)
+
+    source = sqlite3.connect(source_path)
+    target = sqlite3.connect(target_path)
+    try:
+        try:
+            source.backup(target, pages=pages, progress=progress)
+        except _Restarted:
+            stats['single_step'] = True
+            source.backup(target, pages=-1)
+    finally:
+        target.close()
+        source.close()
+    return stats
+
+def integrity_check(path):
+    """Run PRAGMA integrity_check on a database file; returns 'ok' or the problems found"""
+    connection = sqlite3.connect(f'file:{path}?immutable=1', uri=True)
+    try:
+        rows = connection.execute('PRAGMA integrity_check').fetchall()
+    finally:
+        connection.close()
+    return '; '.join(row[0] for row in rows)
+
+def _folder_files(folder):
+    """Files under a folder as (relative path, absolute path), skipping in-progress temp files"""
+    for root, _, files in os.walk(folder):
+        for name in sorted(files):
+            if name.startswith('.tmp-'):
+                continue
+            path = os.path.join(root, name)
+            yield os.path.relpath(path, folder).replace(os.sep, '/'), path
+
+def create_backup(backup_dir=None, name=None, pages=None, pause=None):
+    """
+    Take an online backup of the databases, uploads and QR codes
+
+    The archive is written under a temporary name and renamed into place,
+    so a listed backup is always complete.
+
+    Args:
+        backup_dir: Destination folder (default: BACKUP_DIR)
+        name: Archive file name (default: backup-<UTC timestamp>.tar.gz)
+        pages, pause: Backup step size and pause (default: BACKUP_PAGES_PER_STEP,
+                      BACKUP_STEP_PAUSE_MS)
+
+    Returns:
+        dict: The manifest, plus the archive path under 'path'
+    """
+    config = current_app.config
+    backup_dir = backup_dir or config['BACKUP_DIR']
+    pages = pages or config['BACKUP_PAGES_PER_STEP']
+    pause = config['BACKUP_STEP_PAUSE_MS'] / 1000 if pause is None else pause
+    created_at = datetime.utcnow()
+    name = name or created_at.strftime(NAME_FORMAT)
+    os.makedirs(backup_dir, exist_ok=True)
+
+    manifest = {'created_at': created_at.isoformat(), 'databases': {}, 'files': {}}
+    members = []
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        for key, source_path in database_paths().items():
+            copy_path = os.path.join(work_dir, f'{key}.sqlite')
+            started = time.perf_counter()
+            stats = copy_database(source_path, copy_path, pages, pause)
+            integrity = integrity_check(copy_path)
+            if integrity != 'ok':
+                raise BackupError(f"Copy of {key} database failed the integrity check: {integrity}")
+            member = f'databases/{key}.sqlite'
+            manifest['databases'][key] = {
+                'member': member,
+                'sha256': _sha256(copy_path),
+                'size': os.path.getsize(copy_path),
+                'seconds': round(time.perf_counter() - started, 3),
+                **stats
+            }
+            members.append((copy_path, member))
+
+        for prefix, folder in (('uploads', config['UPLOAD_FOLDER']), ('qrcodes', config['QR_CODE_FOLDER'])):
+            for rel_path, path in _folder_files(folder):
+                member = f'{prefix}/{rel_path}'
+                manifest['files'][member] = _sha256(path)
+                members.append((path, member))
+
+        manifest_path = os.path.join(work_dir, MANIFEST)
+        with open(manifest_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+        fd, temp_path = tempfile.mkstemp(dir=backup_dir, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as raw, tarfile.open(fileobj=raw, mode='w:gz') as tar:
+                tar.add(manifest_path, arcname=MANIFEST)
+                for path, member in members:
+                    tar.add(path, arcname=member)
+            target = os.path.join(backup_dir, name)
+            os.replace(temp_path, target)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    manifest['path'] = target
+    return manifest
+
+def list_backups(backup_dir=None):
+    """Finished backups in BACKUP_DIR, newest first"""
+    backup_dir = backup_dir or current_app.config['BACKUP_DIR']
+    if not os.path.isdir(backup_dir):
+        return []
+    backups = []
+    for name in os.listdir(backup_dir):
+        if name.startswith('backup-') and name.endswith('.tar.gz'):
+            path = os.path.join(backup_dir, name)
+            backups.append({
+                'name': name,
+                'size': os.path.getsize(path),
+                'created_at': datetime.utcfromtimestamp(os.path.getmtime(path)).isoformat()
+            })
+    return sorted(backups, key=lambda b: b['name'], reverse=True)
+
+def prune_backups(keep, backup_dir=None):
+    """Delete all but the newest `keep` backups; returns the number deleted"""
+    backup_dir = backup_dir or current_app.config['BACKUP_DIR']
+    expired = list_backups(backup_dir)[keep:]
+    for backup in expired:
+        os.remove(os.path.join(backup_dir, backup['name']))
+    return len(expired)
+
+def _extract(archive_path, work_dir):
+    """Extract a backup and check it against its manifest; returns the manifest"""
+    try:
+        with tarfile.open(archive_path, 'r:gz') as tar:
+            tar.extractall(work_dir, filter='data')
+        with open(os.path.join(work_dir, MANIFEST)) as f:
+            manifest = json.load(f)
+    except (OSError, tarfile.TarError, ValueError) as e:
+        raise BackupError(f"Unreadable backup {archive_path}: {e}")
+
+    expected = {info['member']: info['sha256'] for info in manifest['databases'].values()}
+    expected.update(manifest['files'])
+    for member, checksum in expected.items():
+        path = os.path.join(work_dir, *member.split('/'))
+        if not os.path.exists(path):
+            raise BackupError(f"Missing from backup: {member}")
+        if _sha256(path) != checksum:
+            raise BackupError(f"Checksum mismatch: {member}")
+
+    for key, info in manifest['databases'].items():
+        integrity = integrity_check(os.path.join(work_dir, *info['member'].split('/')))
+        if integrity != 'ok':
+            raise BackupError(f"{key} database failed the integrity check: {integrity}")
+    return manifest
+
+def verify_backup(archive_path):
+    """
+    Check a backup: every member present with its checksum and every
+    database passing PRAGMA integrity_check
+
+    Returns:
+        dict: The manifest
+
+    Raises:
+        BackupError: Describing the first problem found
+    """
+    with tempfile.TemporaryDirectory() as work_dir:
+        return _extract(archive_path, work_dir)
+
+def restore_backup(archive_path, files=True):
+    """
+    Verify a backup, then restore its databases (and optionally files) in place
+
+    Databases are written with the backup API into the live files, so the
+    replacement is atomic for other connections; stop the app first anyway,
+    since requests in flight would see data jump back in time. Uploads and
+    QR codes are content-addressed, so existing files are kept and missing
+    ones added.
+
+    Returns:
+        dict: Restored database keys, skipped ones (sites not configured
+              here) and number of files written
+    """
+    config = current_app.config
+    targets = database_paths()
+    result = {'databases': [], 'skipped': [], 'files': 0}
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        manifest = _extract(archive_path, work_dir)
+
+        for key, info in manifest['databases'].items():
+            if key not in targets:
+                result['skipped'].append(key)
+                continue
+            db.engines[None if key == 'main' else site_bind_key(key)].dispose()
+            copy_database(os.path.join(work_dir, *info['member'].split('/')), targets[key], pages=-1, pause=0)
+            result['databases'].append(key)
+
+        if files:
+            folders = {'uploads': config['UPLOAD_FOLDER'], 'qrcodes': config['QR_CODE_FOLDER']}
+            for member in manifest['files']:
+                prefix, rel_path = member.split('/', 1)
+                target = os.path.join(folders[prefix], *rel_path.split('/'))
+                if os.path.exists(target):
+                    continue
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                shutil.copyfile(os.path.join(work_dir, *member.split('/')), target)
+                result['files'] += 1
+
+    return result
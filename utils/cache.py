@@ -0,0 +1,301 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from functools import wraps
+from flask import g, request, current_app, has_app_context
+from sqlalchemy import event
+from models import db
+from utils.scheduler import scheduled_job
+
+EXTENSION_KEY = 'response_cache'
+
+class NullBackend:
+    """Backend that never stores anything (caching disabled)"""
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, timeout):
+        pass
+
+class MemoryBackend:
+    """
+    In-process LRU backend
+
+    Entries and tag tokens live in this process only, so use it with a
+    single worker; multi-worker deployments should use the filesystem or
+    redis backend so invalidations are seen by every process.
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires and expires < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        expires = time.time() + timeout if timeout else None
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+class FileSystemBackend:
+    """
+    Shared filesystem backend
+
+    Each entry is a JSON file written through a temp file and os.replace,
+    so concurrent workers never read partial entries. Entries made
+    unreachable by a tag invalidation are only removed by prune.
+    """
+
+    def __init__(self, cache_dir, max_entries=1024):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, hashlib.sha256(key.encode()).hexdigest())
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry['expires'] and entry['expires'] < time.time():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return entry['value']
+
+    def set(self, key, value, timeout):
+        entry = {'expires': time.time() + timeout if timeout else None, 'value': value}
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(entry, f)
+            os.replace(temp_path, self._path(key))
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def prune(self, temp_age=3600):
+        """
+        Delete expired entries, then the oldest ones beyond max_entries
+
+        Tag tokens (stored without expiry) are never evicted. Temp files
+        older than temp_age seconds are left over from crashed writers and
+        are removed too.
+
+        Returns:
+            int: Number of files deleted
+        """
+        now = time.time()
+        doomed = []
+        entries = []
+        for dir_entry in os.scandir(self.cache_dir):
+            if not dir_entry.is_file():
+                continue
+            try:
+                modified = dir_entry.stat().st_mtime
+                if dir_entry.name.startswith('.tmp-'):
+                    if modified < now - temp_age:
+                        doomed.append(dir_entry.path)
+                    continue
+                with open(dir_entry.path) as f:
+                    expires = json.load(f)['expires']
+            except (OSError, ValueError, KeyError):
+                continue
+            if expires is None:
+                continue
+            if expires < now:
+                doomed.append(dir_entry.path)
+            else:
+                entries.append((modified, dir_entry.path))
+
+        excess = len(entries) - self.max_entries
+        if excess > 0:
+            entries.sort()
+            doomed.extend(path for _, path in entries[:excess])
+
+        deleted = 0
+        for path in doomed:
+            try:
+                os.remove(path)
+                deleted += 1
+            except OSError:
+                pass
+        return deleted
+
+class RedisBackend:
+    """Backend for any server speaking the Redis protocol (requires the redis package)"""
+
+    def __init__(self, url, prefix='stock:'):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value, timeout):
+        self.client.set(self.prefix + key, json.dumps(value), ex=timeout or None)
+
+class ResponseCache:
+    """
+    Response cache with tag-based invalidation
+
+    Every tag (a table name) has a random token stored in the backend. The
+    cache key of an entry includes the current tokens of its tags, so
+    invalidating a tag just replaces its token and all entries built on the
+    old one become unreachable. A reader racing with a writer can only store
+    an entry under the old token, which is never read again.
+    """
+
+    def __init__(self, backend, default_timeout=300):
+        self.backend = backend
+        self.default_timeout = default_timeout
+
+    def _tag_token(self, tag):
+        token = self.backend.get(f'tag:{tag}')
+        if token is None:
+            token = uuid.uuid4().hex
+            self.backend.set(f'tag:{tag}', token, None)
+        return token
+
+    def make_key(self, endpoint, args, tags, site=None):
+        """Build a cache key from endpoint, site, sorted query args and tag tokens"""
+        query = '&'.join(f'{k}={v}' for k, v in sorted(args.items(multi=True)))
+        tokens = ','.join(self._tag_token(tag) for tag in sorted(tags))
+        if site:
+            endpoint = f'{endpoint}@{site}'
+        return f'view:{endpoint}?{query}#{tokens}'
+
+    def invalidate(self, *tags):
+        """Invalidate every entry tagged with any of the given tags"""
+        for tag in tags:
+            self.backend.set(f'tag:{tag}', uuid.uuid4().hex, None)
+
+def _create_backend(config):
+    cache_type = config.get('CACHE_TYPE', 'memory')
+    if cache_type == 'null':
+        return NullBackend()
+    if cache_type == 'filesystem':
+        return FileSystemBackend(config['CACHE_DIR'], config.get('CACHE_MAX_ENTRIES', 1024))
+    if cache_type == 'redis':
+        return RedisBackend(config['CACHE_REDIS_URL'])
+    return MemoryBackend(config.get('CACHE_MAX_ENTRIES', 1024))
+
+@scheduled_job('prune-cache', every=3600, per_site=False)
+def prune_cache_job():
+    """Delete expired and excess filesystem cache entries"""
+    cache = current_app.extensions.get(EXTENSION_KEY)
+    if cache is None or not isinstance(cache.backend, FileSystemBackend):
+        return 0
+    return cache.backend.prune()
+
+def cached(tags, timeout=None):
+    """
+    Cache a GET endpoint's successful JSON response
+
+    The key covers the endpoint, the routed site and the query arguments,
+    so only use this on endpoints whose output does not depend on the
+    current user. Entries
+    are invalidated whenever one of the tagged tables is written.
+
+    Args:
+        tags: Table names the response is computed from
+        timeout: Entry lifetime in seconds (default: CACHE_DEFAULT_TIMEOUT)
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            cache = current_app.extensions.get(EXTENSION_KEY)
+            if cache is None:
+                return view(*args, **kwargs)
+
+            key = cache.make_key(request.endpoint, request.args, tags, g.get('site'))
+            hit = cache.backend.get(key)
+            if hit is not None:
+                response = current_app.response_class(hit, mimetype='application/json')
+                response.headers['X-Cache'] = 'HIT'
+                return response
+
+            response = current_app.make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                cache.backend.set(key, response.get_data(as_text=True), timeout or cache.default_timeout)
+            response.headers['X-Cache'] = 'MISS'
+            return response
+
+        return wrapper
+    return decorator
+
+def _written_tables(session):
+    return session.info.setdefault('written_tables', set())
+
+def _track_flush(session, flush_context, instances):
+    """Record tables written by ORM unit-of-work flushes"""
+    tables = _written_tables(session)
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        table = getattr(obj, '__tablename__', None)
+        if table:
+            tables.add(table)
+
+def _track_execute(orm_execute_state):
+    """Record tables written by ORM-enabled INSERT/UPDATE/DELETE statements"""
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = getattr(orm_execute_state.statement, 'table', None)
+        if table is not None:
+            _written_tables(orm_execute_state.session).add(table.name)
+
+def _invalidate_after_commit(session):
+    tables = session.info.pop('written_tables', None)
+    if not tables or not has_app_context():
+        return
+    cache = current_app.extensions.get(EXTENSION_KEY)
+    if cache is not None:
+        cache.invalidate(*tables)
+
+def _discard_after_rollback(session):
+    session.info.pop('written_tables', None)
+
+_listeners_registered = False
+
+def init_cache(app):
+    """Set up the response cache and write-through invalidation for an app"""
+    global _listeners_registered
+
+    app.extensions[EXTENSION_KEY] = ResponseCache(
+        _create_backend(app.config),
+        app.config.get('CACHE_DEFAULT_TIMEOUT', 300)
+    )
+
+    if not _listeners_registered:
+        event.listen(db.session, 'before_flush', _track_flush)
+        event.listen(db.session, 'do_orm_execute', _track_execute)
+        event.listen(db.session, 'after_commit', _invalidate_after_commit)
+        event.listen(db.session, 'after_rollback', _discard_after_rollback)
+        _listeners_registered = True
@@ -0,0 +1,167 @@
+import os
+import json
+import time
+from datetime import datetime
+from flask import has_request_context
+from sqlalchemy import event, inspect, insert, select
+from models import db, SparePart, Transaction, StockChange
+
+# Every stock quantity change made through the ORM is appended to
+# stock_changes in the same flush, so the log commits or rolls back with it.
+# Offsets (ids) follow commit order because SQLite serializes writers.
+
+def _request_user_id():
+    """Current JWT identity, if inside an authenticated request"""
+    if not has_request_context():
+        return None
+    try:
+        from flask_jwt_extended import get_jwt_identity
+        identity = get_jwt_identity()
+    except Exception:
+        return None
+    return int(identity) if identity is not None else None
+
+def _quantity_change(part):
+    """(before, after) if the part's quantity changed in this flush, else None"""
+    history = inspect(part).attrs.quantity.history
+    if not history.has_changes() or not history.deleted:
+        return None
+    before, after = history.deleted[0] or 0, part.quantity or 0
+    return (before, after) if before != after else None
+
+@event.listens_for(db.session, 'after_flush')
+def _record_stock_changes(session, flush_context):
+    now = datetime.utcnow()
+    
+    # Stock movements flushed together with their part update
+    movements = {
+        int(obj.part_id): obj for obj in session.new
+        if isinstance(obj, Transaction)
+    }
+    
+    rows = []
+    for obj in session.new:
+        if isinstance(obj, SparePart) and obj.quantity:
+            rows.append({
+                'part_id': obj.id, 'change_type': 'CREATE',
+                'quantity_before': 0, 'quantity_after': obj.quantity,
+                'transaction_id': None, 'user_id': _request_user_id(), 'created_at': now
+            })
+    
+    for obj in session.dirty:
+        if not isinstance(obj, SparePart):
+            continue
+        change = _quantity_change(obj)
+        if change is None:
+            continue
+        movement = movements.get(obj.id)
+        rows.append({
+            'part_id': obj.id,
+            'change_type': movement.type if movement is not None else 'ADJUST',
+            'quantity_before': change[0], 'quantity_after': change[1],
+            'transaction_id': movement.id if movement is not None else None,
+            'user_id': movement.user_id if movement is not None else _request_user_id(),
+            'created_at': now
+        })
+    
+    for obj in session.deleted:
+        if isinstance(obj, SparePart):
+            before = inspect(obj).attrs.quantity.history
+            quantity = before.deleted[0] if before.deleted else obj.quantity
+            rows.append({
+                'part_id': obj.id, 'change_type': 'DELETE',
+                'quantity_before': quantity or 0, 'quantity_after': 0,
+                'transaction_id': None, 'user_id': _request_user_id(), 'created_at': now
+            })
+    
+    if rows:
+        session.connection().execute(insert(StockChange.__table__), rows)
+
+def read_changes(since=0, limit=1000):
+    """
+    Changes after an offset, in offset order
+    
+    Args:
+        since: Last offset the consumer has processed (0 for the beginning)
+        limit: Maximum number of changes
+    
+    Returns:
+        list: Change dicts (see StockChange.to_dict)
+    """
+    changes = StockChange.query\
+        .filter(StockChange.id > since)\
+        .order_by(StockChange.id)\
+        .limit(limit)\
+        .all()
+    return [c.to_dict() for c in changes]
+
+def wait_for_changes(since, timeout, interval=0.5):
+    """Block until a change after the offset exists or the timeout passes"""
+    deadline = time.monotonic() + timeout
+    newer = select(StockChange.id).where(StockChange.id > since).limit(1)
+    while True:
+        found = db.session.execute(newer).first() is not None
+        db.session.rollback()  # End the read transaction so new commits are visible
+        if found or time.monotonic() >= deadline:
+            return found
+        time.sleep(interval)
+
+def _feed_tail(path, chunk=65536):
+    """
+    Last offset in an NDJSON feed file and the size of its complete lines
+    
+    A trailing partial line (export interrupted mid-write) is excluded so
+    it can be truncated and rewritten.
+    
+    Returns:
+        tuple: (offset, valid_size); (0, 0) for a missing or empty file
+    """
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        return 0, 0
+    
+    with f:
+        size = f.seek(0, os.SEEK_END)
+        start = max(size - chunk, 0)
+        f.seek(start)
+        tail = f.read()
+    
+    end = tail.rfind(b'\n')
+    if end < 0:
+        return 0, 0
+    last = tail[:end].rsplit(b'\n', 1)[-1]
+    return json.loads(last)['offset'], start + end + 1
+
+def export_changes(path, batch_size=5000):
+    """
+    Append new changes to an NDJSON feed file
+    
+    Resumes from the last offset in the file, so it can be rerun or kept
+    running; consumers tail the file instead of querying the database.
+    Each batch is fsynced before the next is read.
+    
+    Returns:
+        int: Number of changes appended
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    offset, valid_size = _feed_tail(path)
+    
+    written = 0
+    with open(path, 'ab') as f:
+        f.truncate(valid_size)
+        while True:
+            changes = read_changes(offset, batch_size)
+            if not changes:
+                break
+            f.write(b''.join(
+                json.dumps(change, separators=(',', ':')).encode() + b'\n'
+                for change in changes
+            ))
+            f.flush()
+            os.fsync(f.fileno())
+            offset = changes[-1]['offset']
+            written += len(changes)
+    
+    db.session.rollback()  # End the read transaction
+    return written
@@ -99,3 +99,69 @@ def send_low_stock_alert(part_name, current_quantity, min_quantity, part_id):
     """
     
     return send_email(subject, body, recipients)
+
+def send_low_stock_digest(parts, max_rows=100):
+    """
+    Send one email summarizing parts that were found low on stock
+    
+    Args:
+        parts: List of dicts with id, name, quantity and min_quantity
+        max_rows: Maximum number of parts listed in the email body
+    
+    Returns:
+        bool: True if email sent successfully
+    """
+    if not parts:
+        return False
+    
+    # Check if alerts are enabled
+    if not current_app.config.get('LOW_STOCK_ALERT_ENABLED', False):
+        return False
+    
+    recipients = current_app.config.get('ALERT_EMAIL_RECIPIENTS', [])
+    if not recipients or recipients == ['']:
+        current_app.logger.warning("No alert recipients configured")
+        return False
+    
+    subject = f"⚠️ Low Stock Alert: {len(parts)} parts below minimum"
+    
+    rows = ''.join(
+        f"""
+                <tr>
+                    <td style="padding: 6px; border-bottom: 1px solid #e5e7eb;">{part['id']}</td>
+                    <td style="padding: 6px; border-bottom: 1px solid #e5e7eb;">{part['name']}</td>
+                    <td style="padding: 6px; border-bottom: 1px solid #e5e7eb;">{part['quantity']}</td>
+                    <td style="padding: 6px; border-bottom: 1px solid #e5e7eb;">{part['min_quantity']}</td>
+                </tr>"""
+        for part in parts[:max_rows]
+    )
+    more = len(parts) - max_rows
+    more_note = f"<p>... and {more} more parts.</p>" if more > 0 else ""
+    
+    body = f"""
+    <html>
+        <body style="font-family: Arial, sans-serif; padding: 20px;">
+            <h2 style="color: #dc2626;">Low Stock Alert</h2>
+            <p>The following spare parts are running low on stock:</p>
+            
+            <table style="border-collapse: collapse; margin: 20px 0;">
+                <tr>
+                    <th style="text-align: left; padding: 6px;">Part ID</th>
+                    <th style="text-align: left; padding: 6px;">Name</th>
+                    <th style="text-align: left; padding: 6px;">Current Quantity</th>
+                    <th style="text-align: left; padding: 6px;">Minimum Quantity</th>
+                </tr>{rows}
+            </table>
+            {more_note}
+            
+            <p>Please restock these items as soon as possible.</p>
+            
+            <hr style="margin: 30px 0; border: none; border-top: 1px solid #e5e7eb;">
+            <p style="color: #6b7280; font-size: 12px;">
+                This is an automated alert from the Stock Management System.
+            </p>
+        </body>
+    </html>
+    """
+    
+    return send_email(subject, body, recipients)
@@ -0,0 +1,106 @@
+from datetime import datetime
+from sqlalchemy import inspect
+from sqlalchemy.orm import joinedload, load_only
+from models import SparePart, Supplier, Transaction, TransactionArchive, Alert
+
+# Serialized fields that are not plain columns:
+# (columns they read, (relationship, related column) they need, getter)
+DERIVED_FIELDS = {
+    SparePart: {
+        'is_low_stock': (('quantity', 'min_quantity'), None, lambda p: p.is_low_stock),
+        'supplier_name': (
+            ('supplier_id',), ('supplier', 'name'),
+            lambda p: p.supplier.name if p.supplier else None
+        ),
+    },
+    Transaction: {
+        'user_name': (('user_id',), ('user', 'username'), lambda t: t.user.username if t.user else None),
+        'part_name': (
+            ('part_id',), ('spare_part', 'name'),
+            lambda t: t.spare_part.name if t.spare_part else None
+        ),
+    },
+    Alert: {
+        'part_name': (
+            ('part_id',), ('spare_part', 'name'),
+            lambda a: a.spare_part.name if a.spare_part else None
+        ),
+    },
+    Supplier: {},
+}
+DERIVED_FIELDS[TransactionArchive] = DERIVED_FIELDS[Transaction]
+
+def available_fields(model):
+    """Field names a model's to_dict can return"""
+    columns = {attr.key for attr in inspect(model).column_attrs}
+    return columns | set(DERIVED_FIELDS.get(model, {}))
+
+def parse_fields(model, value):
+    """
+    Parse a comma-separated fields= parameter
+    
+    Args:
+        model: Model being listed
+        value: Raw parameter value (None or empty for all fields)
+    
+    Returns:
+        list: Requested field names in order, or None for the full to_dict
+    
+    Raises:
+        ValueError: If a field does not exist on the model
+    """
+    if not value:
+        return None
+    
+    fields = list(dict.fromkeys(f.strip() for f in value.split(',') if f.strip()))
+    available = available_fields(model)
+    unknown = [f for f in fields if f not in available]
+    if unknown:
+        raise ValueError(
+            f"Unknown field(s): {', '.join(unknown)}. Available: {', '.join(sorted(available))}"
+        )
+    return fields or None
+
+def apply_fieldset(query, model, fields):
+    """
+    Narrow a query to the columns and joins needed for the given fields
+    
+    Unrequested columns are deferred and relationships behind derived
+    fields are only joined when one of those fields is requested.
+    """
+    if fields is None:
+        return query
+    
+    mapper = inspect(model)
+    derived = DERIVED_FIELDS.get(model, {})
+    columns = {key.key for key in mapper.primary_key}
+    options = []
+    
+    for field in fields:
+        if field not in derived:
+            columns.add(field)
+            continue
+        
+        needed, relation, _ = derived[field]
+        columns.update(needed)
+        if relation:
+            name, column = relation
+            target = getattr(model, name).property.mapper.class_
+            options.append(joinedload(getattr(model, name)).load_only(getattr(target, column)))
+    
+    return query.options(load_only(*(getattr(model, c) for c in sorted(columns))), *options)
+
+def serialize(obj, fields):
+    """to_dict restricted to the given fields (all fields when None)"""
+    if fields is None:
+        return obj.to_dict()
+    
+    derived = DERIVED_FIELDS.get(type(obj), {})
+    data = {}
+    for field in fields:
+        if field in derived:
+            data[field] = derived[field][2](obj)
+        else:
+            value = getattr(obj, field)
+            data[field] = value.isoformat() if isinstance(value, datetime) else value
+    return data
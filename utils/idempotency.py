@@ -0,0 +1,140 @@
+import hashlib
+from datetime import datetime
+from functools import wraps
+from flask import g, request, jsonify, current_app
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError
+from models import db, IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+def _replay(record):
+    """Build a response from a stored idempotency record"""
+    response = current_app.response_class(
+        record.response_body,
+        status=record.status_code,
+        mimetype='application/json'
+    )
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+def _check_existing(record, request_hash):
+    """Return the response for a request whose key is already recorded"""
+    if record is None or (record.status_code is None and record.request_hash == request_hash):
+        return jsonify({'error': 'A request with this Idempotency-Key is still in progress'}), 409
+    if record.request_hash != request_hash or record.endpoint != request.endpoint:
+        return jsonify({'error': f'{HEADER} was already used for a different request'}), 422
+    return _replay(record)
+
+def commit_movement():
+    """
+    Commit a stock movement view's writes
+
+    Under @idempotent with a key this only flushes: the wrapper then commits
+    the writes and the stored response in one transaction, so a crash can
+    never leave the stock moved with its key still in progress.
+    """
+    if g.get('idempotency_record') is None:
+        db.session.commit()
+    else:
+        db.session.flush()
+
+def after_movement(func, *args, **kwargs):
+    """Call func once the view's writes are committed (now, or after @idempotent commits)"""
+    callbacks = g.get('idempotency_callbacks')
+    if callbacks is None:
+        func(*args, **kwargs)
+    else:
+        callbacks.append((func, args, kwargs))
+
+def idempotent(view):
+    """
+    Make a JSON write endpoint safe to retry with an Idempotency-Key header
+
+    The key and the stored response are written in the same database
+    transaction as the view's own writes (the view commits with
+    commit_movement), so a stock change and its key are committed
+    together. Repeated
+    requests with the same key and payload get the stored response back
+    without running the view again. Error responses are not stored.
+    Requests without the header are handled as before. Must be applied
+    after @jwt_required().
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(HEADER, '').strip()
+        if not key:
+            return view(*args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return jsonify({'error': f'{HEADER} must be at most {MAX_KEY_LENGTH} characters'}), 400
+
+        user_id = int(get_jwt_identity())
+        request_hash = hashlib.sha256(request.get_data()).hexdigest()
+
+        record = IdempotencyKey.query.filter_by(user_id=user_id, key=key).first()
+        if record and record.is_expired:
+            db.session.delete(record)
+            db.session.flush()
+            record = None
+        if record:
+            return _check_existing(record, request_hash)
+
+        # Reserve the key; the view's commit persists it with the stock change
+        record = IdempotencyKey(
+            user_id=user_id,
+            key=key,
+            endpoint=request.endpoint,
+            request_hash=request_hash,
+            expires_at=datetime.utcnow() + current_app.config['IDEMPOTENCY_KEY_TTL']
+        )
+        try:
+            db.session.add(record)
+            db.session.flush()
+        except IntegrityError:
+            # A concurrent request with the same key got there first
+            db.session.rollback()
+            record = IdempotencyKey.query.filter_by(user_id=user_id, key=key).first()
+            return _check_existing(record, request_hash)
+
+        g.idempotency_record = record
+        g.idempotency_callbacks = callbacks = []
+        try:
+            response = current_app.make_response(view(*args, **kwargs))
+        except Exception:
+            db.session.rollback()
+            raise
+        finally:
+            g.pop('idempotency_record')
+            g.pop('idempotency_callbacks')
+
+        # Only successes are stored; a client error releases the key so the
+        # corrected request can be retried with it
+        if not 200 <= response.status_code < 300:
+            db.session.rollback()
+            return response
+
+        record.status_code = response.status_code
+        record.response_body = response.get_data(as_text=True)
+        db.session.add(record)
+        db.session.commit()
+
+        for func, func_args, func_kwargs in callbacks:
+            func(*func_args, **func_kwargs)
+        return response
+
+    return wrapper
+
+def purge_expired_keys():
+    """
+    Delete expired idempotency keys in one statement
+
+    Returns:
+        int: Number of keys deleted
+    """
+    result = db.session.execute(
+        delete(IdempotencyKey).where(IdempotencyKey.expires_at <= datetime.utcnow())
+    )
+    db.session.commit()
+    return result.rowcount
@@ -0,0 +1,287 @@
+import io
+import os
+import zlib
+import zipfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# Runs in worker processes too, so keep module-level imports light:
+# no models or Flask, PIL/qrcode are imported by the render functions
+
+EXTENSION_KEY = 'label_renderer'
+
+DPI = 300
+PAGE_SIZE = (2480, 3508)  # A4 at 300 dpi
+MARGIN = 90
+FORMATS = ('pdf', 'png')
+
+def _font(size):
+    from PIL import ImageFont
+    
+    try:
+        return ImageFont.truetype('DejaVuSans.ttf', size)
+    except OSError:
+        try:
+            return ImageFont.load_default(size=size)
+        except TypeError:
+            return ImageFont.load_default()
+
+def _fit_text(draw, text, font, width):
+    """Truncate text with an ellipsis so it fits in width pixels"""
+    full = draw.textlength(text, font=font)
+    if full <= width:
+        return text
+    # Start from a proportional estimate; usually only a step or two is needed
+    length = int(len(text) * width / full)
+    while length > 0 and draw.textlength(text[:length] + '…', font=font) > width:
+        length -= 1
+    return text[:length] + '…'
+
+def render_page(labels, columns, rows):
+    """
+    Render one sheet of labels
+    
+    Args:
+        labels: List of (part_id, name) tuples, at most columns * rows
+        columns, rows: Label grid
+    
+    Returns:
+        PIL.Image.Image: 1-bit page image
+    """
+    from PIL import Image, ImageDraw
+    from utils.qr_generator import qr_module_image
+    
+    page = Image.new('1', PAGE_SIZE, 1)
+    draw = ImageDraw.Draw(page)
+    draw.fontmode = '1'  # No antialiasing on a 1-bit page
+    cell_w = (PAGE_SIZE[0] - 2 * MARGIN) // columns
+    cell_h = (PAGE_SIZE[1] - 2 * MARGIN) // rows
+    name_font = _font(max(cell_h // 12, 12))
+    id_font = _font(max(cell_h // 16, 10))
+    
+    for index, (part_id, name) in enumerate(labels):
+        x = MARGIN + (index % columns) * cell_w
+        y = MARGIN + (index // columns) * cell_h
+        
+        qr = qr_module_image(str(part_id), module_size=1)
+        module_size = max((cell_h - 20) // qr.width, 1)
+        qr = qr.resize((qr.width * module_size, qr.height * module_size), Image.NEAREST)
+        page.paste(qr, (x + 10, y + (cell_h - qr.height) // 2))
+        
+        text_x = x + qr.width + 20
+        text_w = cell_w - qr.width - 30
+        if text_w > 0:
+            draw.text((text_x, y + cell_h // 3), _fit_text(draw, name or '', name_font, text_w),
+                      font=name_font, fill=0, anchor='ls')
+            draw.text((text_x, y + cell_h // 3 + cell_h // 5), f'#{part_id}',
+                      font=id_font, fill=0, anchor='ls')
+    
+    return page
+
+def _render_png(args):
+    page = render_page(*args)
+    buffered = io.BytesIO()
+    page.save(buffered, format='PNG', optimize=False, dpi=(DPI, DPI))
+    return buffered.getvalue()
+
+def _render_pdf_stream(args):
+    # PIL packs mode '1' rows MSB first with 1 = white, which is exactly a
+    # 1 bpc DeviceGray image, so the page only needs deflating
+    page = render_page(*args)
+    return zlib.compress(page.tobytes(), 6)
+
+def _chunk(labels, per_page):
+    return [labels[i:i + per_page] for i in range(0, len(labels), per_page)]
+
+def _render_pages(render, labels, columns, rows, pool):
+    """Yield rendered pages in order, spread over a process pool for multi-page jobs"""
+    jobs = [(page, columns, rows) for page in _chunk(labels, columns * rows)]
+    if len(jobs) <= 1 or pool is None:
+        for job in jobs:
+            yield render(job)
+        return
+    
+    yield from pool.map(render, jobs)
+
+class _ChunkWriter:
+    """Write-only file object that collects bytes for a streaming generator"""
+    
+    def __init__(self):
+        self.chunks = []
+    
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+    
+    def flush(self):
+        pass
+    
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+def _pdf(labels, columns, rows, pool):
+    width, height = PAGE_SIZE
+    points = (width * 72 / DPI, height * 72 / DPI)
+    page_count = len(_chunk(labels, columns * rows))
+    
+    # Objects: 1 catalog, 2 page tree, then page / content / image per page
+    offsets = []
+    position = 0
+    
+    def emit(data):
+        nonlocal position
+        position += len(data)
+        return data
+    
+    def obj(number, body):
+        offsets.append((number, position))
+        return emit(f'{number} 0 obj\n'.encode() + body + b'\nendobj\n')
+    
+    yield emit(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+    yield obj(1, b'<< /Type /Catalog /Pages 2 0 R >>')
+    kids = ' '.join(f'{3 + 3 * i} 0 R' for i in range(page_count))
+    yield obj(2, f'<< /Type /Pages /Kids [{kids}] /Count {page_count} >>'.encode())
+    
+    pages = _render_pages(_render_pdf_stream, labels, columns, rows, pool)
+    for i, data in enumerate(pages):
+        page_obj, content_obj, image_obj = 3 + 3 * i, 4 + 3 * i, 5 + 3 * i
+        content = f'q {points[0]:.2f} 0 0 {points[1]:.2f} 0 0 cm /Im0 Do Q'.encode()
+        yield obj(page_obj, (
+            f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {points[0]:.2f} {points[1]:.2f}] '
+            f'/Resources << /XObject << /Im0 {image_obj} 0 R >> >> /Contents {content_obj} 0 R >>'
+        ).encode())
+        yield obj(content_obj, f'<< /Length {len(content)} >>\nstream\n'.encode() + content + b'\nendstream')
+        yield obj(image_obj, (
+            f'<< /Type /XObject /Subtype /Image /Width {width} /Height {height} '
+            f'/ColorSpace /DeviceGray /BitsPerComponent 1 /Filter /FlateDecode /Length {len(data)} >>\nstream\n'
+        ).encode() + data + b'\nendstream')
+    
+    xref = position
+    offsets.sort()
+    entries = ''.join(f'{offset:010d} 00000 n \n' for _, offset in offsets)
+    yield (
+        f'xref\n0 {len(offsets) + 1}\n0000000000 65535 f \n{entries}'
+        f'trailer\n<< /Size {len(offsets) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'
+    ).encode()
+
+def _png_zip(labels, columns, rows, pool):
+    writer = _ChunkWriter()
+    with zipfile.ZipFile(writer, 'w', compression=zipfile.ZIP_STORED) as archive:
+        pages = _render_pages(_render_png, labels, columns, rows, pool)
+        for i, data in enumerate(pages, start=1):
+            archive.writestr(f'labels-{i:04d}.png', data)
+            yield writer.drain()
+    yield writer.drain()
+
+def label_sheets(labels, fmt='pdf', columns=3, rows=8, pool=None):
+    """
+    Render QR label sheets for parts
+    
+    Pages are rendered in parallel on the given process pool and produced
+    in order as they finish, so the result can be streamed to a client or
+    file.
+    
+    Args:
+        labels: List of (part_id, name) tuples
+        fmt: 'pdf' (one document) or 'png' (single page, or a zip of pages)
+        columns, rows: Labels per row / rows per page
+        pool: Process pool for multi-page jobs (None renders in-process)
+    
+    Returns:
+        tuple: (iterator of bytes, mimetype, file extension)
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Invalid format. Must be one of: {', '.join(FORMATS)}")
+    if columns < 1 or rows < 1:
+        raise ValueError('columns and rows must be positive')
+    
+    labels = [(int(part_id), name) for part_id, name in labels]
+    if not labels:
+        raise ValueError('No parts to print')
+    if fmt == 'pdf':
+        return _pdf(labels, columns, rows, pool), 'application/pdf', 'pdf'
+    if len(labels) <= columns * rows:
+        return _render_pages(_render_png, labels, columns, rows, None), 'image/png', 'png'
+    return _png_zip(labels, columns, rows, pool), 'application/zip', 'zip'
+
+class LabelsBusy(Exception):
+    """Raised when every label sheet rendering slot is taken"""
+
+class _Admitted:
+    """Chunk iterator that frees its admission slot once exhausted or closed"""
+    
+    def __init__(self, chunks, release):
+        self._chunks = chunks
+        self._release = release
+    
+    def __iter__(self):
+        return self
+    
+    def __next__(self):
+        try:
+            return next(self._chunks)
+        except BaseException:
+            self.close()
+            raise
+    
+    def close(self):
+        if self._release is not None:
+            self._release()
+            self._release = None
+            self._chunks.close()
+
+class LabelRenderer:
+    """
+    Shared process pool for label sheets
+    
+    One pool per app, created on first use with the spawn start method:
+    forking a server that already runs threads (scheduler pool and
+    WSGI threads) can leave children holding locks no thread will release.
+    At most max_pending sheets render at once; further requests are
+    rejected immediately instead of piling more work on the same cores.
+    """
+    
+    def __init__(self, workers=None, max_pending=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or 2
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+    
+    def _get_pool(self):
+        if self.workers == 1:
+            return None
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._pool
+    
+    def render(self, labels, fmt='pdf', columns=3, rows=8):
+        """label_sheets on the shared pool (raises LabelsBusy when saturated)"""
+        if not self._slots.acquire(blocking=False):
+            raise LabelsBusy()
+        try:
+            chunks, mimetype, extension = label_sheets(labels, fmt, columns, rows, self._get_pool())
+        except BaseException:
+            self._slots.release()
+            raise
+        return _Admitted(iter(chunks), self._slots.release), mimetype, extension
+
+def init_label_renderer(app):
+    """Set up the label sheet rendering pool for an app"""
+    app.extensions[EXTENSION_KEY] = LabelRenderer(
+        app.config.get('LABEL_SHEET_WORKERS'),
+        app.config.get('LABEL_SHEET_MAX_PENDING')
+    )
+
+def render_label_sheets(labels, fmt='pdf', columns=3, rows=8):
+    """Render label sheets on the app's shared pool (requires app context)"""
+    from flask import current_app
+    
+    return current_app.extensions[EXTENSION_KEY].render(labels, fmt, columns, rows)
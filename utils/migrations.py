@@ -0,0 +1,120 @@
+from sqlalchemy import func, inspect, select, text, update
+from sqlalchemy.schema import CreateColumn
+from models import db, Alert, SparePart, StockChange, Transaction, User
+
+# db.create_all() creates missing tables but never alters existing ones, so
+# databases created by an earlier version need the columns and indexes added
+# since then. Each step checks the live schema first and only adds what is
+# missing, so migrate() can run on every init-db and on fresh databases.
+
+def _add_columns(connection, tables, model, names):
+    """Add the named model columns missing from its table; returns what was added"""
+    table = model.__table__
+    if table.name not in tables:
+        return []
+    existing = {column['name'] for column in inspect(connection).get_columns(table.name)}
+    added = []
+    for name in names:
+        if name in existing:
+            continue
+        column = CreateColumn(table.c[name]).compile(dialect=connection.dialect)
+        connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column}'))
+        added.append(f'{table.name}.{name}')
+    return added
+
+def _create_indexes(connection, tables, model, names):
+    """Create the named model indexes missing from its table; returns what was added"""
+    table = model.__table__
+    if table.name not in tables:
+        return []
+    existing = {index['name'] for index in inspect(connection).get_indexes(table.name)}
+    added = []
+    for index in table.indexes:
+        if index.name in names and index.name not in existing:
+            index.create(connection)
+            added.append(index.name)
+    return added
+
+def spare_parts_reorder_columns(connection, tables):
+    """Reorder-point suggestion columns written by utils.reorder_engine"""
+    return _add_columns(
+        connection, tables, SparePart,
+        ('avg_daily_demand', 'demand_std', 'safety_stock', 'suggested_min_quantity')
+    )
+
+def transactions_machine_id(connection, tables):
+    """Machine reference and its index (link old rows with backfill-machines)"""
+    return (
+        _add_columns(connection, tables, Transaction, ('machine_id',))
+        + _create_indexes(connection, tables, Transaction, ('ix_transactions_machine_timestamp',))
+    )
+
+def alerts_open_part_unique(connection, tables):
+    """At most one open alert per part: keep the newest open alert, mark older duplicates seen"""
+    if 'alerts' not in tables:
+        return []
+    if 'uq_alerts_open_part' in {index['name'] for index in inspect(connection).get_indexes('alerts')}:
+        return []
+    newest = select(func.max(Alert.id)).where(Alert.seen.is_(False)).group_by(Alert.part_id)
+    connection.execute(
+        update(Alert).where(Alert.seen.is_(False), Alert.id.not_in(newest)).values(seen=True)
+    )
+    return _create_indexes(connection, tables, Alert, ('uq_alerts_open_part',))
+
+def alerts_resolved_at(connection, tables):
+    """Recovery timestamp the low stock sweep uses to skip acknowledged alerts"""
+    return _add_columns(connection, tables, Alert, ('resolved_at',))
+
+def stock_changes_created_at_index(connection, tables):
+    """Time index used by point-in-time inventory"""
+    return _create_indexes(connection, tables, StockChange, ('ix_stock_changes_created_at',))
+
+def users_sites(connection, tables):
+    """Sites a non-admin user may sign in to"""
+    return _add_columns(connection, tables, User, ('sites',))
+
+def spare_parts_low_stock_index(connection, tables):
+    """Partial index used by the low stock sweep"""
+    return _create_indexes(connection, tables, SparePart, ('ix_spare_parts_low_stock',))
+
+def transactions_part_timestamp_index(connection, tables):
+    """Per-part history index used by the scan endpoint"""
+    return _create_indexes(connection, tables, Transaction, ('ix_transactions_part_timestamp',))
+
+# Applied in order
+MIGRATIONS = (
+    spare_parts_reorder_columns,
+    alerts_open_part_unique,
+    spare_parts_low_stock_index,
+    transactions_machine_id,
+    transactions_part_timestamp_index,
+    alerts_resolved_at,
+    stock_changes_created_at_index,
+    users_sites,
+)
+
+def migrate(engine):
+    """
+    Bring an existing database up to the current models
+
+    Tables the database does not have are skipped (create_all creates them
+    complete), so this runs after db.create_all().
+
+    Returns:
+        list: Columns and indexes added
+    """
+    applied = []
+    with engine.begin() as connection:
+        tables = set(inspect(connection).get_table_names())
+        for step in MIGRATIONS:
+            applied.extend(step(connection, tables))
+    return applied
+
+def migrate_all():
+    """Migrate the main database and every site database (requires app context)"""
+    from utils.sharding import configured_sites, site_bind_key
+
+    applied = migrate(db.engines[None])
+    for site in configured_sites():
+        applied.extend(f'{site}: {change}' for change in migrate(db.engines[site_bind_key(site)]))
+    return applied
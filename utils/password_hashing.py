@@ -0,0 +1,60 @@
+import os
+import threading
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+
+EXTENSION_KEY = 'password_hasher'
+
+class HashingBusy(Exception):
+    """Raised when too many requests are already waiting to hash a password"""
+
+class PasswordHasher:
+    """
+    Concurrency cap for password hashing
+    
+    Hashes run on the calling request thread, which waits for the result;
+    this does not free the thread, it limits how many threads hashing can
+    hold. At most `workers` hashes run at once (scrypt/PBKDF2 from hashlib
+    release the GIL, so one per core), and at most max_pending requests may
+    be hashing or waiting to. Beyond that HashingBusy is raised at once
+    (503), so a burst of sign-ins cannot occupy every WSGI thread; keep
+    max_pending below the server's thread count.
+    """
+    
+    def __init__(self, workers=None, max_pending=None):
+        workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or workers * 4
+        self._running = threading.BoundedSemaphore(workers)
+        self._admitted = threading.BoundedSemaphore(self.max_pending)
+    
+    def _run(self, func, *args):
+        if not self._admitted.acquire(blocking=False):
+            raise HashingBusy()
+        try:
+            with self._running:
+                return func(*args)
+        finally:
+            self._admitted.release()
+    
+    def hash(self, password):
+        """Hash a password (raises HashingBusy when saturated)"""
+        return self._run(generate_password_hash, password)
+    
+    def verify(self, password_hash, password):
+        """Check a password against its hash (raises HashingBusy when saturated)"""
+        return self._run(check_password_hash, password_hash, password)
+
+def init_password_hasher(app):
+    """Set up the password hashing concurrency cap for an app"""
+    app.extensions[EXTENSION_KEY] = PasswordHasher(
+        app.config.get('PASSWORD_HASH_WORKERS'),
+        app.config.get('PASSWORD_HASH_MAX_PENDING')
+    )
+
+def hash_password(password):
+    """Hash a password under the app's hashing cap"""
+    return current_app.extensions[EXTENSION_KEY].hash(password)
+
+def verify_password(password_hash, password):
+    """Verify a password under the app's hashing cap"""
+    return current_app.extensions[EXTENSION_KEY].verify(password_hash, password)
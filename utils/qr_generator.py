@@ -1,22 +1,24 @@
-import os
-import qrcode
 from io import BytesIO
-from PIL import Image
+from utils.storage import store_bytes
 
-def generate_qr_code(data, part_id, save_folder='static/qrcodes'):
+# qrcode (and PIL through it) is imported inside the functions so that
+# importing the parts blueprint does not pay for it at worker start
+
+def generate_qr_code(data, save_folder='static/qrcodes'):
     """
     Generate QR code for a spare part
     
+    The image is stored content-addressed, so identical QR codes are
+    written once and regenerating a code never overwrites another file.
+    
     Args:
         data: Data to encode in QR code (typically part ID or URL)
-        part_id: ID of the spare part
         save_folder: Folder to save QR code images
     
     Returns:
         str: Relative path to the saved QR code image
     """
-    # Create folder if it doesn't exist
-    os.makedirs(save_folder, exist_ok=True)
+    import qrcode
     
     # Generate QR code
     qr = qrcode.QRCode(
@@ -32,12 +34,12 @@ def generate_qr_code(data, part_id, save_folder='static/qrcodes'):
     img = qr.make_image(fill_color="black", back_color="white")
     
     # Save image
-    filename = f"part_{part_id}_qr.png"
-    filepath = os.path.join(save_folder, filename)
-    img.save(filepath)
+    buffered = BytesIO()
+    img.save(buffered, format="PNG")
+    rel_path = store_bytes(buffered.getvalue(), save_folder, 'png')
     
     # Return relative path for URL
-    return f"/qrcodes/{filename}"
+    return f"/qrcodes/{rel_path}"
 
 def generate_qr_code_base64(data):
     """
@@ -50,6 +52,7 @@ def generate_qr_code_base64(data):
         str: Base64 encoded QR code image
     """
     import base64
+    import qrcode
     
     qr = qrcode.QRCode(
         version=1,
@@ -68,3 +71,37 @@ def generate_qr_code_base64(data):
     img_str = base64.b64encode(buffered.getvalue()).decode()
     
     return f"data:image/png;base64,{img_str}"
+
+def qr_module_image(data, module_size=4, border=4, mask_pattern=0):
+    """
+    Render a QR code straight from its module matrix (for bulk label sheets)
+    
+    Fixing the mask pattern skips the scoring of all eight masks, which is
+    most of the encoding time; any mask gives a valid, scannable code.
+    
+    Args:
+        data: Data to encode in QR code
+        module_size: Pixels per module
+        border: Quiet zone width in modules
+        mask_pattern: QR mask pattern (0-7), or None to pick the best one
+    
+    Returns:
+        PIL.Image.Image: 1-bit image
+    """
+    import qrcode
+    from PIL import Image
+    
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        border=border,
+        mask_pattern=mask_pattern,
+    )
+    qr.add_data(data)
+    qr.make(fit=True)
+    
+    matrix = qr.get_matrix()  # Includes the border
+    size = len(matrix)
+    pixels = bytes(0 if dark else 255 for row in matrix for dark in row)
+    img = Image.frombytes('L', (size, size), pixels)
+    return img.resize((size * module_size, size * module_size), Image.NEAREST).convert('1')
@@ -0,0 +1,184 @@
+import math
+import time
+import threading
+from collections import OrderedDict
+from flask import request, jsonify
+from flask_jwt_extended import get_jwt, get_jwt_identity, verify_jwt_in_request
+
+EXTENSION_KEY = 'rate_limiter'
+
+def parse_limits(value):
+    """
+    Parse a RATE_LIMITS setting
+    
+    Format: comma-separated group=rate:burst entries, where group is a
+    blueprint name (or 'default' for every other API blueprint), rate is
+    tokens refilled per second and burst is the bucket size.
+    e.g. "analytics=0.5:10,transactions=10:50,default=10:100"
+    
+    Returns:
+        dict: group -> (rate, burst)
+    """
+    limits = {}
+    for entry in (value or '').split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        group, _, spec = entry.partition('=')
+        rate, _, burst = spec.partition(':')
+        rate = float(rate)
+        limits[group.strip()] = (rate, float(burst) if burst else max(rate, 1.0))
+    return limits
+
+class MemoryBucketStore:
+    """
+    In-process token buckets
+    
+    Buckets are kept in an LRU capped at max_keys; an evicted bucket simply
+    starts full again. Like the memory cache backend, limits are per
+    process, so multi-worker deployments should use the redis store.
+    """
+    
+    def __init__(self, max_keys=10000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def take(self, key, rate, burst, now):
+        """Take one token; returns 0 if allowed, else seconds until a token is available"""
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (1 - tokens) / rate if rate > 0 else math.inf
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return wait
+
+# Same refill arithmetic as MemoryBucketStore, run atomically inside redis
+_TAKE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+elseif rate > 0 then
+    wait = (1 - tokens) / rate
+else
+    wait = -1
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+if rate > 0 then
+    redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+end
+return tostring(wait)
+"""
+
+class RedisBucketStore:
+    """Token buckets shared by all workers (requires the redis package)"""
+    
+    def __init__(self, url, prefix='stock:ratelimit:'):
+        import redis
+        
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._take = self.client.register_script(_TAKE_SCRIPT)
+    
+    def take(self, key, rate, burst, now):
+        wait = float(self._take(keys=[self.prefix + key], args=[rate, burst, now]))
+        return math.inf if wait < 0 else wait
+
+class RateLimiter:
+    """Per-identity, per-endpoint-group token bucket limits"""
+    
+    def __init__(self, store, limits, max_tokens=10000):
+        self.store = store
+        self.limits = limits
+        self.max_tokens = max_tokens
+        self._identities = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def limit_for(self, group):
+        return self.limits.get(group) or self.limits.get('default')
+    
+    def client_key(self):
+        """
+        Rate limit key for the current request
+        
+        The JWT identity when a valid token is present, else the client
+        address; invalid tokens are left for the view to reject. Verifying a
+        JWT costs far more than the bucket itself, so identities of tokens
+        already verified are remembered (keyed by the full signed token)
+        until they expire.
+        """
+        auth = request.headers.get('Authorization', '')
+        if not auth.startswith('Bearer '):
+            return f'ip:{request.remote_addr}'
+        
+        token = auth[7:]
+        now = time.time()
+        with self._lock:
+            known = self._identities.get(token)
+        if known and known[1] > now:
+            return f'user:{known[0]}'
+        
+        try:
+            verify_jwt_in_request(optional=True)
+            identity = get_jwt_identity()
+            expires = get_jwt().get('exp', now)
+        except Exception:
+            return f'ip:{request.remote_addr}'
+        if identity is None:
+            return f'ip:{request.remote_addr}'
+        
+        with self._lock:
+            self._identities[token] = (identity, expires)
+            if len(self._identities) > self.max_tokens:
+                self._identities.popitem(last=False)
+        return f'user:{identity}'
+    
+    def check(self):
+        """before_request hook: returns a 429 response when the bucket is empty"""
+        group = request.blueprint
+        if group is None:
+            return None  # Pages and static files
+        
+        limit = self.limit_for(group)
+        if limit is None:
+            return None
+        
+        rate, burst = limit
+        wait = self.store.take(f'{group}:{self.client_key()}', rate, burst, time.time())
+        if not wait:
+            return None
+        
+        response = jsonify({'error': 'Rate limit exceeded, please slow down'})
+        response.status_code = 429
+        if math.isfinite(wait):
+            response.headers['Retry-After'] = str(max(1, math.ceil(wait)))
+        return response
+
+def init_rate_limiter(app):
+    """Set up token bucket rate limiting for an app's API blueprints"""
+    limits = parse_limits(app.config.get('RATE_LIMITS'))
+    if not app.config.get('RATE_LIMIT_ENABLED', True) or not limits:
+        return
+    
+    if app.config.get('RATE_LIMIT_STORAGE') == 'redis':
+        store = RedisBucketStore(app.config['RATE_LIMIT_REDIS_URL'])
+    else:
+        store = MemoryBucketStore(app.config.get('RATE_LIMIT_MAX_KEYS', 10000))
+    
+    limiter = RateLimiter(store, limits, app.config.get('RATE_LIMIT_MAX_KEYS', 10000))
+    app.extensions[EXTENSION_KEY] = limiter
+    app.before_request(limiter.check)
@@ -0,0 +1,145 @@
+import math
+from datetime import datetime, timedelta
+import numpy as np
+from flask import current_app
+from sqlalchemy import func, select, update
+from models import db, SparePart
+from utils.stock_cube import rebuild_stock_cube
+from utils.transaction_archive import transaction_movements
+
+def _load_part_ids():
+    """Load all part IDs as a sorted int64 array"""
+    rows = db.session.execute(select(SparePart.id).order_by(SparePart.id)).scalars()
+    return np.fromiter(rows, dtype=np.int64)
+
+def _iter_daily_demand(since, chunk_size):
+    """
+    Stream OUT demand aggregated per (part, day) in columnar chunks
+
+    Yields:
+        tuple: (part_ids, daily_quantities) as NumPy arrays
+    """
+    tx = transaction_movements(since)
+    day = func.date(tx.c.timestamp)
+    stmt = select(
+        tx.c.part_id,
+        func.sum(tx.c.quantity)
+    ).where(
+        tx.c.type == 'OUT',
+        tx.c.timestamp >= since
+    ).group_by(tx.c.part_id, day)
+
+    result = db.session.execute(stmt.execution_options(yield_per=chunk_size))
+    for partition in result.partitions(chunk_size):
+        part_ids = np.fromiter((row[0] for row in partition), dtype=np.int64, count=len(partition))
+        quantities = np.fromiter((row[1] for row in partition), dtype=np.float64, count=len(partition))
+        yield part_ids, quantities
+
+def compute_reorder_points(lookback_days=None, lead_time_days=None, service_z=None, chunk_size=None):
+    """
+    Compute demand statistics and reorder points for every part
+
+    Daily OUT totals are summed per part with np.bincount, so the cost is a
+    single grouped scan of the ledger regardless of the number of parts.
+    Days without movements count as zero demand.
+
+    Args:
+        lookback_days: Size of the demand history window in days
+        lead_time_days: Replenishment lead time in days
+        service_z: Service-level z-score used for safety stock
+        chunk_size: Number of rows fetched per chunk
+
+    Returns:
+        dict: NumPy arrays keyed by 'part_id', 'avg_daily_demand',
+              'demand_std', 'safety_stock' and 'reorder_point'
+    """
+    config = current_app.config
+    lookback_days = lookback_days or config['REORDER_LOOKBACK_DAYS']
+    lead_time_days = lead_time_days if lead_time_days is not None else config['REORDER_LEAD_TIME_DAYS']
+    service_z = service_z if service_z is not None else config['REORDER_SERVICE_Z']
+    chunk_size = chunk_size or config['REORDER_CHUNK_SIZE']
+
+    part_ids = _load_part_ids()
+    if not len(part_ids):
+        empty = np.zeros(0, dtype=np.float64)
+        return {
+            'part_id': part_ids,
+            'avg_daily_demand': empty,
+            'demand_std': empty,
+            'safety_stock': empty.astype(np.int64),
+            'reorder_point': empty.astype(np.int64)
+        }
+
+    totals = np.zeros(len(part_ids), dtype=np.float64)
+    squares = np.zeros(len(part_ids), dtype=np.float64)
+
+    since = datetime.utcnow() - timedelta(days=lookback_days)
+    for chunk_ids, quantities in _iter_daily_demand(since, chunk_size):
+        index = np.minimum(np.searchsorted(part_ids, chunk_ids), len(part_ids) - 1)
+        # Ignore ledger rows whose part no longer exists
+        valid = part_ids[index] == chunk_ids
+        index, quantities = index[valid], quantities[valid]
+        totals += np.bincount(index, weights=quantities, minlength=len(part_ids))
+        squares += np.bincount(index, weights=quantities ** 2, minlength=len(part_ids))
+
+    mean = totals / lookback_days
+    variance = np.maximum(squares / lookback_days - mean ** 2, 0.0)
+    std = np.sqrt(variance)
+
+    safety_stock = np.ceil(service_z * std * math.sqrt(lead_time_days))
+    reorder_point = np.ceil(mean * lead_time_days + safety_stock)
+
+    return {
+        'part_id': part_ids,
+        'avg_daily_demand': mean,
+        'demand_std': std,
+        'safety_stock': safety_stock.astype(np.int64),
+        'reorder_point': reorder_point.astype(np.int64)
+    }
+
+def recompute_reorder_points(apply=False, **kwargs):
+    """
+    Recompute reorder points and write the suggestions back in bulk
+
+    Args:
+        apply: Also overwrite min_quantity with the suggested reorder point
+        **kwargs: Passed through to compute_reorder_points
+
+    Returns:
+        int: Number of parts updated
+    """
+    stats = compute_reorder_points(**kwargs)
+    if not len(stats['part_id']):
+        return 0
+
+    columns = zip(
+        stats['part_id'].tolist(),
+        np.round(stats['avg_daily_demand'], 4).tolist(),
+        np.round(stats['demand_std'], 4).tolist(),
+        stats['safety_stock'].tolist(),
+        stats['reorder_point'].tolist()
+    )
+    rows = []
+    for part_id, mean, std, safety, reorder in columns:
+        row = {
+            'id': part_id,
+            'avg_daily_demand': mean,
+            'demand_std': std,
+            'safety_stock': safety,
+            'suggested_min_quantity': reorder
+        }
+        if apply:
+            row['min_quantity'] = reorder
+        rows.append(row)
+
+    # ORM bulk UPDATE by primary key (executemany)
+    chunk_size = kwargs.get('chunk_size') or current_app.config['REORDER_CHUNK_SIZE']
+    for start in range(0, len(rows), chunk_size):
+        db.session.execute(update(SparePart), rows[start:start + chunk_size])
+    db.session.commit()
+
+    if apply:
+        # min_quantity changed outside the ORM unit of work, refresh low stock counts
+        rebuild_stock_cube()
+
+    return len(rows)
@@ -0,0 +1,336 @@
+import os
+import atexit
+import socket
+import threading
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import delete, or_, update
+from sqlalchemy.exc import IntegrityError
+from models import db, JobLease, JobRun
+
+EXTENSION_KEY = 'scheduler'
+LEASE_NAME = 'scheduler'
+
+class Interval:
+    """Run every N seconds, counted from the previous start"""
+
+    def __init__(self, seconds):
+        if seconds <= 0:
+            raise ValueError('Interval must be positive')
+        self.seconds = seconds
+
+    def next_after(self, moment):
+        return moment + timedelta(seconds=self.seconds)
+
+    def __str__(self):
+        return f'every {self.seconds}s'
+
+class Cron:
+    """
+    Five-field cron schedule (minute hour day-of-month month day-of-week), in UTC
+
+    Fields accept *, numbers, ranges (1-5), lists (1,15) and steps (*/15,
+    8-18/2). Day-of-week is 0-6 from Sunday (7 is also Sunday). As in cron,
+    when both day fields are restricted a day matching either one runs.
+    """
+
+    RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+    def __init__(self, expression):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: {expression}")
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            self._parse(field, low, high) for field, (low, high) in zip(fields, self.RANGES)
+        )
+        self.weekdays = {d % 7 for d in weekdays}
+        self.any_day = fields[2] == '*'
+        self.any_weekday = fields[4] == '*'
+
+    @staticmethod
+    def _parse(field, low, high):
+        values = set()
+        for part in field.split(','):
+            spec, _, step = part.partition('/')
+            if spec == '*':
+                start, end = low, high
+            elif '-' in spec:
+                start, end = (int(v) for v in spec.split('-', 1))
+            else:
+                start = int(spec)
+                end = high if step else start
+            step = int(step) if step else 1
+            if not low <= start <= end <= high or step < 1:
+                raise ValueError(f"Invalid cron field: {field}")
+            values.update(range(start, end + 1, step))
+        return values
+
+    def _day_matches(self, moment):
+        day = moment.day in self.days
+        weekday = (moment.weekday() + 1) % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day and weekday
+        return day or weekday
+
+    def next_after(self, moment):
+        """First matching minute strictly after moment"""
+        moment = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = moment + timedelta(days=366 * 5)
+        while moment < limit:
+            if moment.month not in self.months:
+                moment = (moment.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(moment):
+                moment = moment.replace(hour=0, minute=0) + timedelta(days=1)
+            elif moment.hour not in self.hours:
+                moment = moment.replace(minute=0) + timedelta(hours=1)
+            elif moment.minute not in self.minutes:
+                moment += timedelta(minutes=1)
+            else:
+                return moment
+        raise ValueError(f"Cron expression never matches: {self.expression}")
+
+    def __str__(self):
+        return f'cron {self.expression}'
+
+class Job:
+    """A registered job: a function called in an app context on a schedule"""
+
+    def __init__(self, name, func, schedule, per_site=True):
+        self.name = name
+        self.func = func
+        self.schedule = schedule
+        self.per_site = per_site
+
+# Registry filled at import time by @scheduled_job in the blueprint modules
+JOBS = {}
+
+def scheduled_job(name, every=None, cron=None, per_site=True):
+    """
+    Register a function as a background job
+
+    Args:
+        name: Unique job name (used in the run history)
+        every: Interval in seconds, or
+        cron: Five-field cron expression (UTC)
+        per_site: Run once per site database (see utils.sharding) instead of
+                  only on the main database
+    """
+    if (every is None) == (cron is None):
+        raise ValueError('Give exactly one of every= or cron=')
+    schedule = Interval(every) if every is not None else Cron(cron)
+
+    def decorator(func):
+        if name in JOBS:
+            raise ValueError(f"Job already registered: {name}")
+        JOBS[name] = Job(name, func, schedule, per_site)
+        return func
+    return decorator
+
+class Scheduler:
+    """
+    Runs registered jobs in one process of the deployment
+
+    Every worker starts a scheduler, but only the holder of the lease row
+    in job_leases runs scheduled jobs. The leader renews the lease every
+    tick; if it dies, another worker takes over once the lease expires.
+    Jobs run on a bounded thread pool and never overlap with themselves;
+    each run is recorded in job_runs. Schedules missed while no leader was
+    running are run once, not caught up.
+
+    The same pool also runs one-off background tasks for this process
+    (submit), such as emails that should not hold up a request.
+    """
+
+    def __init__(self, app, jobs, workers=2, lease_seconds=30, tick_seconds=5):
+        self.app = app
+        self.jobs = jobs
+        self.lease_seconds = lease_seconds
+        self.tick_seconds = tick_seconds
+        self.holder = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='jobs')
+        self.is_leader = False
+        self._next_runs = {}
+        self._running = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        """Start the scheduling thread (idempotent)"""
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._loop, name='scheduler', daemon=True)
+            self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        """Stop scheduling and hand the lease over immediately"""
+        self._stop.set()
+        if self.is_leader:
+            self.is_leader = False
+            try:
+                with self.app.app_context():
+                    db.session.execute(
+                        update(JobLease)
+                        .where(JobLease.name == LEASE_NAME, JobLease.holder == self.holder)
+                        .values(expires_at=datetime.utcnow())
+                    )
+                    db.session.commit()
+            except Exception:
+                pass  # The lease simply expires
+        self.pool.shutdown(wait=False)
+
+    def submit(self, func, *args, **kwargs):
+        """Run func(*args, **kwargs) on the pool in a fresh app context"""
+        def run():
+            with self.app.app_context():
+                try:
+                    func(*args, **kwargs)
+                except Exception:
+                    self.app.logger.exception(f"Background task {getattr(func, '__name__', func)} failed")
+        return self.pool.submit(run)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                with self.app.app_context():
+                    self.tick(datetime.utcnow())
+            except Exception:
+                self.app.logger.exception('Scheduler tick failed')
+            self._stop.wait(self.tick_seconds)
+
+    def acquire_lease(self, now):
+        """Take or renew the lease; returns True while this process is the leader"""
+        expires_at = now + timedelta(seconds=self.lease_seconds)
+        renewed = db.session.execute(
+            update(JobLease)
+            .where(
+                JobLease.name == LEASE_NAME,
+                or_(JobLease.holder == self.holder, JobLease.expires_at < now)
+            )
+            .values(holder=self.holder, expires_at=expires_at)
+        ).rowcount
+        if not renewed:
+            db.session.add(JobLease(name=LEASE_NAME, holder=self.holder, expires_at=expires_at))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()  # Another process holds the lease
+            return False
+        return True
+
+    def tick(self, now):
+        """Renew the lease and start the jobs that are due"""
+        was_leader = self.is_leader
+        self.is_leader = self.acquire_lease(now)
+        if not self.is_leader:
+            return
+        if not was_leader:
+            self._next_runs = self._resume_schedules(now)
+
+        for name, job in self.jobs.items():
+            if self._next_runs[name] > now:
+                continue
+            running = self._running.get(name)
+            if running is not None and not running.done():
+                continue  # Never overlap a job with itself
+            self._next_runs[name] = job.schedule.next_after(now)
+            self._running[name] = self.pool.submit(self._run_job, job)
+
+    def _resume_schedules(self, now):
+        """Next run of every job, continuing from the last recorded starts"""
+        last_starts = dict(
+            db.session.query(JobRun.job_name, db.func.max(JobRun.started_at))
+            .group_by(JobRun.job_name)
+            .all()
+        )
+        next_runs = {}
+        for name, job in self.jobs.items():
+            last = last_starts.get(name)
+            next_runs[name] = job.schedule.next_after(last if last else now)
+        return next_runs
+
+    def _run_job(self, job):
+        with self.app.app_context():
+            return run_job(job, self.holder)
+
+def run_job(job, holder=None):
+    """
+    Run a job now and record it in job_runs (requires app context)
+
+    Returns:
+        JobRun: The finished run
+    """
+    from utils.sharding import fan_out
+
+    run = JobRun(job_name=job.name, status='running', holder=holder, started_at=datetime.utcnow())
+    db.session.add(run)
+    db.session.commit()
+
+    try:
+        results = fan_out(job.func) if job.per_site else [job.func()]
+        run.status = 'success'
+        run.result = '; '.join(str(r) for r in results if r is not None)[:500] or None
+    except Exception:
+        db.session.rollback()
+        run.status = 'failed'
+        run.error = traceback.format_exc()[-4000:]
+    run.finished_at = datetime.utcnow()
+    db.session.commit()
+    return run
+
+def prune_job_runs(days):
+    """Delete job run history older than the given number of days"""
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    count = db.session.execute(delete(JobRun).where(JobRun.started_at < cutoff)).rowcount
+    db.session.commit()
+    return count
+
+@scheduled_job('prune-job-runs', cron='15 2 * * *', per_site=False)
+def prune_job_runs_job():
+    """Keep JOB_HISTORY_DAYS of job run history"""
+    return prune_job_runs(current_app.config['JOB_HISTORY_DAYS'])
+
+def has_background_pool():
+    """Whether background() hands tasks to the scheduler's pool (otherwise it runs them inline)"""
+    return current_app.extensions.get(EXTENSION_KEY) is not None
+
+def background(func, *args, **kwargs):
+    """
+    Run a task on the scheduler's pool, or inline when no scheduler is running
+
+    Requires app context. Pass plain values rather than ORM objects: the
+    task runs in its own app context and session.
+    """
+    scheduler = current_app.extensions.get(EXTENSION_KEY)
+    if scheduler is None:
+        func(*args, **kwargs)
+    else:
+        scheduler.submit(func, *args, **kwargs)
+
+def init_scheduler(app):
+    """
+    Create the app's scheduler when SCHEDULER_ENABLED
+
+    The scheduling thread starts with the first request rather than here,
+    so CLI commands and scripts that build the app never take the lease.
+    """
+    if not app.config.get('SCHEDULER_ENABLED'):
+        return
+
+    scheduler = Scheduler(
+        app,
+        JOBS,
+        workers=app.config.get('SCHEDULER_WORKERS', 2),
+        lease_seconds=app.config.get('SCHEDULER_LEASE_SECONDS', 30),
+        tick_seconds=app.config.get('SCHEDULER_TICK_SECONDS', 5)
+    )
+    app.extensions[EXTENSION_KEY] = scheduler
+    app.before_request(scheduler.start)
@@ -0,0 +1,143 @@
+from concurrent.futures import ThreadPoolExecutor
+import jwt
+from flask import current_app, g, jsonify, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from flask_jwt_extended.exceptions import JWTExtendedException
+from sqlalchemy import event
+from models import db, User, SITE_TABLES
+
+# Per-site databases ("shards") are SQLAlchemy binds named site:<code>.
+# The main database holds users and suppliers and also serves as the main
+# site. On SQLite every site connection ATTACHes the main database, so
+# unqualified users/suppliers resolve there and joins across the two work.
+
+ALL_SITES = 'all'
+
+def site_bind_key(site):
+    return f'site:{site}'
+
+def configured_sites(app=None):
+    """Site codes with their own database (excluding the main site)"""
+    return list((app or current_app).config.get('SITE_DATABASES') or {})
+
+def all_sites(app=None):
+    """Every site including the main one (None)"""
+    return [None, *configured_sites(app)]
+
+def resolve_site(requested, sites, main_name='main'):
+    """
+    Validate a requested site code
+    
+    Returns:
+        str: Site code, or None for the main site / no preference
+    
+    Raises:
+        ValueError: For an unknown site
+    """
+    if not requested or requested in (main_name, ALL_SITES):
+        return None
+    if requested not in sites:
+        raise ValueError(f"Unknown site: {requested}")
+    return requested
+
+def attach_main_database(engine, main_path):
+    """Make the main SQLite database's tables visible on a site engine's connections"""
+    @event.listens_for(engine, 'connect')
+    def _attach(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('ATTACH DATABASE ? AS main_db', (main_path,))
+        cursor.close()
+
+def _token_site():
+    """
+    Site claim of the request's bearer token
+    
+    Read without verifying the signature: the claim only picks a database,
+    and the view's jwt_required still rejects forged or expired tokens.
+    """
+    auth = request.headers.get('Authorization', '')
+    if not auth.startswith('Bearer '):
+        return None
+    try:
+        return jwt.decode(auth[7:], options={'verify_signature': False}).get('site')
+    except jwt.InvalidTokenError:
+        return None
+
+def overrides_token_site(requested, site, token_site):
+    """Whether an X-Site/?site= request for `site` differs from the token's site (admins only)"""
+    return bool(requested) and (site != token_site or requested == ALL_SITES)
+
+def _is_admin():
+    """Whether the request carries a valid access token of an admin"""
+    try:
+        verify_jwt_in_request(optional=True)
+    except (JWTExtendedException, jwt.InvalidTokenError):
+        return False
+    identity = get_jwt_identity()
+    if identity is None:
+        return False
+    user = db.session.get(User, int(identity))
+    return user is not None and user.role == 'admin'
+
+def _route_request():
+    """
+    before_request hook: pick the shard from the JWT site claim
+    
+    X-Site or ?site= may override the claim only for admins, so a token
+    issued for one site cannot read or write another (or ?site=all).
+    """
+    token_site = _token_site()
+    requested = request.headers.get('X-Site') or request.args.get('site')
+    
+    try:
+        site = resolve_site(requested or token_site, configured_sites(), current_app.config['MAIN_SITE_NAME'])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if overrides_token_site(requested, site, token_site) and not _is_admin():
+        return jsonify({'error': 'Admin access required to select another site'}), 403
+    g.site = site
+
+def create_site_schemas():
+    """Create the per-site tables in every site database (requires app context)"""
+    tables = [db.metadata.tables[name] for name in SITE_TABLES]
+    for site in configured_sites():
+        db.metadata.create_all(bind=db.engines[site_bind_key(site)], tables=tables)
+
+def init_sharding(app):
+    """Route requests to per-site databases when SITE_DATABASES is configured"""
+    if not configured_sites(app):
+        return
+    
+    with app.app_context():
+        main = db.engines[None]
+        for site in configured_sites(app):
+            engine = db.engines[site_bind_key(site)]
+            if engine.dialect.name == 'sqlite' and main.dialect.name == 'sqlite':
+                attach_main_database(engine, main.url.database)
+    
+    app.before_request(_route_request)
+
+def fan_out(func, sites=None):
+    """
+    Run func once per site in parallel and return the results in site order
+    
+    Each call runs in its own app context (and so its own session) with
+    g.site set, so results never share an identity map across shards.
+    """
+    app = current_app._get_current_object()
+    sites = all_sites(app) if sites is None else sites
+    
+    def run(site):
+        with app.app_context():
+            g.site = site
+            return func()
+    
+    if len(sites) == 1:
+        return [run(sites[0])]
+    with ThreadPoolExecutor(max_workers=len(sites)) as pool:
+        return list(pool.map(run, sites))
+
+def wants_all_sites():
+    """True when a cross-site answer was requested (?site=all)"""
+    return request.args.get('site') == ALL_SITES
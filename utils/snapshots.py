@@ -0,0 +1,161 @@
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import case, func, insert, literal, select, delete, union_all
+from models import db, SparePart, StockChange, StockSnapshot
+from utils.transaction_archive import transaction_movements
+
+def take_stock_snapshot(taken_at=None):
+    """
+    Record the current quantity of every part in one INSERT ... SELECT
+
+    Args:
+        taken_at: Snapshot timestamp (default: now, UTC)
+
+    Returns:
+        tuple: (taken_at, number of rows written)
+    """
+    taken_at = taken_at or datetime.utcnow()
+    stmt = insert(StockSnapshot).from_select(
+        ['part_id', 'quantity', 'taken_at'],
+        select(SparePart.id, SparePart.quantity, literal(taken_at, db.DateTime))
+    )
+    result = db.session.execute(stmt)
+    db.session.commit()
+    return taken_at, result.rowcount
+
+def prune_stock_snapshots(daily_retention_days=None):
+    """
+    Thin out old snapshots, keeping daily ones inside the retention window
+    and only the first snapshot of each ISO week before it
+
+    Returns:
+        int: Number of rows deleted
+    """
+    days = daily_retention_days or current_app.config['SNAPSHOT_DAILY_RETENTION_DAYS']
+    cutoff = datetime.utcnow() - timedelta(days=days)
+
+    old_times = db.session.execute(
+        select(StockSnapshot.taken_at)
+        .where(StockSnapshot.taken_at < cutoff)
+        .group_by(StockSnapshot.taken_at)
+        .order_by(StockSnapshot.taken_at)
+    ).scalars().all()
+
+    seen_weeks = set()
+    expired = []
+    for taken_at in old_times:
+        week = taken_at.isocalendar()[:2]
+        if week in seen_weeks:
+            expired.append(taken_at)
+        else:
+            seen_weeks.add(week)
+
+    if not expired:
+        return 0
+
+    result = db.session.execute(
+        delete(StockSnapshot).where(StockSnapshot.taken_at.in_(expired))
+    )
+    db.session.commit()
+    return result.rowcount
+
+def inventory_as_of(as_of, part_id=None):
+    """
+    Reconstruct stock levels at a point in time
+
+    Starts from the earliest snapshot taken after `as_of` (or from live
+    quantities when there is none) and replays only the changes in
+    between backwards, so the work is bounded by the snapshot interval
+    rather than the age of the ledger.
+
+    Changes come from the stock_changes log, which also has the manual
+    adjustments made by part edits. Transactions are only replayed for
+    history from before the log started.
+
+    Args:
+        as_of: Naive UTC datetime
+        part_id: Optionally restrict to a single part
+
+    Returns:
+        tuple: (base info dict, list of part dicts)
+    """
+    base_time = db.session.execute(
+        select(func.min(StockSnapshot.taken_at)).where(StockSnapshot.taken_at >= as_of)
+    ).scalar()
+
+    if base_time is not None:
+        base = select(
+            StockSnapshot.part_id.label('part_id'),
+            StockSnapshot.quantity.label('quantity')
+        ).where(StockSnapshot.taken_at == base_time).subquery()
+        base_info = {'type': 'snapshot', 'taken_at': base_time.isoformat()}
+    else:
+        base = select(
+            SparePart.id.label('part_id'),
+            SparePart.quantity.label('quantity')
+        ).subquery()
+        base_info = {'type': 'live', 'taken_at': None}
+
+    def in_window(timestamp):
+        conditions = [timestamp > as_of]
+        if base_time is not None:
+            conditions.append(timestamp <= base_time)
+        return conditions
+
+    logged = select(
+        StockChange.part_id.label('part_id'),
+        (StockChange.quantity_after - StockChange.quantity_before).label('net')
+    ).where(*in_window(StockChange.created_at))
+    deltas = [logged]
+
+    log_start, first_logged_transaction = db.session.execute(
+        select(func.min(StockChange.created_at), func.min(StockChange.transaction_id))
+    ).one()
+    if log_start is None or as_of < log_start:
+        # Hot transactions, plus archived ones when as_of is in archived history
+        tx = transaction_movements(as_of)
+        if first_logged_transaction is not None:
+            before_log = tx.c.id < first_logged_transaction
+        elif log_start is not None:
+            before_log = tx.c.timestamp < log_start
+        else:
+            before_log = None
+        replayed = select(
+            tx.c.part_id.label('part_id'),
+            case((tx.c.type == 'IN', tx.c.quantity), else_=-tx.c.quantity).label('net')
+        ).where(*in_window(tx.c.timestamp))
+        if before_log is not None:
+            replayed = replayed.where(before_log)
+        deltas.append(replayed)
+
+    changes = union_all(*deltas).subquery() if len(deltas) > 1 else deltas[0].subquery()
+    movements = select(
+        changes.c.part_id,
+        func.sum(changes.c.net).label('net')
+    ).group_by(changes.c.part_id).subquery()
+
+    quantity = base.c.quantity - func.coalesce(movements.c.net, 0)
+    query = select(
+        SparePart.id,
+        SparePart.name,
+        SparePart.category,
+        SparePart.location,
+        quantity.label('quantity')
+    ).join(base, base.c.part_id == SparePart.id)\
+     .outerjoin(movements, movements.c.part_id == SparePart.id)\
+     .where(SparePart.created_at <= as_of)
+    if part_id is not None:
+        query = query.where(SparePart.id == part_id)
+
+    rows = db.session.execute(query.order_by(SparePart.name)).all()
+    parts = [
+        {
+            'id': pid,
+            'name': name,
+            'category': category,
+            'location': location,
+            'quantity': int(qty or 0)
+        }
+        for pid, name, category, location, qty in rows
+    ]
+    return base_info, parts
@@ -0,0 +1,181 @@
+from sqlalchemy import case, delete, event, func, insert, inspect, select
+from sqlalchemy.dialects import postgresql, sqlite
+from models import db, SparePart, StockAggregate
+
+MEASURES = ('part_count', 'total_quantity', 'low_stock_count', 'out_of_stock_count')
+DIMENSIONS = ('category', 'location', 'supplier_id')
+
+def _key(category, location, supplier_id):
+    return (category or '', location or '', supplier_id or 0)
+
+def _measures(quantity, min_quantity):
+    quantity = quantity or 0
+    return (
+        1,
+        quantity,
+        1 if quantity <= (min_quantity or 0) else 0,
+        1 if quantity == 0 else 0
+    )
+
+def _upsert(connection, key, deltas):
+    """Add measure deltas to one cube cell, creating it if needed"""
+    if not any(deltas):
+        return
+
+    values = dict(zip(DIMENSIONS, key))
+    values.update(zip(MEASURES, deltas))
+
+    if connection.dialect.name == 'postgresql':
+        stmt = postgresql.insert(StockAggregate.__table__).values(**values)
+    else:
+        stmt = sqlite.insert(StockAggregate.__table__).values(**values)
+
+    table = StockAggregate.__table__
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(DIMENSIONS),
+        set_={m: table.c[m] + stmt.excluded[m] for m in MEASURES}
+    )
+    connection.execute(stmt)
+
+def _previous(target, attr):
+    """Value of an attribute before the pending change"""
+    history = inspect(target).attrs[attr].history
+    if history.deleted:
+        return history.deleted[0]
+    return getattr(target, attr)
+
+@event.listens_for(SparePart, 'after_insert')
+def _part_inserted(mapper, connection, target):
+    key = _key(target.category, target.location, target.supplier_id)
+    _upsert(connection, key, _measures(target.quantity, target.min_quantity))
+
+@event.listens_for(SparePart, 'after_update')
+def _part_updated(mapper, connection, target):
+    old_key = _key(*(_previous(target, d) for d in DIMENSIONS))
+    old = _measures(_previous(target, 'quantity'), _previous(target, 'min_quantity'))
+    new_key = _key(target.category, target.location, target.supplier_id)
+    new = _measures(target.quantity, target.min_quantity)
+
+    if old_key == new_key:
+        _upsert(connection, new_key, tuple(n - o for n, o in zip(new, old)))
+    else:
+        _upsert(connection, old_key, tuple(-o for o in old))
+        _upsert(connection, new_key, new)
+
+@event.listens_for(SparePart, 'after_delete')
+def _part_deleted(mapper, connection, target):
+    old_key = _key(*(_previous(target, d) for d in DIMENSIONS))
+    old = _measures(_previous(target, 'quantity'), _previous(target, 'min_quantity'))
+    _upsert(connection, old_key, tuple(-o for o in old))
+
+def _grouped_parts(where=None):
+    """SELECT of cube dimensions and measures grouped over spare_parts"""
+    category = func.coalesce(SparePart.category, '')
+    location = func.coalesce(SparePart.location, '')
+    supplier_id = func.coalesce(SparePart.supplier_id, 0)
+    stmt = select(
+        category,
+        location,
+        supplier_id,
+        func.count(SparePart.id),
+        func.coalesce(func.sum(SparePart.quantity), 0),
+        func.sum(case((SparePart.quantity <= SparePart.min_quantity, 1), else_=0)),
+        func.sum(case((SparePart.quantity == 0, 1), else_=0))
+    )
+    if where is not None:
+        stmt = stmt.where(where)
+    return stmt.group_by(category, location, supplier_id)
+
+def adjust_stock_cube(where, sign):
+    """
+    Add (sign=1) or remove (sign=-1) a set of parts' contribution to the cube
+
+    Used around bulk UPDATEs that bypass the ORM listeners: remove the
+    affected parts before the statement and add them back afterwards.
+    Cost is one grouped query over the affected parts.
+
+    Args:
+        where: SQL condition selecting the parts
+        sign: 1 or -1
+    """
+    rows = db.session.execute(_grouped_parts(where)).all()
+
+    connection = db.session.connection()
+    for row in rows:
+        _upsert(connection, tuple(row[:3]), tuple(sign * int(v or 0) for v in row[3:]))
+
+def rebuild_stock_cube():
+    """
+    Recompute the whole cube from spare_parts in one INSERT ... SELECT
+
+    ORM writes keep the cube up to date incrementally; call this after
+    bulk statements that bypass the ORM (or to initialize an existing
+    database).
+
+    Returns:
+        int: Number of cube cells written
+    """
+    db.session.execute(delete(StockAggregate))
+    result = db.session.execute(
+        insert(StockAggregate).from_select(list(DIMENSIONS + MEASURES), _grouped_parts())
+    )
+    db.session.commit()
+    return result.rowcount
+
+def stock_cube_select(group_by=(), category=None, location=None, supplier_id=None):
+    """
+    SELECT rolling up or slicing the cube (shared by the sync and async read paths)
+
+    Args:
+        group_by: Dimensions to keep ('category', 'location', 'supplier_id');
+                  empty for a grand total
+        category, location, supplier_id: Optional slice filters
+                  ('' / 0 select parts without a value)
+    """
+    dims = [getattr(StockAggregate, d) for d in group_by]
+    sums = [func.coalesce(func.sum(getattr(StockAggregate, m)), 0).label(m) for m in MEASURES]
+    stmt = select(*dims, *sums)
+
+    if category is not None:
+        stmt = stmt.where(StockAggregate.category == category)
+    if location is not None:
+        stmt = stmt.where(StockAggregate.location == location)
+    if supplier_id is not None:
+        stmt = stmt.where(StockAggregate.supplier_id == supplier_id)
+
+    if dims:
+        stmt = stmt.group_by(*dims).having(func.sum(StockAggregate.part_count) > 0).order_by(*dims)
+
+    return stmt
+
+def query_stock_cube(group_by=(), category=None, location=None, supplier_id=None):
+    """
+    Roll up or slice the cube (see stock_cube_select for the arguments)
+
+    Returns:
+        list: Dicts with the grouped dimensions and summed measures
+    """
+    stmt = stock_cube_select(group_by, category, location, supplier_id)
+    return [row._asdict() for row in db.session.execute(stmt)]
+
+def merge_cube_rows(results, group_by=()):
+    """
+    Merge query_stock_cube results from several site databases
+    
+    Measures are additive, so rows with the same dimension values are
+    summed; the output has the same shape and order as a single query.
+    
+    Args:
+        results: One list of cube rows per site
+        group_by: Dimensions the rows were grouped by
+    """
+    merged = {}
+    for rows in results:
+        for row in rows:
+            key = tuple(row[d] for d in group_by)
+            cell = merged.get(key)
+            if cell is None:
+                cell = merged[key] = {**dict(zip(group_by, key)), **{m: 0 for m in MEASURES}}
+            for m in MEASURES:
+                cell[m] += int(row[m] or 0)
+    return [merged[key] for key in sorted(merged)]
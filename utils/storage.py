@@ -0,0 +1,92 @@
+import os
+import hashlib
+import tempfile
+
+CHUNK_SIZE = 64 * 1024
+SHARD_DEPTH = 2
+SHARD_WIDTH = 2
+
+def shard_path(digest, extension):
+    """
+    Build the sharded relative path for a content digest
+
+    Example:
+        'ab12cd...' -> 'ab/12/ab12cd....png'
+    """
+    parts = [digest[i * SHARD_WIDTH:(i + 1) * SHARD_WIDTH] for i in range(SHARD_DEPTH)]
+    filename = f"{digest}.{extension}" if extension else digest
+    return '/'.join(parts + [filename])
+
+def _commit_temp(temp_path, folder, digest, extension):
+    """Atomically move a finished temp file into its content address"""
+    rel_path = shard_path(digest, extension)
+    target = os.path.join(folder, *rel_path.split('/'))
+
+    if os.path.exists(target):
+        # Identical content already stored
+        os.remove(temp_path)
+        return rel_path
+
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    os.chmod(temp_path, 0o644)  # mkstemp creates files readable by owner only
+    os.replace(temp_path, target)
+    return rel_path
+
+def store_stream(stream, folder, extension):
+    """
+    Store a binary stream under its SHA-256 content address
+
+    The stream is hashed while it is copied to a temp file in the storage
+    folder, then renamed into place, so readers never see partial files and
+    identical content is only kept once.
+
+    Args:
+        stream: File-like object opened in binary mode
+        folder: Storage root folder
+        extension: File extension without the dot
+
+    Returns:
+        str: Path relative to the storage root (with '/' separators)
+    """
+    os.makedirs(folder, exist_ok=True)
+    digest = hashlib.sha256()
+
+    fd, temp_path = tempfile.mkstemp(dir=folder, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as temp_file:
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+                temp_file.write(chunk)
+        return _commit_temp(temp_path, folder, digest.hexdigest(), extension)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def store_bytes(data, folder, extension):
+    """
+    Store bytes under their SHA-256 content address
+
+    Args:
+        data: Content to store
+        folder: Storage root folder
+        extension: File extension without the dot
+
+    Returns:
+        str: Path relative to the storage root (with '/' separators)
+    """
+    digest = hashlib.sha256(data).hexdigest()
+    rel_path = shard_path(digest, extension)
+    if os.path.exists(os.path.join(folder, *rel_path.split('/'))):
+        return rel_path
+
+    os.makedirs(folder, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=folder, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as temp_file:
+            temp_file.write(data)
+        return _commit_temp(temp_path, folder, digest, extension)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
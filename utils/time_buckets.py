@@ -0,0 +1,33 @@
+from sqlalchemy import func
+from models import db
+
+BUCKETS = ('hour', 'day', 'week', 'month')
+
+def bucket_expression(column, bucket):
+    """
+    SQL expression truncating a timestamp column to the start of its bucket
+
+    SQLite returns ISO strings (weeks start on Monday); PostgreSQL uses
+    date_trunc and returns timestamps.
+
+    Args:
+        column: Timestamp column
+        bucket: One of BUCKETS
+    """
+    if bucket not in BUCKETS:
+        raise ValueError(f"Invalid bucket. Must be one of: {', '.join(BUCKETS)}")
+
+    if db.session.get_bind().dialect.name == 'postgresql':
+        return func.date_trunc(bucket, column)
+
+    if bucket == 'hour':
+        return func.strftime('%Y-%m-%dT%H:00:00', column)
+    if bucket == 'day':
+        return func.date(column)
+    if bucket == 'week':
+        return func.date(column, '-6 days', 'weekday 1')
+    return func.strftime('%Y-%m-01', column)
+
+def format_bucket(value):
+    """Serialize a bucket value returned by bucket_expression"""
+    return value.isoformat() if hasattr(value, 'isoformat') else value
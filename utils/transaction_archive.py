@@ -0,0 +1,102 @@
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import delete, event, func, insert, select, union_all
+from models import db, SparePart, Transaction, TransactionArchive, User
+
+# Transactions older than TRANSACTION_HOT_DAYS move from `transactions` to
+# `transactions_archive`, so the hot table and its indexes stay the size of
+# the recent window. Every archived row is older than every hot row, so
+# newest-first readers can read the hot tier and continue into the archive.
+
+COLUMNS = ('id', 'user_id', 'part_id', 'type', 'quantity', 'machine_id', 'machine', 'notes', 'timestamp')
+
+# Archived rows have no foreign keys, so they do not go with a deleted part or
+# user the way hot transactions do. Delete them too: part and user IDs can be
+# reused, and a new part must not inherit the old one's history.
+
+@event.listens_for(SparePart, 'after_delete')
+def _part_deleted(mapper, connection, target):
+    connection.execute(delete(TransactionArchive).where(TransactionArchive.part_id == target.id))
+
+@event.listens_for(User, 'after_delete')
+def _user_deleted(mapper, connection, target):
+    connection.execute(delete(TransactionArchive).where(TransactionArchive.user_id == target.id))
+
+def archived_until():
+    """Timestamp of the newest archived transaction (None when nothing is archived)"""
+    return db.session.execute(select(func.max(TransactionArchive.timestamp))).scalar()
+
+def reaches_archive(start):
+    """Whether a range starting at `start` (None for unbounded) includes archived transactions"""
+    if start is None:
+        return archived_until() is not None
+    until = archived_until()
+    return until is not None and start <= until
+
+def transaction_tiers(start=None):
+    """Transaction models to read for a range starting at `start`, newest tier first"""
+    if reaches_archive(start):
+        return [Transaction, TransactionArchive]
+    return [Transaction]
+
+def transaction_movements(start=None):
+    """
+    Subquery of (id, part_id, type, quantity, machine_id, timestamp) over both tiers when needed
+
+    For SQL consumers (trends, machine usage, demand statistics) that
+    aggregate transactions from `start` onwards.
+    """
+    selects = [
+        select(model.id, model.part_id, model.type, model.quantity, model.machine_id, model.timestamp)
+        for model in transaction_tiers(start)
+    ]
+    if len(selects) == 1:
+        return selects[0].subquery()
+    return union_all(*selects).subquery()
+
+def archive_transactions(before=None, batch_size=None):
+    """
+    Move transactions older than `before` into the archive in batches
+
+    Each batch copies and deletes one block of IDs in its own short
+    transaction, so writers are never locked out for the whole run and an
+    interrupted run simply continues where it stopped.
+
+    Args:
+        before: Cutoff timestamp (default: TRANSACTION_HOT_DAYS ago)
+        batch_size: Rows per batch (default: TRANSACTION_ARCHIVE_BATCH_SIZE)
+
+    Returns:
+        int: Number of transactions archived
+    """
+    if before is None:
+        before = datetime.utcnow() - timedelta(days=current_app.config['TRANSACTION_HOT_DAYS'])
+    batch_size = batch_size or current_app.config['TRANSACTION_ARCHIVE_BATCH_SIZE']
+
+    columns = [getattr(Transaction, c) for c in COLUMNS]
+    # The newest transaction always stays hot: SQLite hands out max(id) + 1,
+    # so deleting it could make a new transaction reuse an archived ID
+    newest = select(func.max(Transaction.id)).scalar_subquery()
+    archived = 0
+    while True:
+        ids = db.session.execute(
+            select(Transaction.id)
+            .where(Transaction.timestamp < before, Transaction.id < newest)
+            .order_by(Transaction.id)
+            .limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            break
+
+        db.session.execute(
+            insert(TransactionArchive).from_select(
+                list(COLUMNS), select(*columns).where(Transaction.id.in_(ids))
+            )
+        )
+        db.session.execute(
+            delete(Transaction).where(Transaction.id.in_(ids)).execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        archived += len(ids)
+
+    return archived